@@ -0,0 +1,144 @@
+"""
+ベンチマーク用の合成データを作る。
+
+lib/shops.csv の店舗をひな形に、店名・住所に番号を付け座標を少しずらした店舗を --shops 件、
+口コミを --reviews 件（人気店に偏らせる）DB に一括で入れる。DB は先に flask seed と同じ初期化をする。
+--csv を付けると DB には入れず、shops.csv と同じ列の拡大版CSVを書き出す。
+
+使い方:
+  python bench/generate_data.py --database-url sqlite:////tmp/bench.db --shops 10000 --reviews 1000000
+  python bench/generate_data.py --database-url postgresql://... --shops 100000 --reviews 1000000
+  python bench/generate_data.py --shops 100000 --csv /tmp/shops_100k.csv
+"""
+import argparse
+import csv
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TEMPLATE_CSV = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'lib', 'shops.csv')
+CHUNK_SIZE = 10000
+JITTER_DEG = 0.05  # ひな形の座標から最大でこれだけずらす（約5km）
+
+NICKNAMES = ['匿名', '古着好き', 'ヴィンテージ太郎', 'デニム女子', '学生', 'スニーカー好き', 'Tokyo Digger']
+COMMENTS = [
+    '品揃えが良くて何時間でも居られます。',
+    '店員さんが親切で、サイズの相談にも乗ってくれました。',
+    '90年代のスウェットが豊富。価格も良心的です。',
+    'ちょっと高めだけど状態の良いものが多い。',
+    'US古着好きなら一度は行くべき。',
+    'Good selection of vintage denim.',
+]
+
+
+def load_templates():
+    with open(TEMPLATE_CSV, encoding='utf-8-sig', newline='') as f:
+        reader = csv.DictReader(f)
+        rows = [r for r in reader if r.get('latitude') and r.get('longitude')]
+        return reader.fieldnames, rows
+
+
+def synthetic_shops(count, rng):
+    """ひな形を順に使い回して count 件の店舗（shops.csv の列名の辞書）を作る"""
+    fieldnames, templates = load_templates()
+    for i in range(count):
+        t = dict(templates[i % len(templates)])
+        n = i // len(templates) + 1
+        t['name'] = f"{t['name']} #{n}"
+        t['address'] = f"{t['address']} {n}号"
+        t['latitude'] = f"{float(t['latitude']) + rng.uniform(-JITTER_DEG, JITTER_DEG):.7f}"
+        t['longitude'] = f"{float(t['longitude']) + rng.uniform(-JITTER_DEG, JITTER_DEG):.7f}"
+        t['place_id'] = ''
+        t['plus_code'] = ''
+        yield fieldnames, t
+
+
+def write_csv(path, count, rng):
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = None
+        for fieldnames, row in synthetic_shops(count, rng):
+            if writer is None:
+                writer = csv.DictWriter(f, fieldnames=fieldnames)
+                writer.writeheader()
+            writer.writerow(row)
+    print(f'✅ {count} 件を {path} に書き出しました')
+
+
+def populate_db(shop_count, review_count, rng):
+    from server import (app, db, Shop, Review, seed_data, csv_shop_row, search_columns,
+                        insert_ignoring_conflicts, next_revision, rebuild_rating_aggregates)
+
+    with app.app_context():
+        seed_data()
+        started = time.monotonic()
+
+        rev = next_revision(db.session, geometry=True)
+        chunk = []
+        for _, row in synthetic_shops(shop_count, rng):
+            r = csv_shop_row(row)
+            r.update(search_columns(
+                r['name'], r['address'], r.get('nearest_station'), r.get('genres'), r.get('description')))
+            r['revision'] = rev
+            chunk.append(r)
+            if len(chunk) >= CHUNK_SIZE:
+                db.session.execute(insert_ignoring_conflicts(Shop), chunk)
+                chunk = []
+        if chunk:
+            db.session.execute(insert_ignoring_conflicts(Shop), chunk)  # 2回目以降の実行では作成済みの店を飛ばす
+        db.session.commit()
+        print(f'✅ 店舗 {shop_count} 件（{time.monotonic() - started:.1f}秒）')
+
+        shop_ids = [row[0] for row in db.session.query(Shop.id).order_by(Shop.id)]
+        started = time.monotonic()
+        today = date.today()
+        rev = next_revision(db.session, shops=False)  # 店舗の行は rebuild_rating_aggregates で更新する
+        chunk = []
+        for i in range(review_count):
+            # random()**3 で前の方の店に口コミを集中させる（人気店ほど口コミが多い）
+            chunk.append({
+                'shop_id': shop_ids[int(len(shop_ids) * rng.random() ** 3)],
+                'nickname': rng.choice(NICKNAMES),
+                'rating': float(rng.randint(1, 5)),
+                'comment': rng.choice(COMMENTS),
+                'date': (today - timedelta(days=rng.randint(0, 1500))).isoformat(),
+                'revision': rev,
+            })
+            if len(chunk) >= CHUNK_SIZE:
+                db.session.execute(db.insert(Review), chunk)
+                chunk = []
+                if (i + 1) % 200000 == 0:
+                    print(f'  口コミ {i + 1}/{review_count}', flush=True)
+        if chunk:
+            db.session.execute(db.insert(Review), chunk)
+        db.session.commit()
+        print(f'✅ 口コミ {review_count} 件（{time.monotonic() - started:.1f}秒）')
+
+        rebuild_rating_aggregates()
+        print('✅ 評価集計を再計算しました')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ベンチマーク用の合成データを作る')
+    parser.add_argument('--database-url', help='投入先（省略時は環境変数 DATABASE_URL / furugiya.db）')
+    parser.add_argument('--shops', type=int, default=10000)
+    parser.add_argument('--reviews', type=int, default=100000)
+    parser.add_argument('--csv', help='DBに入れず、拡大した shops.csv をこのパスに書き出す')
+    parser.add_argument('--seed', type=int, default=42, help='乱数の種（同じ値なら同じデータになる）')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    if args.csv:
+        write_csv(args.csv, args.shops, rng)
+        return
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url  # server の import より前に決める
+    os.environ.setdefault('GEOCODER', 'stub')
+    populate_db(args.shops, args.reviews, rng)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+遅いジオコーダー呼び出しが /api/shops を止めないかを確かめる負荷試験。
+
+gunicorn（gunicorn.conf.py）を GUNICORN_PROFILE ごとに起動し、/api/geocode に
+遅いリクエスト（スタブのジオコーダーが毎回 --delay 秒待つ）を流し続けながら、
+並行して /api/shops の応答時間を測る。ネットワークには出ない。
+
+使い方:
+  python bench/geocode_stall.py                       # sync / gthread / gevent を比較
+  python bench/geocode_stall.py --profiles gthread --slow 6 --delay 3
+"""
+import argparse
+import os
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from harness import ROOT, copy_sqlite_db, flask_cli, gunicorn_server, percentile
+
+
+def run_profile(profile, args, db_url):
+    env = {'GEOCODER_STUB_DELAY': str(args.delay)}
+    with gunicorn_server(db_url, args.port, profile, args.workers, env) as base_url:
+        stop = threading.Event()
+        slow_done = []
+
+        def slow_client(n):
+            i = 0
+            while not stop.is_set():
+                # 毎回違う住所にしてキャッシュに当たらないようにする
+                query = urllib.parse.urlencode({'address': f'{profile}県テスト市{n}-{i}-{time.time_ns()}'})
+                try:
+                    urllib.request.urlopen(f'{base_url}/api/geocode?{query}', timeout=60).read()
+                    slow_done.append(1)
+                except OSError:  # URLError・接続リセット
+                    pass
+                i += 1
+
+        slow_threads = [threading.Thread(target=slow_client, args=(n,), daemon=True) for n in range(args.slow)]
+        for t in slow_threads:
+            t.start()
+        time.sleep(0.5)  # 遅いリクエストがワーカーを埋めるのを待つ
+
+        latencies = []
+        errors = 0
+        deadline = time.monotonic() + args.duration
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                urllib.request.urlopen(f'{base_url}/api/shops?limit=50', timeout=60).read()
+                latencies.append(time.perf_counter() - start)
+            except OSError:
+                errors += 1
+            time.sleep(0.05)
+        stop.set()
+        for t in slow_threads:
+            t.join(timeout=args.delay * 2)
+
+        ms = [v * 1000 for v in latencies]
+        print(f'{profile:8s} /api/shops {len(ms):4d}件 '
+              f'p50={statistics.median(ms):7.1f}ms p95={percentile(ms, 95):7.1f}ms max={max(ms):7.1f}ms '
+              f'エラー={errors}  （遅い /api/geocode 完了 {len(slow_done)} 件）')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='遅いジオコーダーが /api/shops を止めないかの負荷試験')
+    parser.add_argument('--profiles', default='sync,gthread,gevent')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn のワーカー数')
+    parser.add_argument('--slow', type=int, default=4, help='遅いリクエストを同時に送り続けるクライアント数')
+    parser.add_argument('--delay', type=float, default=2.0, help='スタブのジオコーダー1回あたりの秒数')
+    parser.add_argument('--duration', type=float, default=10.0, help='/api/shops を測る秒数')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--database-url', help='省略時は furugiya.db のコピーに初期データを入れて使う')
+    args = parser.parse_args()
+
+    tmpdir = None
+    db_url = args.database_url
+    if not db_url:
+        tmpdir = tempfile.mkdtemp()
+        db_path = os.path.join(tmpdir, 'bench.db')
+        copy_sqlite_db(os.path.join(ROOT, 'furugiya.db'), db_path)
+        db_url = f'sqlite:///{db_path}'
+        flask_cli(db_url, 'seed')
+
+    print(f'ワーカー {args.workers} / 遅いクライアント {args.slow}（1回 {args.delay}秒）\n')
+    try:
+        for profile in args.profiles.split(','):
+            run_profile(profile.strip(), args, db_url)
+    finally:
+        if tmpdir:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+ベンチマーク用の共通部品（gunicorn の起動・停止、集計）。bench/ の各スクリプトから使う。
+"""
+import contextlib
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values, p):
+    """values の p パーセンタイル（最近傍法）"""
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def copy_sqlite_db(src, dst):
+    """SQLiteのDBを dst にコピーする。WAL にだけある（まだ本体に書き戻していない）更新も含めるため、
+    ファイルコピーではなく SQLite のバックアップAPIを使う"""
+    with contextlib.closing(sqlite3.connect(src)) as source, contextlib.closing(sqlite3.connect(dst)) as dest:
+        source.backup(dest)
+
+
+def wait_until_up(base_url, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(base_url + '/', timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('gunicorn が起動しませんでした')
+
+
+@contextlib.contextmanager
+def gunicorn_server(db_url, port, profile='gthread', workers=2, env=None):
+    """gunicorn.conf.py の設定で server:app を起動し、ベースURLを返す。
+    ジオコーダーはスタブ（ネットワークに出ない）"""
+    server_env = {
+        **os.environ,
+        'DATABASE_URL': db_url,
+        'GEOCODER': 'stub',
+        'GUNICORN_PROFILE': profile,
+        'WEB_CONCURRENCY': str(workers),
+        'PORT': str(port),
+        **(env or {}),
+    }
+    if 'GUNICORN_THREADS' not in (env or {}):
+        server_env.pop('GUNICORN_THREADS', None)
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--access-logfile', '/dev/null', 'server:app'],
+        cwd=ROOT, env=server_env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f'http://127.0.0.1:{port}'
+    try:
+        wait_until_up(base_url)
+        yield base_url
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=40)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+def flask_cli(db_url, *args):
+    """flask --app server <args> を DATABASE_URL=db_url で実行する"""
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'server', *args], cwd=ROOT,
+                   env={**os.environ, 'DATABASE_URL': db_url, 'GEOCODER': 'stub'},
+                   check=True, stdout=subprocess.DEVNULL)
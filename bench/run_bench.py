@@ -0,0 +1,240 @@
+"""
+APIの負荷試験。gunicorn（gunicorn.conf.py）を起動し、asyncio のHTTPクライアントで
+主要エンドポイントに同時 --users 人分のリクエストを --duration 秒流して、
+エンドポイントごとの p50 / p95 / p99 と RPS を表示する。ジオコーダーはスタブで、ネットワークには出ない。
+
+使い方:
+  # 一時SQLiteに合成データ（1万店・10万口コミ）を作って測る
+  python bench/run_bench.py
+  # 既存のDBを測る（SQLite と PostgreSQL を続けて比較。--generate で先に合成データを入れる）
+  python bench/run_bench.py --database-url sqlite:////tmp/bench.db --database-url postgresql://... --generate \\
+      --shops 100000 --reviews 1000000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+import urllib.request
+
+from harness import ROOT, copy_sqlite_db, flask_cli, gunicorn_server, percentile
+
+SEARCH_TERMS = ['古着', 'ヴィンテージ', '下北沢', '仙台', 'US', 'デニム', '高円寺']
+
+# (名前, 重み)。実際のアプリの呼び出し比率のおおよそ
+SCENARIOS = [
+    ('get_shops', 20),
+    ('search', 15),
+    ('geo_bbox', 15),
+    ('nearby', 15),
+    ('clusters', 10),
+    ('get_reviews', 20),
+    ('add_review', 5),
+]
+
+
+class HttpConnection:
+    """keep-alive で使い回す最小限のHTTP/1.1クライアント"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = self.writer = None
+
+    async def request(self, method, path, body=None):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        payload = json.dumps(body).encode() if body is not None else b''
+        head = (f'{method} {path} HTTP/1.1\r\nHost: {self.host}\r\nConnection: keep-alive\r\n'
+                f'Content-Length: {len(payload)}\r\n')
+        if body is not None:
+            head += 'Content-Type: application/json\r\n'
+        self.writer.write(head.encode() + b'\r\n' + payload)
+        try:
+            status_line = await self.reader.readline()
+            if not status_line:
+                raise ConnectionError('接続が閉じられました')
+            status = int(status_line.split()[1])
+            headers = {}
+            while True:
+                line = await self.reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                key, _, value = line.decode('latin-1').partition(':')
+                headers[key.strip().lower()] = value.strip()
+            if headers.get('transfer-encoding') == 'chunked':
+                data = b''
+                while True:
+                    size = int((await self.reader.readline()).strip(), 16)
+                    chunk = await self.reader.readexactly(size + 2)
+                    if size == 0:
+                        break
+                    data += chunk[:-2]
+            else:
+                data = await self.reader.readexactly(int(headers.get('content-length', 0)))
+            if headers.get('connection', '').lower() == 'close':
+                self.close()
+            return status, data
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError, IndexError):
+            self.close()
+            raise ConnectionError('応答を読めませんでした')
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+def load_fixture(base_url):
+    """リクエストのパラメータに使う店舗（id・座標）を集める"""
+    points, after_id = [], None
+    while len(points) < 5000:
+        query = urllib.parse.urlencode({'fields': 'id,latitude,longitude', 'limit': 500,
+                                        **({'after_id': after_id} if after_id else {})})
+        page = json.loads(urllib.request.urlopen(f'{base_url}/api/shops?{query}', timeout=60).read())
+        if not page:
+            break
+        points += [p for p in page if p['latitude'] and p['longitude']]
+        after_id = page[-1]['id']
+    if not points:
+        raise RuntimeError('店舗が1件もありません（--generate で合成データを入れてください）')
+    return points
+
+
+def build_request(name, rng, points):
+    """シナリオ名から (method, path, body) を作る"""
+    shop = rng.choice(points)
+    lat, lng = shop['latitude'], shop['longitude']
+    if name == 'get_shops':
+        return 'GET', f"/api/shops?limit=100&after_id={rng.choice(points)['id']}", None
+    if name == 'search':
+        return 'GET', '/api/shops?' + urllib.parse.urlencode({'q': rng.choice(SEARCH_TERMS), 'limit': 50}), None
+    if name == 'geo_bbox':
+        return 'GET', f'/api/shops?bbox={lat - 0.02},{lng - 0.03},{lat + 0.02},{lng + 0.03}&limit=200', None
+    if name == 'nearby':
+        return 'GET', f'/api/shops/nearby?lat={lat}&lng={lng}&limit=20', None
+    if name == 'clusters':
+        zoom = rng.randint(5, 14)
+        span = 360 / 2 ** zoom * 4
+        return 'GET', f'/api/shops/clusters?zoom={zoom}&bbox={lat - span},{lng - span},{lat + span},{lng + span}', None
+    if name == 'get_reviews':
+        return 'GET', f"/api/shops/{shop['id']}/reviews?limit=20", None
+    if name == 'add_review':
+        body = {'nickname': 'bench', 'rating': rng.randint(1, 5), 'comment': 'ベンチマーク'}
+        return 'POST', f"/api/shops/{shop['id']}/reviews", body
+    raise ValueError(name)
+
+
+async def virtual_user(host, port, deadline, points, results, seed):
+    rng = random.Random(seed)
+    names = [n for n, _ in SCENARIOS]
+    weights = [w for _, w in SCENARIOS]
+    conn = HttpConnection(host, port)
+    while time.monotonic() < deadline:
+        name = rng.choices(names, weights)[0]
+        method, path, body = build_request(name, rng, points)
+        start = time.perf_counter()
+        try:
+            status, _ = await conn.request(method, path, body)
+            ok = status < 400
+        except ConnectionError:
+            ok = False
+        elapsed = time.perf_counter() - start
+        stats = results.setdefault(name, {'latencies': [], 'errors': 0})
+        if ok:
+            stats['latencies'].append(elapsed)
+        else:
+            stats['errors'] += 1
+    conn.close()
+
+
+async def run_load(base_url, users, duration, points):
+    url = urllib.parse.urlparse(base_url)
+    results = {}
+    deadline = time.monotonic() + duration
+    started = time.monotonic()
+    await asyncio.gather(*(virtual_user(url.hostname, url.port, deadline, points, results, seed)
+                           for seed in range(users)))
+    return results, time.monotonic() - started
+
+
+def report(label, results, elapsed):
+    print(f'\n== {label} ==')
+    print(f"{'endpoint':12s} {'count':>7s} {'err':>5s} {'RPS':>8s} {'p50ms':>8s} {'p95ms':>8s} {'p99ms':>8s}")
+    total = 0
+    summary = {}
+    for name, _ in SCENARIOS:
+        stats = results.get(name)
+        if not stats:
+            continue
+        ms = [v * 1000 for v in stats['latencies']] or [float('nan')]
+        count = len(stats['latencies'])
+        total += count
+        row = {'count': count, 'errors': stats['errors'], 'rps': count / elapsed,
+               'p50': statistics.median(ms), 'p95': percentile(ms, 95), 'p99': percentile(ms, 99)}
+        summary[name] = row
+        print(f"{name:12s} {count:7d} {row['errors']:5d} {row['rps']:8.1f} "
+              f"{row['p50']:8.1f} {row['p95']:8.1f} {row['p99']:8.1f}")
+    print(f"{'total':12s} {total:7d} {'':5s} {total / elapsed:8.1f}")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='APIの負荷試験（p50/p95/p99・RPS）')
+    parser.add_argument('--database-url', action='append', default=[],
+                        help='測るDB（複数指定で順に比較）。省略時は一時SQLiteに合成データを作る')
+    parser.add_argument('--generate', action='store_true', help='測る前に合成データを投入する')
+    parser.add_argument('--shops', type=int, default=10000)
+    parser.add_argument('--reviews', type=int, default=100000)
+    parser.add_argument('--users', type=int, default=32, help='同時ユーザー数')
+    parser.add_argument('--duration', type=float, default=20.0, help='1DBあたりの計測秒数')
+    parser.add_argument('--profile', default='gthread', help='GUNICORN_PROFILE')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--json', help='結果をJSONで保存するパス')
+    args = parser.parse_args()
+
+    tmpdir = None
+    urls = args.database_url
+    if not urls:
+        tmpdir = tempfile.mkdtemp()
+        copy_sqlite_db(os.path.join(ROOT, 'furugiya.db'), os.path.join(tmpdir, 'bench.db'))
+        urls = [f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"]
+        args.generate = True
+
+    all_results = {}
+    try:
+        for db_url in urls:
+            label = db_url.split(':', 1)[0].split('+')[0]
+            if label in all_results:
+                label = f'{label}#{len(all_results) + 1}'
+            if args.generate:
+                print(f'合成データを投入中（{label}: {args.shops}店・{args.reviews}口コミ）...')
+                generate = os.path.join(ROOT, 'bench', 'generate_data.py')
+                subprocess.run([sys.executable, generate, '--database-url', db_url,
+                                '--shops', str(args.shops), '--reviews', str(args.reviews)], check=True)
+            else:
+                flask_cli(db_url, 'migrate')
+            with gunicorn_server(db_url, args.port, args.profile, args.workers) as base_url:
+                points = load_fixture(base_url)
+                results, elapsed = asyncio.run(run_load(base_url, args.users, args.duration, points))
+            all_results[label] = report(
+                f'{label} / {args.profile} x{args.workers} / {args.users} users / {elapsed:.0f}s', results, elapsed)
+    finally:
+        if tmpdir:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(all_results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
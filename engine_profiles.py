@@ -0,0 +1,70 @@
+"""
+DBごとの接続設定（SQLAlchemy の engine オプションと接続時の設定）。
+
+PostgreSQL: コネクションプールを gunicorn のスレッド数に合わせ、切れた接続の検知・
+  ステートメントのタイムアウトを設定する。ドライバが psycopg 3 のときは、同じSQLを
+  繰り返したらサーバー側の prepared statement を使う。
+SQLite: WAL で読み取りと書き込みを並行させ、ロック待ちはエラーにせず busy_timeout まで待つ。
+
+各値は環境変数で上書きできる。
+"""
+import os
+import sqlite3
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def pool_size():
+    """1プロセスあたりの常駐接続数。gunicorn のスレッド数（gunicorn.conf.py が GUNICORN_THREADS に書く）と同じ"""
+    return _env_int('DB_POOL_SIZE', _env_int('GUNICORN_THREADS', 5))
+
+
+def engine_options(url):
+    """SQLALCHEMY_ENGINE_OPTIONS に渡す辞書"""
+    url = make_url(url)
+    if url.get_backend_name() == 'postgresql':
+        size = pool_size()
+        options = {
+            'pool_size': size,
+            # ジオコーディングのキャッシュは別接続で読み書きするので、1スレッドで最大2本使う
+            'max_overflow': _env_int('DB_MAX_OVERFLOW', size),
+            'pool_timeout': _env_int('DB_POOL_TIMEOUT', 10),
+            'pool_pre_ping': True,  # DB再起動・アイドル切断後の接続を使う前に捨てる
+            'pool_recycle': _env_int('DB_POOL_RECYCLE', 1800),
+        }
+        statement_timeout = _env_int('DB_STATEMENT_TIMEOUT_MS', 15000)
+        connect_args = {'options': f'-c statement_timeout={statement_timeout}'}
+        if url.get_driver_name() == 'psycopg':
+            # 同じSQLを prepare_threshold 回実行したらサーバー側で prepare する（psycopg 3 のみ）
+            connect_args['prepare_threshold'] = _env_int('DB_PREPARE_THRESHOLD', 5)
+        options['connect_args'] = connect_args
+        return options
+    return {}
+
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',  # 読み取りが書き込みを待たない（DBファイル単位で永続）
+    'synchronous': 'NORMAL',  # WAL ではこれでもコミット済みデータは壊れない
+    'busy_timeout': os.environ.get('SQLITE_BUSY_TIMEOUT_MS', '5000'),
+    'mmap_size': os.environ.get('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)),
+}
+
+
+@event.listens_for(Engine, 'connect')
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    try:
+        in_memory = cursor.execute('PRAGMA database_list').fetchone()[2] == ''
+        for name, value in SQLITE_PRAGMAS.items():
+            if in_memory and name == 'journal_mode':
+                continue  # メモリDBは WAL にできない
+            cursor.execute(f'PRAGMA {name}={value}')
+    finally:
+        cursor.close()
@@ -7,54 +7,75 @@ APIキー不要・完全無料・日本の住所に特化。
   python geocode_fix.py --apply    # 実際にDBとCSVを更新
   python geocode_fix.py --all      # 関東含む全店舗を対象にする
   python geocode_fix.py --min 0    # ズレ量フィルタなし（全件表示）
+  python geocode_fix.py --workers 8 # 並列数（レート制限は GSI_RATE で調整）
+
+中断しても取得済みの結果はチェックポイントファイルに残り、次回はその続きから再開する。
 """
-import os, sys, re, csv, math, time, argparse, requests
+import os, sys, csv, json, argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-from server import app, db, Shop
+from server import app, db, Shop, geocoder
+from geocoding import GeocodeError, GeocodeService, gsi_lookup, make_session, stub_lookup
+from spatial import haversine_m, has_coords
 
 CSV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lib', 'shops.csv')
 
+CHECKPOINT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.geocode_fix_checkpoint.jsonl')
+
 TARGET_PREFECTURES = ('青森県', '秋田県', '岩手県', '山形県', '宮城県', '福島県')
 
-GSI_URL = 'https://msearch.gsi.go.jp/address-search/AddressSearch'
+# GSI だけを引く（Nominatim の1回/秒に全件が並ばないように）。キャッシュは server と共有するが、
+# Nominatim で得た座標は使わない（GeocodeService._usable）
+gsi_geocoder = GeocodeService(geocoder.store, providers=[
+    stub_lookup if os.environ.get('GEOCODER') == 'stub' else gsi_lookup])
+
+
+def load_checkpoint(path):
+    """前回までの結果 {shop_id: (lat, lng) | None} を読む"""
+    results = {}
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue  # 書き込み途中で止まった最終行
+                results[rec['id']] = tuple(rec['latLng']) if rec['latLng'] else None
+    return results
 
 
-def strip_building(address: str) -> str:
-    """ビル名・階数を除去して番地までに短縮する。
-    '宮城県仙台市青葉区中央2丁目10-3 第二MTビル2F' → '宮城県仙台市青葉区中央2丁目10-3'
+def geocode_all(shops, workers, checkpoint_path):
+    """店舗の住所をまとめて座標に変換する。
+
+    workers 並列・接続使い回し・一時的な失敗は再試行。結果は1件ずつ checkpoint_path に
+    追記するので、中断しても次回は未取得の店舗だけを処理する。
+    戻り値は {shop_id: (lat, lng) | None}（再試行しても通信に失敗した店舗は含まない）
     """
-    m = re.search(r'(\d+丁目\d+[-－]\d+|\d+[-－]\d+[-－]\d+|\d+[-－]\d+)', address)
-    if m:
-        return address[:m.end()].strip()
-    return address
-
-
-def geocode(address: str):
-    """国土地理院APIで住所→(lat, lng)を取得。失敗時はビル名なしで再試行。"""
-    for addr in [address, strip_building(address)]:
-        try:
-            r = requests.get(GSI_URL, params={'q': addr}, timeout=10)
-            results = r.json()
-            if results:
-                coords = results[0]['geometry']['coordinates']
-                lng, lat = coords[0], coords[1]
-                # 日本国内チェック
-                if 24 <= lat <= 46 and 122 <= lng <= 148:
-                    return lat, lng
-        except Exception:
-            pass
-        time.sleep(0.2)
-    return None, None
-
-
-def haversine_m(lat1, lon1, lat2, lon2):
-    R = 6371000
-    phi1, phi2 = math.radians(lat1), math.radians(lat2)
-    dphi = math.radians(lat2 - lat1)
-    dlam = math.radians(lon2 - lon1)
-    a = math.sin(dphi/2)**2 + math.cos(phi1)*math.cos(phi2)*math.sin(dlam/2)**2
-    return R * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    results = load_checkpoint(checkpoint_path)
+    todo = [(s.id, s.address) for s in shops if s.id not in results]
+    if results:
+        print(f"チェックポイントから {len(shops) - len(todo)} 件を再利用します")
+
+    session = make_session(workers)
+
+    def work(address):
+        with app.app_context():
+            return gsi_geocoder.geocode_with_retry(address, session=session)
+
+    with open(checkpoint_path, 'a', encoding='utf-8') as f, ThreadPoolExecutor(workers) as pool:
+        futures = {pool.submit(work, address): shop_id for shop_id, address in todo}
+        for done, future in enumerate(as_completed(futures), 1):
+            shop_id = futures[future]
+            try:
+                results[shop_id] = future.result()
+            except GeocodeError:
+                continue  # チェックポイントに残さず、次回もう一度試す
+            f.write(json.dumps({'id': shop_id, 'latLng': results[shop_id]}) + '\n')
+            f.flush()
+            if done % 50 == 0 or done == len(todo):
+                print(f"  取得 {done}/{len(todo)}", flush=True)
+    return results
 
 
 def update_csv(updates: dict):
@@ -80,8 +101,14 @@ def main():
     parser.add_argument('--all',   action='store_true', help='関東含む全店舗を対象にする')
     parser.add_argument('--min',   type=float, default=50,
                         help='報告するズレの最小距離（メートル）。デフォルト: 50m')
+    parser.add_argument('--workers', type=int, default=4, help='並列数。デフォルト: 4')
+    parser.add_argument('--checkpoint', default=CHECKPOINT_PATH, help='途中経過の保存先')
+    parser.add_argument('--fresh', action='store_true', help='チェックポイントを使わず最初からやり直す')
     args = parser.parse_args()
 
+    if args.fresh and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+
     updates = {}
     failed  = []
 
@@ -90,26 +117,41 @@ def main():
         shops = all_shops if args.all else [
             s for s in all_shops if any(p in s.address for p in TARGET_PREFECTURES)
         ]
-        print(f"対象: {len(shops)} 店舗 / 国土地理院ジオコーダー使用\n")
+        print(f"対象: {len(shops)} 店舗 / 国土地理院ジオコーダー使用（キャッシュあり・{args.workers}並列）\n")
+
+        results = geocode_all(shops, args.workers, args.checkpoint)
+        print()
 
         for i, shop in enumerate(shops, 1):
             print(f"[{i:3d}/{len(shops)}] {shop.name[:28]:28s} ...", end=' ', flush=True)
 
-            new_lat, new_lng = geocode(shop.address)
-
-            if new_lat is None:
+            if shop.id not in results:
+                print("通信エラー（次回再試行）")
+                failed.append(f"{shop.name} [通信エラー]")
+                continue
+            if results[shop.id] is None:
                 print("取得失敗")
                 failed.append(shop.name)
                 continue
+            new_lat, new_lng = results[shop.id]
 
-            dist = haversine_m(shop.latitude, shop.longitude, new_lat, new_lng)
+            if not has_coords(shop.latitude, shop.longitude):
+                dist = float('inf')  # 座標未設定の店舗は無条件に更新対象
+            else:
+                dist = haversine_m(shop.latitude, shop.longitude, new_lat, new_lng)
 
-            if dist > 15_000:
+            if dist != float('inf') and dist > 15_000:
                 print(f"⚠️  要確認({dist/1000:.1f}km) → ({new_lat:.6f},{new_lng:.6f})")
                 failed.append(f"{shop.name} [要確認:{dist/1000:.1f}km]")
                 continue
 
-            if dist >= args.min:
+            if dist == float('inf'):
+                print(f"座標なし → ({new_lat:.6f},{new_lng:.6f})")
+                updates[shop.name] = (new_lat, new_lng)
+                if args.apply:
+                    shop.latitude  = new_lat
+                    shop.longitude = new_lng
+            elif dist >= args.min:
                 print(f"{dist:6.0f}m  ({shop.latitude:.6f},{shop.longitude:.6f}) → ({new_lat:.6f},{new_lng:.6f})")
                 updates[shop.name] = (new_lat, new_lng)
                 if args.apply:
@@ -120,12 +162,17 @@ def main():
 
         print(f"\n{'='*70}")
         print(f"更新: {len(updates)}件 / 失敗・要確認: {len(failed)}件 / 変化なし: {len(shops)-len(updates)-len(failed)}件")
+        stats = gsi_geocoder.stats()
+        print(f"キャッシュ: ヒット {stats['hits'] + stats['negativeHits']}件 / 問い合わせ {stats['misses']}件")
 
         if failed:
             print("\n--- 取得失敗・要確認 ---")
             for n in failed:
                 print(f"  {n}")
 
+        if len(results) >= len(shops) and os.path.exists(args.checkpoint):
+            os.remove(args.checkpoint)  # 全件取得できたので再開用の記録は不要
+
         if args.apply:
             db.session.commit()
             update_csv(updates)
@@ -0,0 +1,259 @@
+"""
+住所 → 座標の変換（ジオコーディング）。
+国土地理院(GSI) → Nominatim の順に問い合わせ、結果を住所ごとにキャッシュする。
+
+キャッシュの保存先は get(key) / put(key, lat, lng, expires_at, provider) を持つオブジェクトで差し替えられる
+（本番は server.py の DbGeocodeStore、テストやベンチマークは MemoryGeocodeStore）。
+キャッシュには結果を出した問い合わせ先も残し、問い合わせ先の違う GeocodeService 同士
+（geocode_fix.py の GSI だけ / 店舗登録の GSI → Nominatim）で互いの結果を取り違えないようにする。
+Nominatim の1回/秒の制限は、既定ではプロセスごと。server.py は DbGeocodeStore.reserve で
+全プロセス共通の制限に切り替えている（use_shared_nominatim_limit）。
+環境変数 GEOCODER=stub でネットワークに出ない決定的なスタブ（stub_lookup）に切り替わる。
+GEOCODER_STUB_DELAY（秒）を付けると、遅い外部APIの代わりとして毎回その時間だけ待つ。
+"""
+import hashlib
+import os
+import re
+import threading
+import time
+import unicodedata
+from datetime import datetime, timedelta
+
+import requests
+
+GSI_URL = os.environ.get('GSI_URL', 'https://msearch.gsi.go.jp/address-search/AddressSearch')
+NOMINATIM_DOMAIN = os.environ.get('NOMINATIM_DOMAIN', 'nominatim.openstreetmap.org')
+USER_AGENT = 'furugiya_map_v2'
+REQUEST_TIMEOUT = 10
+
+POSITIVE_TTL = timedelta(days=90)
+NEGATIVE_TTL = timedelta(days=1)  # 見つからなかった住所も短期間覚えておく
+
+
+def strip_building(address: str) -> str:
+    """ビル名・階数を除去して番地までに短縮する。
+    '宮城県仙台市青葉区中央2丁目10-3 第二MTビル2F' → '宮城県仙台市青葉区中央2丁目10-3'
+    """
+    m = re.search(r'(\d+丁目\d+[-－]\d+|\d+[-－]\d+[-－]\d+|\d+[-－]\d+)', address)
+    if m:
+        return address[:m.end()].strip()
+    return address
+
+
+def normalize_address(address: str) -> str:
+    """キャッシュのキー。全角・半角と空白をそろえ、ビル名を落とす"""
+    address = unicodedata.normalize('NFKC', address or '')
+    address = re.sub(r'\s+', ' ', address).strip()
+    return strip_building(address)
+
+
+def in_japan(lat, lng):
+    return 24 <= lat <= 46 and 122 <= lng <= 148
+
+
+class GeocodeError(Exception):
+    """通信エラーなど、時間をおけば成功するかもしれない失敗"""
+
+
+class TokenBucket:
+    """毎秒 rate 回、最大 capacity 回まで連続で通すレート制限（スレッドセーフ）"""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= 1  # 足りなければ前借りし、その分だけ待つ
+            delay = -self._tokens / self.rate if self._tokens < 0 else 0
+        if delay > 0:
+            time.sleep(delay)
+
+
+class SharedRateLimit:
+    """複数プロセスで共有するレート制限。
+    reserve(name, interval) が共有の保存先に次の枠を予約し、その枠まで待つ秒数を返す
+    """
+
+    def __init__(self, reserve, name, interval):
+        self.reserve = reserve
+        self.name = name
+        self.interval = interval
+
+    def acquire(self):
+        delay = self.reserve(self.name, self.interval)
+        if delay > 0:
+            time.sleep(delay)
+
+
+_gsi_bucket = TokenBucket(float(os.environ.get('GSI_RATE', 5)), capacity=5)
+# Nominatim の利用規約: 最大1リクエスト/秒。既定はこのプロセス内だけの制限なので、
+# 複数プロセスから呼ぶときは use_shared_nominatim_limit で全体の制限に切り替える
+_nominatim_bucket = TokenBucket(1.0)
+
+
+def use_shared_nominatim_limit(reserve):
+    """Nominatim へのリクエストを、reserve を共有する全プロセスで合わせて1回/秒にする"""
+    global _nominatim_bucket
+    _nominatim_bucket = SharedRateLimit(reserve, 'nominatim', 1.0)
+
+
+def make_session(pool_size=4):
+    """接続を使い回す requests.Session（並列数ぶんのコネクションプール）"""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers['User-Agent'] = USER_AGENT
+    return session
+
+
+def gsi_lookup(address, session=None):
+    """国土地理院APIで (lat, lng) を返す。見つからなければNone。通信エラーは例外のまま"""
+    _gsi_bucket.acquire()
+    r = (session or requests).get(GSI_URL, params={'q': address}, timeout=REQUEST_TIMEOUT)
+    r.raise_for_status()
+    results = r.json()
+    if results:
+        lng, lat = results[0]['geometry']['coordinates'][:2]
+        if in_japan(lat, lng):
+            return lat, lng
+    return None
+
+
+def nominatim_lookup(address, session=None):
+    """Nominatim(OpenStreetMap)で (lat, lng) を返す。見つからなければNone"""
+    from geopy.geocoders import Nominatim
+    _nominatim_bucket.acquire()
+    geolocator = Nominatim(user_agent=USER_AGENT, domain=NOMINATIM_DOMAIN, timeout=REQUEST_TIMEOUT)
+    location = geolocator.geocode(address)
+    if location:
+        return location.latitude, location.longitude
+    return None
+
+
+STUB_DELAY = float(os.environ.get('GEOCODER_STUB_DELAY', 0))
+
+
+def stub_lookup(address, session=None):
+    """ネットワークを使わないスタブ。住所のハッシュから日本国内の座標を決める"""
+    if STUB_DELAY:
+        time.sleep(STUB_DELAY)
+    digest = hashlib.sha1(address.encode('utf-8')).digest()
+    lat = 33.0 + digest[0] / 255 * 10.0
+    lng = 130.0 + digest[1] / 255 * 12.0
+    return round(lat, 6), round(lng, 6)
+
+
+def provider_name(lookup):
+    """キャッシュに記録する問い合わせ先の名前（gsi_lookup → 'gsi'）"""
+    return lookup.__name__.removesuffix('_lookup')
+
+
+# provider を記録する前のキャッシュの行。どれも GSI → Nominatim の順で引いた結果
+LEGACY_PROVIDERS = 'gsi,nominatim'
+
+
+def default_providers():
+    if os.environ.get('GEOCODER') == 'stub':
+        return [stub_lookup]
+    return [gsi_lookup, nominatim_lookup]
+
+
+class MemoryGeocodeStore:
+    """プロセス内だけのキャッシュ（テスト・ベンチマーク用）"""
+
+    def __init__(self):
+        self.rows = {}
+
+    def get(self, key):
+        return self.rows.get(key)
+
+    def put(self, key, lat, lng, expires_at, provider):
+        self.rows[key] = (lat, lng, expires_at, provider)
+
+
+class GeocodeService:
+    """キャッシュ付きジオコーダー。geocode() は (lat, lng) か None を返す"""
+
+    def __init__(self, store, providers=None):
+        self.store = store
+        self.providers = providers if providers is not None else default_providers()
+        self.provider_names = [provider_name(lookup) for lookup in self.providers]
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'negativeHits': self.negative_hits,
+            'misses': self.misses,
+            'errors': self.errors,
+        }
+
+    def geocode(self, address, session=None, raise_errors=False):
+        """raise_errors=True なら一時的な失敗を None ではなく GeocodeError で知らせる"""
+        key = normalize_address(address)
+        if not key:
+            return None
+        cached = self.store.get(key)
+        if cached and self._usable(cached):
+            lat, lng = cached[:2]
+            if lat is None:
+                self.negative_hits += 1
+                return None
+            self.hits += 1
+            return lat, lng
+
+        self.misses += 1
+        error = None
+        queries = list(dict.fromkeys([address.strip(), key]))
+        for lookup in self.providers:
+            for query in queries:
+                try:
+                    result = lookup(query, session=session)
+                except Exception as e:
+                    error = e
+                    continue
+                if result:
+                    self.store.put(key, result[0], result[1], datetime.now() + POSITIVE_TTL,
+                                   provider_name(lookup))
+                    return result
+        if error is not None:
+            # 通信エラーを含む失敗は一時的なものかもしれないのでキャッシュしない
+            self.errors += 1
+            if raise_errors:
+                raise GeocodeError(f'{type(error).__name__}: {error}') from error
+            return None
+        self.store.put(key, None, None, datetime.now() + NEGATIVE_TTL, ','.join(self.provider_names))
+        return None
+
+    def _usable(self, cached):
+        """期限内で、自分の問い合わせ先で得られた結果か。
+        見つかった結果は自分が使う問い合わせ先のものだけ、見つからなかった結果は
+        自分の問い合わせ先をすべて試した上でのものだけを使う"""
+        lat, _, expires_at, provider = cached
+        if expires_at <= datetime.now():
+            return False
+        providers = set((provider or LEGACY_PROVIDERS).split(','))
+        if lat is None:
+            return providers >= set(self.provider_names)
+        return providers <= set(self.provider_names)
+
+    def geocode_with_retry(self, address, session=None, retries=3, backoff=1.0):
+        """一時的な失敗は backoff 秒から倍々に待って再試行する。最後まで失敗したら GeocodeError"""
+        for attempt in range(retries + 1):
+            try:
+                return self.geocode(address, session=session, raise_errors=True)
+            except GeocodeError:
+                if attempt == retries:
+                    raise
+                time.sleep(backoff * 2 ** attempt)
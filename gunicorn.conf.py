@@ -0,0 +1,69 @@
+"""
+gunicorn の設定（Procfile: web: gunicorn server:app が自動で読み込む）。
+
+GUNICORN_PROFILE でワーカーの種類を切り替える:
+  gthread（既定） ワーカー × スレッド。ジオコーディングなど遅い外部呼び出しが
+                 あっても、同じワーカーの他のスレッドが /api/shops などを返し続ける
+  gevent          1ワーカーで多数の接続を協調的に処理する（要 pip install gevent）
+  sync            従来どおり（1ワーカー = 1リクエスト）
+数値は WEB_CONCURRENCY / GUNICORN_THREADS / GUNICORN_WORKER_CONNECTIONS などで上書きできる。
+
+DBの初期化・初期データ投入は import 時には行わず、デプロイ前の flask --app server seed
+（Railway: railway.json の preDeployCommand / Heroku系: Procfile の release）で済ませているので、
+preload_app でマスターが先にアプリを読み込んでも安全。それが流れなかったときのために、
+on_starting でスキーマが古ければワーカーを起動する前に移行する（server.ensure_schema）。
+"""
+import multiprocessing
+import os
+
+profile = os.environ.get('GUNICORN_PROFILE', 'gthread')
+if profile == 'gevent':
+    # マスターがアプリ（requests・DBドライバ）を読み込む前にパッチを当てる
+    from gevent import monkey
+    monkey.patch_all()
+
+cpus = multiprocessing.cpu_count()
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', min(2 * cpus + 1, 8)))
+
+if profile == 'gevent':
+    worker_class = 'gevent'
+    worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 200))
+    # 同時にDBを使うグリーンレットの上限。あふれた分は pool_timeout まで接続を待つ
+    db_concurrency = int(os.environ.get('GUNICORN_THREADS', 10))
+elif profile == 'gthread':
+    worker_class = 'gthread'
+    threads = int(os.environ.get('GUNICORN_THREADS', 4))
+    db_concurrency = threads
+else:
+    worker_class = 'sync'
+    db_concurrency = 1
+
+# engine_profiles.pool_size() がこの値でコネクションプールの大きさを決める
+os.environ['GUNICORN_THREADS'] = str(db_concurrency)
+
+preload_app = True  # 読み込みは1回だけ。ワーカー起動が速く、メモリも共有される
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))  # これ以上応答しないワーカーは再起動
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))  # 再起動・停止時に処理中のリクエストを待つ秒数
+keepalive = 5
+max_requests = 2000  # メモリの膨張を防ぐため、時々ワーカーを入れ替える
+max_requests_jitter = 200
+
+accesslog = '-'
+
+
+def on_starting(server):
+    # マスターで1回だけ。ワーカーは最新のスキーマでしか起動しない
+    from server import app, ensure_schema
+    with app.app_context():
+        ensure_schema()
+
+
+def post_fork(server, worker):
+    # マスターで作られたコネクションをワーカー間で共有しないよう、プールを作り直させる
+    from server import app, db, start_geocode_thread
+    with app.app_context():
+        db.engine.dispose(close=False)
+    start_geocode_thread()  # GEOCODE_WORKER_THREAD=1 のときだけ。スレッドは fork を越えないのでワーカーごとに起動する
@@ -81,13 +81,47 @@ class ApiService {
     }
   }
 
-  // 記事投稿
-  static Future<void> postArticle(Map<String, dynamic> articleData) async {
+  // 管理者トークン（/admin/login で取得し、期限が切れるまで使い回す）
+  static String? _adminToken;
+  static DateTime? _adminTokenExpiresAt;
+
+  // 管理者ログイン（パスワードはここでだけ送る）
+  static Future<String> adminLogin(String password) async {
     final response = await http.post(
-      Uri.parse('$baseUrl/articles'),
+      Uri.parse('$baseUrl/admin/login'),
       headers: {"Content-Type": "application/json"},
+      body: jsonEncode({"password": password}),
+    );
+    if (response.statusCode != 200) {
+      throw Exception('パスワードが違います');
+    }
+    final body = jsonDecode(utf8.decode(response.bodyBytes));
+    final expiresIn = (body['expiresIn'] as num).toInt();
+    _adminToken = body['token'] as String;
+    // 期限ぎりぎりで弾かれないよう、1分早めに取り直す
+    _adminTokenExpiresAt = DateTime.now().add(Duration(seconds: expiresIn - 60));
+    return _adminToken!;
+  }
+
+  static Future<Map<String, String>> _adminHeaders(String password) async {
+    var token = _adminToken;
+    if (token == null || DateTime.now().isAfter(_adminTokenExpiresAt!)) {
+      token = await adminLogin(password);
+    }
+    return {"Content-Type": "application/json", "Authorization": "Bearer $token"};
+  }
+
+  // 記事投稿（管理者）
+  static Future<void> postArticle(Map<String, dynamic> articleData, {required String password}) async {
+    final response = await http.post(
+      Uri.parse('$baseUrl/articles'),
+      headers: await _adminHeaders(password),
       body: jsonEncode(articleData),
     );
+    if (response.statusCode == 401) {
+      _adminToken = null; // サーバーの鍵が変わった等。次回はログインし直す
+      throw Exception('認証に失敗しました。もう一度お試しください');
+    }
     if (response.statusCode != 201) {
       throw Exception('記事の投稿に失敗しました');
     }
@@ -24,9 +24,8 @@ class _ArticlePostScreenState extends State<ArticlePostScreen> {
         "title": _title,
         "content": _content,
         "genre": _genre,
-        "password": _password,
       };
-      await ApiService.postArticle(articleData);
+      await ApiService.postArticle(articleData, password: _password);
       if (mounted) {
         ScaffoldMessenger.of(context).showSnackBar(const SnackBar(content: Text('投稿しました')));
         Navigator.pop(context);
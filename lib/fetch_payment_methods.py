@@ -1,13 +1,21 @@
 """
 支払い方法を自動検索してshops.csvに書き戻すスクリプト
-使い方: python fetch_payment_methods.py
+使い方: python fetch_payment_methods.py [--workers 4] [--rate 0.8] [--checkpoint-every 20]
 依存: pip install duckduckgo-search
+
+検索結果は店舗ごとに .payment_cache/ に保存し、CSVは --checkpoint-every 件ごとに書き戻す。
+途中で止まっても、再実行すれば入力済みの行とキャッシュ済みの検索は飛ばして続きから処理する。
 """
 
+import argparse
 import csv
+import hashlib
+import json
+import threading
 import time
 import re
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 try:
     from duckduckgo_search import DDGS
@@ -30,43 +38,96 @@ KEYWORD_RULES = [
     (r'現金',                                        '現金'),
 ]
 
+# 起動時に1度だけコンパイルしておく
+_COMPILED_RULES = [(re.compile(pattern), label) for pattern, label in KEYWORD_RULES]
+
+
 def extract_payment_keywords(text: str) -> list[str]:
     """テキストから支払いキーワードを抽出して重複なしリストで返す"""
     text_lower = text.lower()
     found = []
-    for pattern, label in KEYWORD_RULES:
-        if re.search(pattern, text_lower) and label not in found:
+    for pattern, label in _COMPILED_RULES:
+        if label not in found and pattern.search(text_lower):
             found.append(label)
     return found
 
-def search_payment_methods(shop_name: str, address: str) -> str:
-    """DuckDuckGoで検索し、スニペットから支払い方法を推定する"""
-    query = f"{shop_name} {address} 支払い方法"
-    print(f"  検索中: {query[:60]}...")
 
-    try:
-        with DDGS() as ddgs:
-            results = list(ddgs.text(query, max_results=5))
-    except Exception as e:
-        print(f"  ⚠️  検索エラー: {e}")
-        return ''
+# ---- レート制限・キャッシュ ----
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.payment_cache')
+
+
+class RateLimiter:
+    """全ワーカー合計で毎秒 rate 回までに抑える（スレッドセーフ）"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+def _cache_path(query: str) -> str:
+    return os.path.join(CACHE_DIR, hashlib.sha1(query.encode('utf-8')).hexdigest() + '.json')
+
+
+def fetch_search_results(query: str, limiter: RateLimiter) -> list[dict]:
+    """検索結果（生データ）を返す。一度取れたものはディスクのキャッシュから読む。
+    検索エラーはキャッシュせず例外のまま返す"""
+    path = _cache_path(query)
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)['results']
+
+    limiter.wait()
+    with DDGS() as ddgs:
+        results = list(ddgs.text(query, max_results=5))
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({'query': query, 'results': results}, f, ensure_ascii=False)
+    os.replace(tmp, path)
+    return results
+
+
+def search_payment_methods(shop_name: str, address: str, limiter: RateLimiter) -> str:
+    """DuckDuckGoで検索し、スニペットから支払い方法を推定する（見つからなければ空文字）"""
+    query = f"{shop_name} {address} 支払い方法"
+    results = fetch_search_results(query, limiter)
 
     # 全スニペット + タイトルをまとめて1つのテキストにする
     combined = ' '.join(
         f"{r.get('title', '')} {r.get('body', '')}" for r in results
     )
+    return '・'.join(extract_payment_keywords(combined))
 
-    keywords = extract_payment_keywords(combined)
 
-    if keywords:
-        result_str = '・'.join(keywords)
-        print(f"  → 検出: {result_str}")
-        return result_str
-    else:
-        print("  → キーワードなし")
-        return ''
+def write_csv(csv_path, fieldnames, rows):
+    """一時ファイルに書いてから置き換える（書き込み中に止まってもCSVが壊れない）"""
+    tmp = csv_path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(tmp, csv_path)
+
 
 def main():
+    parser = argparse.ArgumentParser(description='支払い方法を検索して shops.csv を補完する')
+    parser.add_argument('--workers', type=int, default=4, help='並列数。デフォルト: 4')
+    parser.add_argument('--rate', type=float, default=0.8,
+                        help='全体で毎秒何回まで検索するか。デフォルト: 0.8')
+    parser.add_argument('--checkpoint-every', type=int, default=20,
+                        help='何件処理するごとにCSVへ書き戻すか。デフォルト: 20')
+    args = parser.parse_args()
+
     csv_path = os.path.join(os.path.dirname(__file__), 'shops.csv')
 
     # CSV読み込み
@@ -87,31 +148,50 @@ def main():
         print("全行に支払い方法が設定済みです。")
         return
 
-    updated = 0
-    for i, row in enumerate(rows):
-        if row.get('payment_methods', '').strip():
-            continue  # 既に入力済みはスキップ
-
-        shop_name = row.get('name', '').strip()
-        address   = row.get('address', '').strip()
-
-        print(f"[{updated + 1}/{len(targets)}] {shop_name}")
-        result = search_payment_methods(shop_name, address)
-
-        if result:
-            row['payment_methods'] = result
-            updated += 1
-
-        # レート制限対策（1秒待機）
-        time.sleep(1.2)
-
-    # CSV書き戻し
-    with open(csv_path, 'w', encoding='utf-8-sig', newline='') as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(rows)
+    limiter = RateLimiter(args.rate)
+    updated = errors = 0
+    dirty = False
+    with ThreadPoolExecutor(args.workers) as pool:
+        futures = {
+            pool.submit(search_payment_methods,
+                        row.get('name', '').strip(), row.get('address', '').strip(), limiter): row
+            for row in targets
+        }
+        try:
+            for done, future in enumerate(as_completed(futures), 1):
+                row = futures[future]
+                prefix = f"[{done}/{len(targets)}] {row.get('name', '').strip()}"
+                try:
+                    result = future.result()
+                except Exception as e:
+                    errors += 1
+                    print(f"{prefix}\n  ⚠️  検索エラー: {e}")
+                    continue
+
+                if result:
+                    row['payment_methods'] = result
+                    updated += 1
+                    dirty = True
+                    print(f"{prefix}\n  → 検出: {result}")
+                else:
+                    print(f"{prefix}\n  → キーワードなし")
+
+                if dirty and done % args.checkpoint_every == 0:
+                    write_csv(csv_path, fieldnames, rows)
+                    dirty = False
+                    print(f"  💾 途中保存しました（{updated} 件更新済み）")
+        except KeyboardInterrupt:
+            for future in futures:
+                future.cancel()
+            print("\n中断しました。ここまでの結果を保存します")
+        finally:
+            # CSV書き戻し
+            if dirty:
+                write_csv(csv_path, fieldnames, rows)
 
     print(f"\n✅ 完了！ {updated} 件を更新しました → shops.csv")
+    if errors:
+        print(f"⚠️  検索エラー {errors} 件（再実行すると続きから処理します）")
     print("\n次のステップ: python import_csv.py でDBに同期してください")
 
 if __name__ == '__main__':
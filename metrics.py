@@ -0,0 +1,215 @@
+"""
+リクエスト単位の計測。ルートごとの処理時間・DB時間・クエリ数・レスポンスサイズを集計し、
+/metrics で Prometheus のテキスト形式で返す。
+
+- 遅いクエリ（SLOW_QUERY_MS 以上）は SQL と呼び出し元（このリポジトリ内の関数）をログに出す
+- 1リクエスト内で同じSQLが N_PLUS_ONE_THRESHOLD 回以上流れたら N+1 の疑いとしてログに出す
+  （一覧の各行でリレーションを読むような、1行ごとにクエリが飛ぶパターン）
+- 各レスポンスに Server-Timing ヘッダー（app / db の所要時間）を付ける
+
+集計はプロセスごと。gunicorn で複数ワーカーのときは、/metrics に答えたワーカーの値が
+pid ラベル付きで返る。METRICS_TOKEN を設定すると /metrics に Authorization: Bearer が必要になる。
+"""
+import logging
+import os
+import sys
+import threading
+import time
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 200))
+N_PLUS_ONE_THRESHOLD = int(os.environ.get('N_PLUS_ONE_THRESHOLD', 10))
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+logger = logging.getLogger('furugi.metrics')
+
+
+class RequestStats:
+    """1リクエスト分の計測値（flask.g に載せる）"""
+
+    __slots__ = ('started', 'db_seconds', 'queries', 'statements', 'slow_queries', 'n_plus_one', 'recorded')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_seconds = 0.0
+        self.queries = 0
+        self.statements = {}  # SQL → 実行回数（N+1 検出用）
+        self.slow_queries = 0
+        self.n_plus_one = 0
+        self.recorded = False
+
+
+class Registry:
+    """ルート（URLルール）・メソッドごとの累計（スレッドセーフ）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}  # (route, method, status) → 件数
+        self.routes = {}  # (route, method) → 集計値の辞書
+
+    def observe(self, route, method, status, stats, seconds, response_bytes):
+        with self._lock:
+            key = (route, method, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            r = self.routes.get((route, method))
+            if r is None:
+                r = self.routes[(route, method)] = {
+                    'buckets': [0] * len(LATENCY_BUCKETS), 'seconds': 0.0, 'count': 0,
+                    'db_seconds': 0.0, 'queries': 0, 'bytes': 0, 'n_plus_one': 0, 'slow_queries': 0,
+                }
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    r['buckets'][i] += 1
+            r['seconds'] += seconds
+            r['count'] += 1
+            r['db_seconds'] += stats.db_seconds
+            r['queries'] += stats.queries
+            r['bytes'] += response_bytes
+            r['n_plus_one'] += stats.n_plus_one
+            r['slow_queries'] += stats.slow_queries
+
+    def render(self):
+        """Prometheus のテキスト形式"""
+        pid = os.getpid()
+        lines = []
+
+        def labels(route, method, **extra):
+            items = {'route': route, 'method': method, 'pid': pid, **extra}
+            return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in items.items()) + '}'
+
+        with self._lock:
+            requests = dict(self.requests)
+            routes = {k: {**v, 'buckets': list(v['buckets'])} for k, v in self.routes.items()}
+
+        lines += ['# HELP furugi_http_requests_total リクエスト数',
+                  '# TYPE furugi_http_requests_total counter']
+        for (route, method, status), count in sorted(requests.items()):
+            lines.append(f'furugi_http_requests_total{labels(route, method, status=status)} {count}')
+
+        lines += ['# HELP furugi_http_request_duration_seconds 処理時間（リクエスト受信から応答まで）',
+                  '# TYPE furugi_http_request_duration_seconds histogram']
+        for (route, method), r in sorted(routes.items()):
+            for bound, count in zip(LATENCY_BUCKETS, r['buckets']):
+                lines.append(f'furugi_http_request_duration_seconds_bucket{labels(route, method, le=bound)} {count}')
+            lines.append(f'furugi_http_request_duration_seconds_bucket{labels(route, method, le="+Inf")} {r["count"]}')
+            lines.append(f'furugi_http_request_duration_seconds_sum{labels(route, method)} {r["seconds"]:.6f}')
+            lines.append(f'furugi_http_request_duration_seconds_count{labels(route, method)} {r["count"]}')
+
+        counters = [
+            ('furugi_db_query_duration_seconds_total', 'DBクエリの合計時間', 'db_seconds'),
+            ('furugi_db_queries_total', 'DBクエリ数', 'queries'),
+            ('furugi_http_response_bytes_total', 'レスポンス本文のバイト数（圧縮後）', 'bytes'),
+            ('furugi_n_plus_one_total', 'N+1 の疑いがあったリクエスト数', 'n_plus_one'),
+            ('furugi_slow_queries_total', f'{SLOW_QUERY_MS:g}ms 以上かかったクエリ数', 'slow_queries'),
+        ]
+        for name, help_text, field in counters:
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+            for (route, method), r in sorted(routes.items()):
+                value = r[field]
+                lines.append(f'{name}{labels(route, method)} {value:.6f}' if isinstance(value, float)
+                             else f'{name}{labels(route, method)} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _caller():
+    """SQLを発行した、このリポジトリ内で一番内側の関数（'server.py:123 get_shops'）"""
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(ROOT) and filename != __file__ and 'site-packages' not in filename:
+            return f'{os.path.relpath(filename, ROOT)}:{frame.f_lineno} {frame.f_code.co_name}'
+        frame = frame.f_back
+    return '?'
+
+
+def _route():
+    rule = request.url_rule
+    return (rule.rule if rule is not None else 'unmatched'), request.method
+
+
+registry = Registry()
+
+
+def init_metrics(app):
+    """app にリクエストの計測フックと /metrics を登録する"""
+
+    @app.before_request
+    def _start_request_stats():
+        g._request_stats = RequestStats()
+
+    def record(status, response_bytes):
+        stats = g.get('_request_stats')
+        if stats is None or stats.recorded:
+            return None
+        stats.recorded = True
+        route, method = _route()
+        if route == '/metrics':
+            return None
+        seconds = time.perf_counter() - stats.started
+        registry.observe(route, method, status, stats, seconds, response_bytes)
+        return stats, seconds
+
+    @app.after_request
+    def _record_request_stats(response):
+        result = record(response.status_code, response.content_length or 0)
+        if result:
+            stats, seconds = result
+            response.headers['Server-Timing'] = \
+                f'app;dur={seconds * 1000:.1f}, db;dur={stats.db_seconds * 1000:.1f};desc="{stats.queries} queries"'
+        return response
+
+    @app.teardown_request
+    def _record_failed_request(exc):
+        if exc is not None:
+            record(500, 0)  # 例外で after_request を通らなかったリクエスト
+
+    @app.route('/metrics')
+    def metrics():
+        token = os.environ.get('METRICS_TOKEN')
+        if token and request.headers.get('Authorization') != f'Bearer {token}':
+            return 'unauthorized\n', 401
+        return registry.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # 開始時刻は文ごとの実行コンテキストに持たせる（接続に持たせると、失敗した文の分が残り続ける）
+    if context is not None:
+        context._metrics_started = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_metrics_started', None)
+    if started is None:
+        return
+    seconds = time.perf_counter() - started
+    if not has_request_context():
+        return  # CLI・ジオコーディングのワーカーなどリクエスト外のクエリは数えない
+    stats = g.get('_request_stats')
+    if stats is None:
+        return
+    stats.db_seconds += seconds
+    stats.queries += 1
+    count = stats.statements.get(statement, 0) + 1
+    stats.statements[statement] = count
+
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        stats.slow_queries += 1
+        route, method = _route()
+        logger.warning('遅いクエリ %.0fms %s %s（呼び出し元: %s）\n%s',
+                       seconds * 1000, method, route, _caller(), statement)
+    if count == N_PLUS_ONE_THRESHOLD:
+        # 同じSQLが1リクエストで何度も流れている = 行ごとにクエリを発行している疑い
+        stats.n_plus_one += 1
+        route, method = _route()
+        logger.warning('N+1 の疑い: %s %s で同じクエリが %d 回以上（呼び出し元: %s）\n%s',
+                       method, route, N_PLUS_ONE_THRESHOLD, _caller(), statement)
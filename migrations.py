@@ -0,0 +1,186 @@
+"""
+バージョン付きスキーマ移行（SQLite / PostgreSQL 共通）。
+
+適用済みのバージョンは schema_version テーブルに記録し、未適用のものだけを番号順に1回ずつ流す。
+各移行は1トランザクションで実行され、失敗すればその移行ごと巻き戻って例外になる（記録もされない）。
+
+新しいテーブルは server.py のモデルから db.create_all() で作られるので、ここに書くのは
+既存テーブルへの列・索引・制約の追加と、それに伴うデータの直しだけ。
+一度リリースした移行は書き換えず、変更は新しい番号の移行として末尾に足すこと。
+"""
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, text
+
+_metadata = MetaData()
+schema_version = Table(
+    'schema_version', _metadata,
+    Column('version', Integer, primary_key=True),
+    Column('name', String(100), nullable=False),
+    Column('applied_at', DateTime, nullable=False),
+)
+
+MIGRATIONS = []  # (version, name, fn) をバージョン順に
+_PG_LOCK_ID = 7468201  # 複数プロセスが同時に移行しないための advisory lock の番号
+
+
+class MigrationError(Exception):
+    """データの状態などのせいで移行を適用できない"""
+
+
+def migration(version, name):
+    """移行関数を登録するデコレーター。fn(ctx: MigrationContext) を受け取る"""
+    def register(fn):
+        if MIGRATIONS and version <= MIGRATIONS[-1][0]:
+            raise ValueError(f'migration {version} は {MIGRATIONS[-1][0]} より後の番号にしてください')
+        MIGRATIONS.append((version, name, fn))
+        return fn
+    return register
+
+
+class MigrationContext:
+    """移行関数に渡すヘルパー（1つのトランザクション内のコネクションを包む）"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.dialect = conn.dialect.name
+
+    def execute(self, sql, **params):
+        return self.conn.execute(text(sql), params)
+
+    def columns(self, table):
+        return {c['name'] for c in inspect(self.conn).get_columns(table)}
+
+    def add_column(self, table, column, ddl):
+        """列が無ければ追加する。追加したら True"""
+        if column in self.columns(table):
+            return False
+        self.execute(f'ALTER TABLE {table} ADD COLUMN {column} {ddl}')
+        return True
+
+    def create_index(self, name, table, columns, unique=False):
+        """索引を作る（既にあれば何もしない）。columns は '列名' か '列名 演算子クラス' などのリスト"""
+        self.execute(
+            f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})")
+
+
+def applied_versions(conn):
+    return {row[0] for row in conn.execute(schema_version.select().with_only_columns(schema_version.c.version))}
+
+
+def run_migrations(engine, log=print):
+    """未適用の移行を番号順に流し、適用したバージョンのリストを返す"""
+    applied = []
+    with engine.connect() as conn:
+        if conn.dialect.name == 'postgresql':
+            conn.execute(text('SELECT pg_advisory_lock(:id)'), {'id': _PG_LOCK_ID})
+            conn.commit()
+        try:
+            with conn.begin():
+                _metadata.create_all(conn, checkfirst=True)
+            done = applied_versions(conn)
+            conn.commit()  # 読み取りで始まったトランザクションを閉じる
+            for version, name, fn in MIGRATIONS:
+                if version in done:
+                    continue
+                with conn.begin():
+                    fn(MigrationContext(conn))
+                    conn.execute(schema_version.insert().values(
+                        version=version, name=name, applied_at=datetime.now()))
+                log(f'✅ migration {version:03d} {name} を適用しました')
+                applied.append(version)
+        finally:
+            if conn.dialect.name == 'postgresql':
+                conn.execute(text('SELECT pg_advisory_unlock(:id)'), {'id': _PG_LOCK_ID})
+                conn.commit()
+    return applied
+
+
+def current_version(engine):
+    """適用済みの最新バージョン（未作成なら 0）"""
+    with engine.connect() as conn:
+        if not inspect(conn).has_table('schema_version'):
+            return 0
+        return max(applied_versions(conn), default=0)
+
+
+# ==========================================
+#  移行の定義（番号順）
+# ==========================================
+
+@migration(1, 'legacy_columns')
+def add_legacy_columns(ctx):
+    """旧 migrate_db が足していた列。古いDBにだけ効く"""
+    for table, column, ddl in [
+        ('shop', 'nearest_station', "VARCHAR(100) DEFAULT ''"),
+        ('shop', 'place_id', "VARCHAR(100) DEFAULT ''"),
+        ('shop', 'plus_code', "VARCHAR(50) DEFAULT ''"),
+        ('shop', 'holiday', "VARCHAR(100) DEFAULT 'なし'"),
+        ('shop', 'payment_methods', "VARCHAR(200) DEFAULT '不明'"),
+        ('shop', 'parking', "VARCHAR(20) DEFAULT ''"),
+        ('shop', 'search_text', "TEXT DEFAULT ''"),
+        ('shop', 'revision', 'INTEGER DEFAULT 0'),
+        ('shop', 'rating_sum', 'FLOAT DEFAULT 0'),
+        ('shop', 'geocode_status', "VARCHAR(20) DEFAULT 'ok'"),
+        ('review', 'revision', 'INTEGER DEFAULT 0'),
+        ('notice', 'revision', 'INTEGER DEFAULT 0'),
+        ('shop_media', 'revision', 'INTEGER DEFAULT 0'),
+        ('admin', 'password_hash', 'VARCHAR(256)'),
+    ]:
+        ctx.add_column(table, column, ddl)
+
+
+@migration(2, 'shop_and_child_indexes')
+def add_shop_and_child_indexes(ctx):
+    """地図の範囲検索・差分同期と、店舗ごとの口コミ・お知らせ・メディア一覧（shop_id の外部キー）"""
+    ctx.create_index('ix_shop_lat_lng', 'shop', ['latitude', 'longitude'])
+    ctx.create_index('ix_shop_revision', 'shop', ['revision'])
+    ctx.create_index('ix_review_shop_id_id', 'review', ['shop_id', 'id'])
+    ctx.create_index('ix_notice_shop_id_id', 'notice', ['shop_id', 'id'])
+    ctx.create_index('ix_shop_media_shop_id_id', 'shop_media', ['shop_id', 'id'])
+
+
+@migration(3, 'shop_lookup_indexes')
+def add_shop_lookup_indexes(ctx):
+    """シード・CSV取り込みの照合（店名+住所 / place_id）と県名での絞り込み用。
+    店名+住所は一意にする（ON CONFLICT DO NOTHING の重複除外もこれに依存する）"""
+    duplicates = ctx.execute(
+        'SELECT name, address, COUNT(*) FROM shop GROUP BY name, address HAVING COUNT(*) > 1').fetchall()
+    if duplicates:
+        listing = '\n'.join(f'  {name} / {address}（{count}件）' for name, address, count in duplicates[:20])
+        raise MigrationError(
+            f'店名+住所が重複している店舗が {len(duplicates)} 組あります。'
+            f'どちらかを削除・修正してから再実行してください:\n{listing}')
+    ctx.create_index('ux_shop_name_address', 'shop', ['name', 'address'], unique=True)
+    # 同じ place_id の別店舗が実データにあるので一意にはしない
+    ctx.create_index('ix_shop_place_id', 'shop', ['place_id'])
+    # 住所の前方一致（'秋田県%'）用。LIKE に索引が使われる条件が DB ごとに違う
+    # （PostgreSQL: text_pattern_ops / SQLite: NOCASE 照合の索引）
+    address = {'postgresql': 'address text_pattern_ops', 'sqlite': 'address COLLATE NOCASE'}
+    ctx.create_index('ix_shop_address', 'shop', [address.get(ctx.dialect, 'address')])
+
+
+@migration(4, 'cache_generation_columns')
+def add_cache_generation_columns(ctx):
+    """キャッシュの世代を分ける列。一覧（店舗の行）・グリッド/クラスタ（座標）・店舗詳細（子データ）"""
+    ctx.add_column('sync_state', 'shops_revision', 'INTEGER NOT NULL DEFAULT 0')
+    ctx.add_column('sync_state', 'geo_revision', 'INTEGER NOT NULL DEFAULT 0')
+    ctx.add_column('shop', 'children_revision', 'INTEGER DEFAULT 0')
+
+
+@migration(5, 'shop_genres_search')
+def add_shop_genres_search(ctx):
+    """genre= の絞り込み用に正規化したジャンル列。値は server.ensure_search_index が埋める（NULLの行が対象）"""
+    ctx.add_column('shop', 'genres_search', 'TEXT')
+
+
+@migration(6, 'geocode_cache_provider')
+def add_geocode_cache_provider(ctx):
+    """キャッシュに結果を出した問い合わせ先を残す（NULL の行は geocoding.LEGACY_PROVIDERS 扱い）"""
+    ctx.add_column('geocode_cache', 'provider', 'VARCHAR(50)')
+
+
+@migration(7, 'shop_search_bigrams')
+def add_shop_search_bigrams(ctx):
+    """2文字の検索語用の列。値と索引は server.ensure_search_index が作る（NULLの行が対象）"""
+    ctx.add_column('shop', 'search_bigrams', 'TEXT')
@@ -0,0 +1,99 @@
+"""
+APIレスポンスの符号化（JSONシリアライズと圧縮）。
+orjson / brotli が入っていればそれを使い、なければ標準の json / gzip だけで動く。
+"""
+import gzip
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MIN_COMPRESS_BYTES = 1024  # これより小さい本文は圧縮しても得にならない
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # 11 は圧縮率こそ高いが1件あたり数十倍遅い
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """app.json を orjson で高速化する。
+
+    キー順（sort_keys）・日付の書式など出力は既定の実装に合わせ、日本語はエスケープせず UTF-8 のまま出す。
+    json.dumps 固有の引数（indent など）を渡されたときや orjson が無いときは既定の実装に任せる。
+    """
+
+    ensure_ascii = False
+
+    def _options(self):
+        # datetime / dataclass は orjson 独自の書式ではなく Flask と同じ default() に通す
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return option
+
+    def dumps_bytes(self, obj):
+        """UTF-8 のバイト列で返す（レスポンス本文にそのまま使える）"""
+        if orjson is None:
+            return self.dumps(obj).encode('utf-8')
+        return orjson.dumps(obj, default=self.default, option=self._options())
+
+    def dumps(self, obj, **kwargs):
+        if kwargs or orjson is None:
+            return super().dumps(obj, **kwargs)
+        return self.dumps_bytes(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if kwargs or orjson is None:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if orjson is None or self.compact is False or (self.compact is None and self._app.debug):
+            return super().response(*args, **kwargs)  # 整形して出す（デバッグ時）
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumps_bytes(obj) + b'\n', mimetype=self.mimetype)
+
+
+def available_encodings():
+    """サーバーが返せる圧縮方式（優先順）"""
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def negotiate_encoding(accept_encodings, size):
+    """Accept-Encoding から使う圧縮方式を選ぶ。圧縮しないなら None"""
+    if size < MIN_COMPRESS_BYTES:
+        return None
+    return accept_encodings.best_match(available_encodings())
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    # mtime=0 にして同じ本文からは常に同じバイト列を作る
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+class EncodedBody:
+    """シリアライズ済みのJSON本文とETag。圧縮したバイト列も方式ごとに覚えておく"""
+
+    __slots__ = ('body', 'etag', '_encoded')
+
+    def __init__(self, body, etag):
+        self.body = body
+        self.etag = etag
+        self._encoded = {}
+
+    def encoded(self, encoding):
+        """encoding で圧縮した本文（None なら元の本文）。初回だけ圧縮する"""
+        if encoding is None:
+            return self.body
+        data = self._encoded.get(encoding)
+        if data is None:
+            data = self._encoded[encoding] = compress(self.body, encoding)
+        return data
@@ -1,12 +1,34 @@
 from flask import Flask, jsonify, request
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
-from geopy.geocoders import Nominatim
-from datetime import datetime
+from sqlalchemy import event, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from collections import OrderedDict
+from itertools import chain
+from types import SimpleNamespace
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+from werkzeug.security import check_password_hash, generate_password_hash
+import click
+import csv
+import hashlib
+import json
 import os
+import secrets
+import threading
+import time
+import unicodedata
+from spatial import ShopGrid, grid_clusters
+from geocoding import GeocodeError, GeocodeService, use_shared_nominatim_limit
+from responses import EncodedBody, OrjsonProvider, negotiate_encoding
+from migrations import MIGRATIONS, current_version, run_migrations
+from engine_profiles import engine_options
+from metrics import init_metrics
 
 app = Flask(__name__)
 app.config['JSON_AS_ASCII'] = False
+app.json = OrjsonProvider(app)  # Flask 3 は JSON_AS_ASCII を見ないので、日本語をそのまま出す設定もこちら
 
 # CORS設定
 CORS(app, resources={r"/*": {
@@ -19,6 +41,9 @@ CORS(app, resources={r"/*": {
 database_url = os.environ.get('DATABASE_URL', '')
 if database_url.startswith('postgres://'):
     database_url = database_url.replace('postgres://', 'postgresql://', 1)
+if database_url.startswith('postgresql://'):
+    # ドライバは psycopg 3 に固定する（サーバー側 prepared statement に対応。engine_profiles.py）
+    database_url = database_url.replace('postgresql://', 'postgresql+psycopg://', 1)
 
 if database_url:
     app.config['SQLALCHEMY_DATABASE_URI'] = database_url
@@ -27,8 +52,11 @@ else:
     app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(basedir, 'furugiya.db')
 
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])  # プール・タイムアウト等
+app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY')  # 未設定ならDBに保存した鍵を使う（admin_serializer）
 
 db = SQLAlchemy(app)
+init_metrics(app)  # ルートごとの処理時間・クエリ数と /metrics（遅いクエリ・N+1 はログに出す）
 
 # ==========================================
 #  データベース設計図
@@ -40,6 +68,7 @@ class Shop(db.Model):
     genres = db.Column(db.String(200)) # カンマ区切り
     rating = db.Column(db.Float, default=0.0)
     review_count = db.Column(db.Integer, default=0)
+    rating_sum = db.Column(db.Float, default=0.0)  # 評価の合計（rating = rating_sum / review_count）
     address = db.Column(db.String(200))
     latitude = db.Column(db.Float)
     longitude = db.Column(db.Float)
@@ -54,6 +83,18 @@ class Shop(db.Model):
     holiday = db.Column(db.String(100), default='なし')
     payment_methods = db.Column(db.String(200), default='不明')
     parking = db.Column(db.String(20), default='')
+    geocode_status = db.Column(db.String(20), default='ok')  # ok / pending / failed（住所→座標の処理状況）
+    search_text = db.Column(db.Text, default='')  # 検索用（正規化済み）
+    genres_search = db.Column(db.Text)  # genre= の絞り込み用（genres を search_text と同じ形に正規化）
+    search_bigrams = db.Column(db.Text)  # 2文字の検索語用。search_text の2文字ずつを空白区切りで（search_bigrams()）
+    revision = db.Column(db.Integer, default=0)   # 差分同期用（SyncState.revision）
+    children_revision = db.Column(db.Integer, default=0)  # 口コミ・お知らせ・メディアが最後に変わったリビジョン
+
+    # 店名+住所の一意索引・place_id・住所の索引は DB ごとに定義が違うので migrations.py で作る
+    __table_args__ = (
+        db.Index('ix_shop_lat_lng', 'latitude', 'longitude'),  # 表示範囲(bbox)検索用
+        db.Index('ix_shop_revision', 'revision'),
+    )
 
 class Article(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -64,7 +105,8 @@ class Article(db.Model):
 
 class Admin(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    password = db.Column(db.String(100))
+    password = db.Column(db.String(100))  # 旧: 平文。upgrade_admin_passwords でハッシュに移して空にする
+    password_hash = db.Column(db.String(256))
 
 class Review(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -73,6 +115,9 @@ class Review(db.Model):
     rating = db.Column(db.Float, nullable=False)
     comment = db.Column(db.String(500))
     date = db.Column(db.String(20))
+    revision = db.Column(db.Integer, default=0)
+
+    __table_args__ = (db.Index('ix_review_shop_id_id', 'shop_id', 'id'),)
 
 class Notice(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -80,6 +125,9 @@ class Notice(db.Model):
     title = db.Column(db.String(100))
     content = db.Column(db.String(1000))
     date = db.Column(db.String(20))
+    revision = db.Column(db.Integer, default=0)
+
+    __table_args__ = (db.Index('ix_notice_shop_id_id', 'shop_id', 'id'),)
 
 class ShopMedia(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -89,6 +137,436 @@ class ShopMedia(db.Model):
     url = db.Column(db.String(500), default='')
     description = db.Column(db.String(500), default='')
     date = db.Column(db.String(20))
+    revision = db.Column(db.Integer, default=0)
+
+    __table_args__ = (db.Index('ix_shop_media_shop_id_id', 'shop_id', 'id'),)
+
+class DeletedShop(db.Model):
+    """削除された店舗の記録（差分同期でアプリ側の削除に使う）"""
+    id = db.Column(db.Integer, primary_key=True)
+    shop_id = db.Column(db.Integer, nullable=False)
+    revision = db.Column(db.Integer, nullable=False, index=True)
+
+class GeocodeJob(db.Model):
+    """住所→座標のバックグラウンド処理キュー（flask geocode-worker か、GEOCODE_WORKER_THREAD=1 のWebプロセスが処理する）"""
+    id = db.Column(db.Integer, primary_key=True)
+    shop_id = db.Column(db.Integer, db.ForeignKey('shop.id'), nullable=False, index=True)
+    status = db.Column(db.String(20), default='pending')  # pending / running / done / failed
+    attempts = db.Column(db.Integer, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.now)
+    last_error = db.Column(db.String(200), default='')
+
+    __table_args__ = (db.Index('ix_geocode_job_status_next', 'status', 'next_attempt_at'),)
+
+class GeocodeCache(db.Model):
+    """ジオコーディング結果のキャッシュ（緯度経度がNULLの行は「見つからなかった」）"""
+    address_key = db.Column(db.String(200), primary_key=True)  # geocoding.normalize_address
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    # 結果を出した問い合わせ先（geocoding.provider_name）。見つからなかった行は試した全部をカンマ区切りで
+    provider = db.Column(db.String(50))
+
+class AppMeta(db.Model):
+    """キー・値で持つ運用情報（初期データのバージョンなど）"""
+    key = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.String(200))
+
+class SyncState(db.Model):
+    """全体で1行だけのリビジョンカウンタ"""
+    id = db.Column(db.Integer, primary_key=True)
+    revision = db.Column(db.Integer, nullable=False, default=0)  # 店舗・口コミ等のどれかが変わるたびに進む
+    shops_revision = db.Column(db.Integer, nullable=False, default=0)  # 店舗の行が変わったとき（一覧キャッシュの世代）
+    geo_revision = db.Column(db.Integer, nullable=False, default=0)  # 店舗の追加・削除・座標変更（グリッド・クラスタの世代）
+
+# ==========================================
+#  店舗検索（正規化列 + FTS5 / pg_trgm）
+# ==========================================
+
+FTS_MIN_TERM_LEN = 3  # trigram索引が使える最短の語長
+
+def normalize_search_text(*parts):
+    """検索用に全角・半角と大文字・小文字を揃えた文字列を返す"""
+    text = ' '.join(p for p in parts if p)
+    return unicodedata.normalize('NFKC', text).lower()
+
+def search_bigrams(text):
+    """正規化済みの text に含まれる2文字の並び（空白をまたがず、記号を含まないもの）を空白区切りで返す。
+    trigram索引が効かない2文字の語（古着・渋谷など）を、LIKE '%語%' の全件走査なしで引くための列"""
+    bigrams = {word[i:i + 2] for word in text.split() for i in range(len(word) - 1)}
+    return ' '.join(sorted(b for b in bigrams if b.isalnum()))
+
+def search_columns(name, address, nearest_station, genres, description):
+    """検索用の正規化列（search_text / genres_search / search_bigrams）の値"""
+    text = normalize_search_text(name, address, nearest_station, genres, description)
+    return {
+        'search_text': text,
+        'genres_search': normalize_search_text(genres),
+        'search_bigrams': search_bigrams(text),
+    }
+
+@event.listens_for(Shop, 'before_insert')
+@event.listens_for(Shop, 'before_update')
+def _refresh_search_text(mapper, connection, shop):
+    for column, value in search_columns(
+            shop.name, shop.address, shop.nearest_station, shop.genres, shop.description).items():
+        setattr(shop, column, value)
+
+_shop_fts_enabled = None
+_shop_bigram_fts_enabled = None
+
+def _sqlite_table_exists(name):
+    return db.session.execute(db.text(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name=:name"), {'name': name}).first() is not None
+
+def shop_fts_enabled():
+    """SQLiteで shop_fts（FTS5 trigram）が作成済みかどうか"""
+    global _shop_fts_enabled
+    if _shop_fts_enabled is None:
+        _shop_fts_enabled = db.engine.dialect.name == 'sqlite' and _sqlite_table_exists('shop_fts')
+    return _shop_fts_enabled
+
+def shop_bigram_fts_enabled():
+    """SQLiteで shop_bigram_fts（search_bigrams の FTS5）が作成済みかどうか"""
+    global _shop_bigram_fts_enabled
+    if _shop_bigram_fts_enabled is None:
+        _shop_bigram_fts_enabled = db.engine.dialect.name == 'sqlite' and _sqlite_table_exists('shop_bigram_fts')
+    return _shop_bigram_fts_enabled
+
+def bigram_condition(term, n):
+    """2文字の語 term を search_bigrams の索引で引く条件。索引が使えなければ None"""
+    if len(term) != 2 or not term.isalnum():
+        return None
+    if db.engine.dialect.name == 'postgresql':
+        # ix_shop_search_bigrams と同じ式にする（区切りの ' ' もパラメータにしない）
+        return db.text(f"string_to_array(shop.search_bigrams, ' ') @> ARRAY[CAST(:bigram_{n} AS TEXT)]").bindparams(
+            **{f'bigram_{n}': term})
+    if shop_bigram_fts_enabled():
+        return Shop.id.in_(db.select(db.literal_column('rowid')).select_from(db.table('shop_bigram_fts')).where(
+            db.text(f'shop_bigram_fts MATCH :bigram_{n}').bindparams(**{f'bigram_{n}': f'"{term}"'})))
+    return None
+
+def filter_shops(query, keyword='', genre=''):
+    """q= / genre= の絞り込み条件をクエリに追加する（空白区切りはAND）。
+    3文字以上は trigram索引、2文字は search_bigrams の索引で引く。それ以外（1文字・記号を含む2文字・
+    genre= の短い語）は部分一致の全件走査になる"""
+    phrases = []
+    if genre and genre != 'すべて':
+        g = normalize_search_text(genre)
+        if shop_fts_enabled() and len(g) >= FTS_MIN_TERM_LEN:
+            phrases.append('genres_search : "%s"' % g.replace('"', '""'))
+        else:
+            query = query.filter(Shop.genres_search.contains(g, autoescape=True))
+    for n, term in enumerate(normalize_search_text(keyword).split()):
+        if shop_fts_enabled() and len(term) >= FTS_MIN_TERM_LEN:
+            phrases.append('"%s"' % term.replace('"', '""'))
+            continue
+        condition = bigram_condition(term, n)
+        if condition is None:
+            condition = Shop.search_text.contains(term, autoescape=True)  # % や _ もそのままの文字として探す
+        query = query.filter(condition)
+    if phrases:
+        fts_ids = db.select(db.literal_column('rowid')).select_from(db.table('shop_fts')).where(
+            db.text('shop_fts MATCH :fts_query').bindparams(fts_query=' AND '.join(phrases)))
+        query = query.filter(Shop.id.in_(fts_ids))
+    return query
+
+def ensure_search_index():
+    """search_text・genres_search・search_bigrams の埋め戻しと全文検索索引の作成
+    （SQLite: FTS5 / PostgreSQL: pg_trgm と search_bigrams の GIN）"""
+    global _shop_fts_enabled, _shop_bigram_fts_enabled
+    for shop in Shop.query.filter(or_(
+            Shop.search_text.is_(None), Shop.search_text == '', Shop.genres_search.is_(None),
+            Shop.search_bigrams.is_(None))).all():
+        _refresh_search_text(None, None, shop)
+    db.session.commit()
+
+    with db.engine.connect() as conn:
+        if db.engine.dialect.name == 'postgresql':
+            try:
+                conn.execute(db.text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+                conn.execute(db.text(
+                    "CREATE INDEX IF NOT EXISTS ix_shop_search_text_trgm ON shop USING gin (search_text gin_trgm_ops)"))
+                conn.execute(db.text(
+                    "DROP INDEX IF EXISTS ix_shop_genres_trgm"))  # 正規化前の genres の索引（旧版）
+                conn.execute(db.text(
+                    "CREATE INDEX IF NOT EXISTS ix_shop_genres_search_trgm ON shop "
+                    "USING gin (genres_search gin_trgm_ops)"))
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                print(f"⚠️ pg_trgm索引を作成できませんでした: {e}")
+            conn.execute(db.text(
+                "CREATE INDEX IF NOT EXISTS ix_shop_search_bigrams ON shop "
+                "USING gin (string_to_array(search_bigrams, ' '))"))
+            conn.commit()
+            return
+        if db.engine.dialect.name != 'sqlite':
+            return
+        _create_bigram_fts(conn)
+        _shop_bigram_fts_enabled = None
+        existing = conn.execute(db.text(
+            "SELECT sql FROM sqlite_master WHERE type='table' AND name='shop_fts'")).scalar()
+        if existing and 'genres_search' in existing:
+            return
+        try:
+            if existing:
+                # 旧版は正規化前の genres を索引していたので作り直す
+                for trigger in ('shop_fts_ai', 'shop_fts_ad', 'shop_fts_au'):
+                    conn.execute(db.text(f"DROP TRIGGER IF EXISTS {trigger}"))
+                conn.execute(db.text("DROP TABLE shop_fts"))
+            conn.execute(db.text(
+                "CREATE VIRTUAL TABLE shop_fts USING fts5("
+                "search_text, genres_search, content='shop', content_rowid='id', tokenize='trigram')"))
+            conn.execute(db.text(
+                "CREATE TRIGGER shop_fts_ai AFTER INSERT ON shop BEGIN "
+                "INSERT INTO shop_fts(rowid, search_text, genres_search) "
+                "VALUES (new.id, new.search_text, new.genres_search); END"))
+            conn.execute(db.text(
+                "CREATE TRIGGER shop_fts_ad AFTER DELETE ON shop BEGIN "
+                "INSERT INTO shop_fts(shop_fts, rowid, search_text, genres_search) "
+                "VALUES ('delete', old.id, old.search_text, old.genres_search); END"))
+            conn.execute(db.text(
+                "CREATE TRIGGER shop_fts_au AFTER UPDATE OF search_text, genres_search ON shop BEGIN "
+                "INSERT INTO shop_fts(shop_fts, rowid, search_text, genres_search) "
+                "VALUES ('delete', old.id, old.search_text, old.genres_search); "
+                "INSERT INTO shop_fts(rowid, search_text, genres_search) "
+                "VALUES (new.id, new.search_text, new.genres_search); END"))
+            conn.execute(db.text("INSERT INTO shop_fts(shop_fts) VALUES ('rebuild')"))
+            conn.commit()
+            _shop_fts_enabled = True
+        except Exception as e:
+            conn.rollback()
+            print(f"⚠️ FTS5索引を作成できませんでした（LIKE検索で動作します）: {e}")
+
+def _create_bigram_fts(conn):
+    """SQLite: search_bigrams を空白区切りの語として索引する FTS5（shop_bigram_fts）を作る"""
+    if conn.execute(db.text(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='shop_bigram_fts'")).first():
+        return
+    try:
+        conn.execute(db.text(
+            "CREATE VIRTUAL TABLE shop_bigram_fts USING fts5("
+            "search_bigrams, content='shop', content_rowid='id', tokenize='unicode61 remove_diacritics 0')"))
+        conn.execute(db.text(
+            "CREATE TRIGGER shop_bigram_fts_ai AFTER INSERT ON shop BEGIN "
+            "INSERT INTO shop_bigram_fts(rowid, search_bigrams) VALUES (new.id, new.search_bigrams); END"))
+        conn.execute(db.text(
+            "CREATE TRIGGER shop_bigram_fts_ad AFTER DELETE ON shop BEGIN "
+            "INSERT INTO shop_bigram_fts(shop_bigram_fts, rowid, search_bigrams) "
+            "VALUES ('delete', old.id, old.search_bigrams); END"))
+        conn.execute(db.text(
+            "CREATE TRIGGER shop_bigram_fts_au AFTER UPDATE OF search_bigrams ON shop BEGIN "
+            "INSERT INTO shop_bigram_fts(shop_bigram_fts, rowid, search_bigrams) "
+            "VALUES ('delete', old.id, old.search_bigrams); "
+            "INSERT INTO shop_bigram_fts(rowid, search_bigrams) VALUES (new.id, new.search_bigrams); END"))
+        conn.execute(db.text("INSERT INTO shop_bigram_fts(shop_bigram_fts) VALUES ('rebuild')"))
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"⚠️ 2文字検索用のFTS5索引を作成できませんでした（LIKE検索で動作します）: {e}")
+
+# ==========================================
+#  差分同期用リビジョン
+# ==========================================
+
+SYNCED_MODELS = (Shop, Review, Notice, ShopMedia)
+CHILD_MODELS = (Review, Notice, ShopMedia)  # 店舗詳細（/detail）に含まれる子データ
+
+def next_revision(session, shops=True, geometry=False):
+    """リビジョンを1つ進めて返す。
+    shops=True なら店舗の行の変更として、geometry=True なら店舗の追加・削除・座標変更として
+    それぞれの世代（shops_revision / geo_revision）も進める。
+    カウンタ行の行ロックはコミットまで保持されるので、リビジョン順 = コミット順になる
+    """
+    conn = session.connection()
+    values = {'revision': SyncState.revision + 1}
+    if shops:
+        values['shops_revision'] = SyncState.shops_revision + 1
+    if geometry:
+        values['geo_revision'] = SyncState.geo_revision + 1
+    if conn.execute(db.update(SyncState).where(SyncState.id == 1).values(values)).rowcount == 0:
+        conn.execute(db.insert(SyncState).values(
+            id=1, revision=1, shops_revision=int(shops), geo_revision=int(geometry)))
+    return conn.execute(db.select(SyncState.revision).where(SyncState.id == 1)).scalar()
+
+def current_revision():
+    return db.session.execute(db.select(SyncState.revision).where(SyncState.id == 1)).scalar() or 0
+
+def shops_cache_key():
+    """店舗一覧のキャッシュの世代。どのプロセス・ワーカーで店舗の行が変わっても進む
+    （カウンタ行を1行読むだけで判定できる）。口コミ等の子データだけの変更では変わらない"""
+    return db.session.execute(db.select(SyncState.shops_revision).where(SyncState.id == 1)).scalar() or 0
+
+def geometry_cache_key():
+    """グリッド索引・クラスタの世代。店舗の追加・削除・座標の変更でだけ進む"""
+    return db.session.execute(db.select(SyncState.geo_revision).where(SyncState.id == 1)).scalar() or 0
+
+def shop_detail_key(shop_id):
+    """店舗詳細のキャッシュの世代（その店の行か、口コミ・お知らせ・メディアが変わると変わる）"""
+    row = db.session.execute(db.select(Shop.revision, Shop.children_revision).where(Shop.id == shop_id)).first()
+    return tuple(row) if row else None
+
+def _geometry_changed(shop):
+    state = db.inspect(shop)
+    return state.attrs.latitude.history.has_changes() or state.attrs.longitude.history.has_changes()
+
+@event.listens_for(Session, 'before_flush')
+def _stamp_revisions(session, flush_context, instances):
+    changed = [o for o in chain(session.new, session.dirty)
+               if isinstance(o, SYNCED_MODELS) and session.is_modified(o)]
+    deleted = [o for o in session.deleted if isinstance(o, SYNCED_MODELS)]
+    if not changed and not deleted:
+        return
+    shops = [o for o in chain(changed, deleted) if isinstance(o, Shop)]
+    geometry = any(o in session.new or o in session.deleted or _geometry_changed(o) for o in shops)
+    rev = next_revision(session, shops=bool(shops), geometry=geometry)
+    for obj in changed:
+        obj.revision = rev
+    for obj in deleted:
+        if isinstance(obj, Shop):
+            session.add(DeletedShop(shop_id=obj.id, revision=rev))
+    # 子データが変わった店は詳細キャッシュだけ作り直す（店舗の行の revision・一覧の世代は進めない）
+    parent_ids = {o.shop_id for o in chain(changed, deleted) if isinstance(o, CHILD_MODELS) and o.shop_id}
+    if parent_ids:
+        session.connection().execute(db.update(Shop.__table__).where(
+            Shop.__table__.c.id.in_(parent_ids)).values(children_revision=rev))
+
+_shop_grid = None
+_shop_grid_key = None
+
+def get_shop_grid():
+    """最近傍検索用のグリッド索引（店舗の追加・削除・座標変更があったら作り直す）"""
+    global _shop_grid, _shop_grid_key
+    key = geometry_cache_key()
+    if _shop_grid is None or _shop_grid_key != key:
+        points = db.session.query(Shop.id, Shop.latitude, Shop.longitude).all()
+        _shop_grid = ShopGrid(points)
+        _shop_grid_key = key
+    return _shop_grid
+
+MAX_CLUSTER_ZOOM = 20
+_shop_clusters = {}  # (世代, zoom) → クラスタ一覧。最新の世代の分だけ持つ
+
+def get_shop_clusters(zoom):
+    """ズームごとのクラスタ一覧（店舗の追加・削除・座標変更があったら全ズーム分を破棄する）。
+    代表店舗の並び（評価順）は作った時点の評価で、口コミの投稿だけでは作り直さない"""
+    global _shop_clusters
+    key = geometry_cache_key()
+    clusters = _shop_clusters.get((key, zoom))
+    if clusters is None:
+        points = db.session.query(Shop.id, Shop.latitude, Shop.longitude, Shop.rating).all()
+        clusters = grid_clusters(points, zoom)
+        # 読んだ世代の下に入れる。作っている間に他のスレッドが新しい世代を入れていたら、そちらを残す
+        current = _shop_clusters
+        if all(k[0] <= key for k in current):
+            _shop_clusters = {**{k: v for k, v in current.items() if k[0] == key}, (key, zoom): clusters}
+    return clusters
+
+# ==========================================
+#  レスポンスキャッシュ（シリアライズ済みJSON + ETag）
+# ==========================================
+
+MAX_CACHED_RESPONSES = 256
+_response_cache = OrderedDict()  # キー → (世代, EncodedBody)。古い順に並ぶLRU
+_response_cache_lock = threading.Lock()
+
+def cached_json(cache_key, build, generation=None):
+    """build() の結果をJSONバイト列とそのハッシュ（EncodedBody）にしてキャッシュする。
+    圧縮済みの本文も同じエントリに載る。generation（shops_cache_key() など）が変わったエントリは作り直す。
+    件数が上限を超えたら最も長く使われていないものから捨てる"""
+    with _response_cache_lock:
+        cached = _response_cache.get(cache_key)
+        if cached is not None and cached[0] == generation:
+            _response_cache.move_to_end(cache_key)
+            return cached[1]
+    body = app.json.dumps_bytes(build())
+    entry = EncodedBody(body, hashlib.sha1(body).hexdigest())
+    with _response_cache_lock:
+        _response_cache[cache_key] = (generation, entry)
+        _response_cache.move_to_end(cache_key)
+        while len(_response_cache) > MAX_CACHED_RESPONSES:
+            _response_cache.popitem(last=False)
+    return entry
+
+def etag_response(entry):
+    """ETag付きで返す。If-None-Match が一致すれば本文なしの304になる。
+    Accept-Encoding に応じて brotli / gzip で圧縮した本文を返す（ETagも方式ごとに変える）"""
+    encoding = negotiate_encoding(request.accept_encodings, len(entry.body))
+    resp = app.response_class(entry.encoded(encoding), mimetype='application/json')
+    if encoding:
+        resp.headers['Content-Encoding'] = encoding
+        resp.set_etag(f'{entry.etag}-{encoding}')
+    else:
+        resp.set_etag(entry.etag)
+    resp.vary.add('Accept-Encoding')
+    resp.headers['Cache-Control'] = 'no-cache'
+    return resp.make_conditional(request)
+
+# ==========================================
+#  管理者認証（パスワードはログイン時だけ照合し、以降は署名付きトークン）
+# ==========================================
+
+ADMIN_TOKEN_TTL = int(os.environ.get('ADMIN_TOKEN_TTL', 12 * 3600))  # 秒
+# 非推奨: トークンを使わない旧アプリ向けに、本文の password で管理APIを通す（毎回遅いハッシュ照合になる）。
+# 旧アプリが使われなくなったら ADMIN_ALLOW_BODY_PASSWORD=0 にして、いずれ削除する
+ADMIN_ALLOW_BODY_PASSWORD = os.environ.get('ADMIN_ALLOW_BODY_PASSWORD', '1') == '1'
+_admin_secret = None
+
+def load_secret_key():
+    """全ワーカー共通の署名鍵をDBから読む。無ければ作って保存する（同時に作られても先勝ち）"""
+    with db.engine.begin() as conn:
+        conn.execute(insert_ignoring_conflicts(AppMeta).values(key='secret_key', value=secrets.token_hex(32)))
+        return conn.execute(db.select(AppMeta.value).where(AppMeta.key == 'secret_key')).scalar_one()
+
+def admin_serializer(admin):
+    """admin の今のパスワードハッシュを salt に含めた署名。
+    パスワードを変えると（flask set-admin-password）発行済みのトークンは全ワーカーで即座に通らなくなる"""
+    global _admin_secret
+    if _admin_secret is None:
+        _admin_secret = app.config['SECRET_KEY'] or load_secret_key()
+    fingerprint = hashlib.sha256(admin.password_hash.encode('utf-8')).hexdigest()[:16]
+    return URLSafeTimedSerializer(_admin_secret, salt=f'admin-token:{fingerprint}')
+
+def issue_admin_token(admin):
+    return admin_serializer(admin).dumps({'admin': admin.id})
+
+def check_admin_password(password):
+    """ハッシュと照合する（遅いハッシュなのでログイン時だけ使う）"""
+    admin = Admin.query.first()
+    if not admin or not admin.password_hash or not password:
+        return False
+    return check_password_hash(admin.password_hash, password)
+
+def is_admin_request(data):
+    """Authorization: Bearer <トークン> を検証する（遅いハッシュ照合はせず、管理者の行を1回読むだけ）。
+    ADMIN_ALLOW_BODY_PASSWORD が有効な間は、トークンを送らない旧クライアントの本文の password も認める（非推奨）"""
+    auth = request.headers.get('Authorization', '')
+    if auth.startswith('Bearer '):
+        admin = Admin.query.first()
+        if not admin or not admin.password_hash:
+            return False
+        try:
+            payload = admin_serializer(admin).loads(auth[len('Bearer '):].strip(), max_age=ADMIN_TOKEN_TTL)
+            return payload.get('admin') == admin.id
+        except BadSignature:  # 期限切れ（SignatureExpired）もここ
+            return False
+    if not ADMIN_ALLOW_BODY_PASSWORD or not data.get('password'):
+        return False
+    app.logger.warning('非推奨: %s %s が本文の password で認証しています（/api/admin/login のトークンを使ってください）',
+                       request.method, request.path)
+    return check_admin_password(data.get('password'))
+
+def upgrade_admin_passwords():
+    """平文で保存されているパスワードをハッシュに置き換える"""
+    upgraded = 0
+    for admin in Admin.query.filter(Admin.password.isnot(None), Admin.password_hash.is_(None)):
+        admin.password_hash = generate_password_hash(admin.password)
+        admin.password = None
+        upgraded += 1
+    if upgraded:
+        db.session.commit()
+        print(f"✅ 管理者パスワード {upgraded} 件をハッシュ化しました")
 
 # ==========================================
 #  API エンドポイント
@@ -103,55 +581,214 @@ def geocode():
     address = request.args.get('address', '')
     if not address:
         return jsonify({"error": "住所が指定されていません"}), 400
-    try:
-        geolocator = Nominatim(user_agent="furugiya_map_v2")
-        location = geolocator.geocode(address, timeout=10)
-        if location:
-            return jsonify({"latitude": location.latitude, "longitude": location.longitude})
-    except Exception:
-        pass
+    result = geocoder.geocode(address)
+    if result:
+        return jsonify({"latitude": result[0], "longitude": result[1]})
     return jsonify({"error": "住所から座標を取得できませんでした"}), 404
 
+# JSONキー → (Shopの列名, 値の整形)
+SHOP_FIELDS = {
+    "id": ('id', None),
+    "name": ('name', None),
+    "genres": ('genres', lambda v: v.split(',') if v else []),
+    "rating": ('rating', None),
+    "reviewCount": ('review_count', None),
+    "address": ('address', None),
+    "latitude": ('latitude', None),
+    "longitude": ('longitude', None),
+    "nearestStation": ('nearest_station', lambda v: v or ''),
+    "placeId": ('place_id', lambda v: v or ''),
+    "plusCode": ('plus_code', lambda v: v or ''),
+    "homepageUrl": ('homepage_url', lambda v: v or ''),
+    "snsUrl": ('sns_url', lambda v: v or ''),
+    "hours": ('hours', lambda v: v or ''),
+    "description": ('description', lambda v: v or ''),
+    "priceRange": ('price_range', lambda v: v or '不明'),
+    "holiday": ('holiday', lambda v: v or 'なし'),
+    "paymentMethods": ('payment_methods', lambda v: v or '不明'),
+    "parking": ('parking', lambda v: v or ''),
+    "geocodeStatus": ('geocode_status', lambda v: v or 'ok'),
+    "imageUrls": (None, lambda v: []),
+}
+MAX_SHOPS_PAGE = 500
+
+def shop_to_dict(shop, fields=None):
+    output = {}
+    for key in fields or SHOP_FIELDS:
+        column, fmt = SHOP_FIELDS[key]
+        value = getattr(shop, column) if column else None
+        output[key] = fmt(value) if fmt else value
+    return output
+
+def parse_fields(value):
+    """fields=id,name,... を検証してタプルで返す（idは常に含める）。不正ならValueError"""
+    fields = ['id'] + [f.strip() for f in value.split(',') if f.strip() and f.strip() != 'id']
+    unknown = [f for f in fields if f not in SHOP_FIELDS]
+    if unknown:
+        raise ValueError(','.join(unknown))
+    return tuple(dict.fromkeys(fields))
+
+def load_shop_fields(query, fields):
+    """指定フィールドの列だけをSELECTする"""
+    columns = [getattr(Shop, SHOP_FIELDS[f][0]) for f in fields if SHOP_FIELDS[f][0]]
+    return query.options(db.load_only(*columns))
+
+def parse_bbox(value):
+    """'minLat,minLng,maxLat,maxLng' を4つのfloatに変換する。不正ならValueError"""
+    parts = [float(v) for v in value.split(',')]
+    if len(parts) != 4:
+        raise ValueError(value)
+    min_lat, min_lng, max_lat, max_lng = parts
+    if min_lat > max_lat or min_lng > max_lng:
+        raise ValueError(value)
+    return min_lat, min_lng, max_lat, max_lng
+
+def filter_bbox(query, bbox):
+    min_lat, min_lng, max_lat, max_lng = bbox
+    return query.filter(
+        Shop.latitude.between(min_lat, max_lat),
+        Shop.longitude.between(min_lng, max_lng),
+    )
+
 @app.route('/api/shops', methods=['GET'])
 def get_shops():
-    shops = Shop.query.all()
+    keyword = request.args.get('q', '').strip()
+    genre = request.args.get('genre', '').strip()
+    bbox = None
+    if request.args.get('bbox'):
+        try:
+            bbox = parse_bbox(request.args['bbox'])
+        except ValueError:
+            return jsonify({"error": "bboxは minLat,minLng,maxLat,maxLng で指定してください"}), 400
+    fields = None
+    if request.args.get('fields'):
+        try:
+            fields = parse_fields(request.args['fields'])
+        except ValueError as e:
+            return jsonify({"error": f"不明なフィールドです: {e}"}), 400
+    try:
+        after_id = int(request.args['after_id']) if request.args.get('after_id') else None
+        limit = int(request.args['limit']) if request.args.get('limit') else None
+    except ValueError:
+        return jsonify({"error": "after_id・limitは整数で指定してください"}), 400
+    if after_id is not None and limit is None:
+        limit = MAX_SHOPS_PAGE
+    if limit is not None:
+        limit = max(1, min(limit, MAX_SHOPS_PAGE))
+
+    def build():
+        query = filter_shops(Shop.query, keyword, genre)
+        if bbox:
+            query = filter_bbox(query, bbox)
+        if fields:
+            query = load_shop_fields(query, fields)
+        if limit is not None:
+            # キーセット方式: id順に after_id より後ろを limit 件
+            if after_id is not None:
+                query = query.filter(Shop.id > after_id)
+            query = query.order_by(Shop.id).limit(limit)
+        return [shop_to_dict(shop, fields) for shop in query.all()]
+
+    # 次ページは受け取った最後の id を after_id に渡す（limit 件未満なら最終ページ）
+    return etag_response(cached_json(('shops', keyword, genre, bbox, fields, after_id, limit), build,
+                                     shops_cache_key()))
+
+MAX_BATCH_IDS = 200
+
+@app.route('/api/shops/batch', methods=['POST'])
+def get_shops_batch():
+    """お気に入り・行った店の一覧用。ids の順に店舗を返し、見つからない id も報告する"""
+    data = request.json or {}
+    try:
+        if not isinstance(data, dict) or not isinstance(data.get('ids', []), list):
+            raise TypeError
+        ids = [int(i) for i in data.get('ids', [])]
+        fields = parse_fields(','.join(data['fields'])) if data.get('fields') else None
+    except (TypeError, ValueError):
+        return jsonify({"error": "idsは整数の配列、fieldsは既知のフィールド名の配列で指定してください"}), 400
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > MAX_BATCH_IDS:
+        return jsonify({"error": f"idsは{MAX_BATCH_IDS}件までです"}), 400
+
+    query = Shop.query.filter(Shop.id.in_(ids))
+    if fields:
+        query = load_shop_fields(query, fields)
+    found = {shop.id: shop for shop in query.all()} if ids else {}
+    return jsonify({
+        "shops": [shop_to_dict(found[i], fields) for i in ids if i in found],
+        "missingIds": [i for i in ids if i not in found],
+    })
+
+@app.route('/api/shops/nearby', methods=['GET'])
+def get_nearby_shops():
+    try:
+        lat = float(request.args['lat'])
+        lng = float(request.args['lng'])
+        limit = max(1, min(int(request.args.get('limit', 20)), 100))
+        radius_m = max(0.0, min(float(request.args.get('radius_m', 3000)), 50000))
+    except (KeyError, ValueError):
+        return jsonify({"error": "lat・lngを数値で指定してください"}), 400
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return jsonify({"error": "lat は -90〜90、lng は -180〜180 の範囲で指定してください"}), 400
+
+    hits = get_shop_grid().nearest(lat, lng, limit, radius_m)
+    shops = {s.id: s for s in Shop.query.filter(Shop.id.in_([shop_id for _, shop_id in hits]))}
     output = []
-    for shop in shops:
-        output.append({
-            "id": shop.id,
-            "name": shop.name,
-            "genres": shop.genres.split(',') if shop.genres else [],
-            "rating": shop.rating,
-            "reviewCount": shop.review_count,
-            "address": shop.address,
-            "latitude": shop.latitude,
-            "longitude": shop.longitude,
-            "nearestStation": shop.nearest_station or '',
-            "placeId": shop.place_id or '',
-            "plusCode": shop.plus_code or '',
-            "homepageUrl": shop.homepage_url or '',
-            "snsUrl": shop.sns_url or '',
-            "hours": shop.hours or '',
-            "description": shop.description or '',
-            "priceRange": shop.price_range or '不明',
-            "holiday": shop.holiday or 'なし',
-            "paymentMethods": shop.payment_methods or '不明',
-            "parking": shop.parking or '',
-            "imageUrls": []
-        })
+    for dist, shop_id in hits:
+        shop = shops.get(shop_id)
+        if shop is None:
+            continue
+        item = shop_to_dict(shop)
+        item["distanceM"] = round(dist)
+        output.append(item)
     return jsonify(output)
 
+@app.route('/api/shops/clusters', methods=['GET'])
+def get_clusters():
+    try:
+        zoom = max(0, min(int(request.args['zoom']), MAX_CLUSTER_ZOOM))
+        bbox = parse_bbox(request.args['bbox']) if request.args.get('bbox') else None
+    except (KeyError, ValueError):
+        return jsonify({"error": "zoom（整数）と bbox=minLat,minLng,maxLat,maxLng を指定してください"}), 400
+
+    clusters = get_shop_clusters(zoom)
+    if bbox:
+        min_lat, min_lng, max_lat, max_lng = bbox
+        clusters = [c for c in clusters
+                    if min_lat <= c["latitude"] <= max_lat and min_lng <= c["longitude"] <= max_lng]
+    return jsonify(clusters)
+
+@app.route('/api/shops/changes', methods=['GET'])
+def get_shop_changes():
+    try:
+        since = int(request.args.get('since', 0))
+    except ValueError:
+        return jsonify({"error": "sinceは整数で指定してください"}), 400
+
+    revision = current_revision()
+    query = Shop.query
+    deleted_ids = []
+    if since > 0:
+        query = query.filter(Shop.revision > since)
+        deleted_ids = [shop_id for (shop_id,) in db.session.query(DeletedShop.shop_id).filter(
+            DeletedShop.revision > since)]
+    return jsonify({
+        "revision": revision,
+        "shops": [shop_to_dict(shop) for shop in query.all()],
+        "deletedIds": deleted_ids,
+    })
+
 @app.route('/api/shops', methods=['POST'])
 def add_shop():
     data = request.json
     
-    # 住所から座標を自動取得
     lat = data.get('latitude')
     lng = data.get('longitude')
-    
-    # もし座標が0または空なら、住所から検索して埋める
-    if not lat or not lng or lat == 0:
-        lat, lng = get_lat_lng(data.get('address', ''))
+
+    # もし座標が0または空なら、住所からの座標取得をキューに積む（リクエストでは待たない）
+    needs_geocode = not lat or not lng or lat == 0
+    if needs_geocode:
+        lat, lng = None, None
 
     genres_str = ",".join(data.get('genres', [])) if isinstance(data.get('genres'), list) else data.get('genres', '')
 
@@ -172,12 +809,19 @@ def add_shop():
         price_range=data.get('priceRange', '不明'),
         payment_methods=data.get('paymentMethods', '不明'),
         parking=data.get('parking', ''),
+        geocode_status='pending' if needs_geocode else 'ok',
         rating=0.0,
         review_count=0
     )
     db.session.add(new_shop)
-    db.session.commit()
-    return jsonify({"message": "Shop added"}), 201
+    try:
+        if needs_geocode:
+            enqueue_geocode(new_shop)
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({"error": "同じ店名・住所の店舗が登録済みです"}), 409
+    return jsonify({"message": "Shop added", "id": new_shop.id, "geocodeStatus": new_shop.geocode_status}), 201
 
 @app.route('/api/shops/<int:shop_id>', methods=['DELETE'])
 def delete_shop(shop_id):
@@ -185,6 +829,7 @@ def delete_shop(shop_id):
     Review.query.filter_by(shop_id=shop_id).delete()
     Notice.query.filter_by(shop_id=shop_id).delete()
     ShopMedia.query.filter_by(shop_id=shop_id).delete()
+    GeocodeJob.query.filter_by(shop_id=shop_id).delete()
     db.session.delete(shop)
     db.session.commit()
     return jsonify({"message": "Deleted"}), 200
@@ -222,23 +867,80 @@ def update_shop(shop_id):
         shop.latitude = float(data['latitude'])
     if 'longitude' in data:
         shop.longitude = float(data['longitude'])
-    db.session.commit()
+    if 'address' in data and 'latitude' not in data and 'longitude' not in data \
+            and db.inspect(shop).attrs.address.history.has_changes():
+        enqueue_geocode(shop)  # 住所だけ変わったら座標を取り直す
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({"error": "同じ店名・住所の店舗が登録済みです"}), 409
     return jsonify({"message": "Updated"}), 200
 
-@app.route('/api/shops/<int:shop_id>/reviews', methods=['GET'])
-def get_reviews(shop_id):
-    reviews = Review.query.filter_by(shop_id=shop_id).order_by(Review.id.desc()).all()
-    return jsonify([{
+MAX_CHILD_PAGE = 100
+
+def review_to_dict(r):
+    return {
         "id": r.id,
         "nickname": r.nickname or '匿名',
         "rating": r.rating,
         "comment": r.comment or '',
         "date": r.date or '',
-    } for r in reviews])
+    }
+
+def notice_to_dict(n):
+    return {
+        "id": n.id,
+        "title": n.title or '',
+        "content": n.content or '',
+        "date": n.date or '',
+    }
+
+def media_to_dict(m):
+    return {
+        "id": m.id,
+        "title": m.title or '',
+        "source": m.source or '',
+        "url": m.url or '',
+        "description": m.description or '',
+        "date": m.date or '',
+    }
+
+def parse_page_args():
+    """?before_id=&limit= を読む。指定がなければ (None, None)。不正ならValueError"""
+    before_id = int(request.args['before_id']) if request.args.get('before_id') else None
+    limit = int(request.args['limit']) if request.args.get('limit') else None
+    if before_id is not None and limit is None:
+        limit = MAX_CHILD_PAGE
+    if limit is not None:
+        limit = max(1, min(limit, MAX_CHILD_PAGE))
+    return before_id, limit
+
+def shop_children(model, shop_id, before_id=None, limit=None):
+    """店舗に紐づく行を新しい順に返す（(shop_id, id) 索引を逆順にたどる）"""
+    query = model.query.filter(model.shop_id == shop_id)
+    if before_id is not None:
+        query = query.filter(model.id < before_id)
+    query = query.order_by(model.id.desc())
+    if limit is not None:
+        query = query.limit(limit)
+    return query.all()
+
+def children_response(model, to_dict, shop_id):
+    # 次ページは受け取った最後の id を before_id に渡す
+    try:
+        before_id, limit = parse_page_args()
+    except ValueError:
+        return jsonify({"error": "before_id・limitは整数で指定してください"}), 400
+    return jsonify([to_dict(row) for row in shop_children(model, shop_id, before_id, limit)])
+
+@app.route('/api/shops/<int:shop_id>/reviews', methods=['GET'])
+def get_reviews(shop_id):
+    return children_response(Review, review_to_dict, shop_id)
 
 @app.route('/api/shops/<int:shop_id>/reviews', methods=['POST'])
 def add_review(shop_id):
-    shop = Shop.query.get_or_404(shop_id)
+    Shop.query.get_or_404(shop_id)
     data = request.json
     review = Review(
         shop_id=shop_id,
@@ -248,35 +950,82 @@ def add_review(shop_id):
         date=datetime.now().strftime('%Y-%m-%d'),
     )
     db.session.add(review)
-    all_reviews = Review.query.filter_by(shop_id=shop_id).all()
-    total = sum(r.rating for r in all_reviews) + review.rating
-    count = len(all_reviews) + 1
-    shop.rating = round(total / count, 1)
-    shop.review_count = count
+    # 合計と件数をSQL側で加算する（同時投稿でも取りこぼさない）
+    rating_sum = db.func.coalesce(Shop.rating_sum, 0) + review.rating
+    review_count = db.func.coalesce(Shop.review_count, 0) + 1
+    new_rating, new_count = db.session.execute(
+        db.update(Shop).where(Shop.id == shop_id).values(
+            rating_sum=rating_sum,
+            review_count=review_count,
+            rating=db.func.round(db.cast(rating_sum / review_count, db.Numeric), 1),
+            revision=next_revision(db.session),
+        ).returning(Shop.rating, Shop.review_count).execution_options(synchronize_session=False)
+    ).one()
     db.session.commit()
-    return jsonify({"message": "Review added", "newRating": shop.rating, "reviewCount": shop.review_count}), 201
+    return jsonify({"message": "Review added", "newRating": float(new_rating), "reviewCount": new_count}), 201
 
 @app.route('/api/shops/<int:shop_id>/notices', methods=['GET'])
 def get_notices(shop_id):
-    notices = Notice.query.filter_by(shop_id=shop_id).order_by(Notice.id.desc()).all()
-    return jsonify([{
-        "id": n.id,
-        "title": n.title or '',
-        "content": n.content or '',
-        "date": n.date or '',
-    } for n in notices])
+    return children_response(Notice, notice_to_dict, shop_id)
 
 @app.route('/api/shops/<int:shop_id>/media', methods=['GET'])
 def get_media(shop_id):
-    items = ShopMedia.query.filter_by(shop_id=shop_id).order_by(ShopMedia.id.desc()).all()
-    return jsonify([{
-        "id": m.id,
-        "title": m.title or '',
-        "source": m.source or '',
-        "url": m.url or '',
-        "description": m.description or '',
-        "date": m.date or '',
-    } for m in items])
+    return children_response(ShopMedia, media_to_dict, shop_id)
+
+DETAIL_PAGE_SIZE = 20
+
+def first_pages(shop_id, limit):
+    """口コミ・お知らせ・メディアの最新 limit 件ずつを1本の UNION ALL で取得する"""
+    def latest(model, kind, title, body, source, url, rating):
+        newest = db.select(
+            db.literal(kind).label('kind'), model.id.label('id'),
+            title.label('title'), body.label('body'), source.label('source'), url.label('url'),
+            rating.label('rating'), model.date.label('date'),
+        ).where(model.shop_id == shop_id).order_by(model.id.desc()).limit(limit).subquery()
+        return db.select(newest)
+
+    no_text = db.cast(db.null(), db.String)
+    no_rating = db.cast(db.null(), db.Float)
+    rows = db.session.execute(db.union_all(
+        latest(Review, 'review', Review.nickname, Review.comment, no_text, no_text, Review.rating),
+        latest(Notice, 'notice', Notice.title, Notice.content, no_text, no_text, no_rating),
+        latest(ShopMedia, 'media', ShopMedia.title, ShopMedia.description, ShopMedia.source,
+               ShopMedia.url, no_rating),
+    )).all()
+
+    pages = {'review': [], 'notice': [], 'media': []}
+    for row in sorted(rows, key=lambda r: -r.id):
+        if row.kind == 'review':
+            pages['review'].append(review_to_dict(SimpleNamespace(
+                id=row.id, nickname=row.title, rating=row.rating, comment=row.body, date=row.date)))
+        elif row.kind == 'notice':
+            pages['notice'].append(notice_to_dict(SimpleNamespace(
+                id=row.id, title=row.title, content=row.body, date=row.date)))
+        else:
+            pages['media'].append(media_to_dict(SimpleNamespace(
+                id=row.id, title=row.title, source=row.source, url=row.url,
+                description=row.body, date=row.date)))
+    return pages
+
+@app.route('/api/shops/<int:shop_id>/detail', methods=['GET'])
+def get_shop_detail(shop_id):
+    """店舗と口コミ・お知らせ・メディアの1ページ目をまとめて返す（詳細画面用）"""
+    try:
+        limit = max(1, min(int(request.args.get('limit', DETAIL_PAGE_SIZE)), MAX_CHILD_PAGE))
+    except ValueError:
+        return jsonify({"error": "limitは整数で指定してください"}), 400
+
+    def build():
+        shop = Shop.query.get_or_404(shop_id)
+        pages = first_pages(shop_id, limit)
+        return {
+            "shop": shop_to_dict(shop),
+            "reviews": pages['review'],
+            "notices": pages['notice'],
+            "media": pages['media'],
+        }
+
+    return etag_response(cached_json(('detail', shop_id, limit), build, shop_detail_key(shop_id)))
 
 @app.route('/api/shops/<int:shop_id>/media', methods=['POST'])
 def add_media(shop_id):
@@ -296,25 +1045,23 @@ def add_media(shop_id):
 
 @app.route('/api/articles', methods=['GET'])
 def get_articles():
-    articles = Article.query.all()
-    output = []
-    for art in articles:
-        output.append({
+    def build():
+        return [{
             "id": art.id,
             "title": art.title,
             "content": art.content,
             "genre": art.genre,
             "date": art.date
-        })
-    return jsonify(output)
+        } for art in Article.query.all()]
+
+    # 記事は追加のみなので、件数と最大IDが同じなら中身も同じ（別ワーカーでの追加もこれで検知できる）
+    count, max_id = db.session.query(db.func.count(Article.id), db.func.max(Article.id)).one()
+    return etag_response(cached_json(('articles', count, max_id), build))
 
 @app.route('/api/articles', methods=['POST'])
 def add_article():
     data = request.json
-    password = data.get('password')
-    admin = Admin.query.first()
-    
-    if not admin or admin.password != password:
+    if not is_admin_request(data):
         return jsonify({"error": "パスワードが違います"}), 401
 
     new_article = Article(
@@ -329,1751 +1076,521 @@ def add_article():
 
 @app.route('/api/admin/import_csv', methods=['POST'])
 def admin_import_csv():
-    import csv as csv_module
     data = request.json or {}
-    admin = Admin.query.first()
-    if not admin or admin.password != data.get('password'):
+    if not is_admin_request(data):
         return jsonify({"error": "NG"}), 401
 
-    csv_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lib', 'shops.csv')
-    if not os.path.exists(csv_path):
+    if not os.path.exists(SHOPS_CSV_PATH):
         return jsonify({"error": "CSVファイルが見つかりません"}), 404
 
-    Shop.query.delete()
-    db.session.commit()
-
-    imported = 0
-    with open(csv_path, newline='', encoding='utf-8-sig') as f:
-        reader = csv_module.DictReader(f)
-        for row in reader:
-            name = (row.get('name') or '').strip()
-            if not name:
-                continue
-            def col(key, default=''):
-                return (row.get(key) or default).strip()
-            try:
-                lat = float(row.get('latitude') or 0)
-                lng = float(row.get('longitude') or 0)
-            except (ValueError, TypeError):
-                lat, lng = 0.0, 0.0
-            db.session.add(Shop(
-                name=name,
-                address=col('address'),
-                nearest_station=col('nearest_station'),
-                place_id=col('place_id'),
-                plus_code=col('plus_code'),
-                genres=col('genres').strip('"'),
-                hours=col('hours'),
-                holiday=col('holiday') or 'なし',
-                homepage_url=col('homepage_url'),
-                sns_url=col('sns_url'),
-                description=col('description'),
-                price_range=col('price_range') or '不明',
-                payment_methods=col('payment_methods'),
-                parking=col('parking'),
-                latitude=lat,
-                longitude=lng,
-                rating=0.0,
-                review_count=0,
-            ))
-            imported += 1
-    db.session.commit()
-    return jsonify({"message": f"{imported}件インポートしました"}), 200
+    stats = import_shops_csv(prune=bool(data.get('prune')))
+    return jsonify({
+        "message": f"{stats['inserted']}件追加・{stats['updated']}件更新しました",
+        **stats,
+    }), 200
 
 @app.route('/api/admin/seed_akita', methods=['POST'])
 def admin_seed_akita():
     data = request.json or {}
-    admin = Admin.query.first()
-    if not admin or admin.password != data.get('password'):
+    if not is_admin_request(data):
         return jsonify({"error": "NG"}), 401
-    with app.app_context():
-        seed_akita_shops()
-    count = Shop.query.filter(Shop.address.like('%秋田%')).count()
+    seed_prefecture_shops('akita')
+    count = count_prefecture_shops('akita')
     return jsonify({"message": "完了", "akita_count": count}), 200
 
 @app.route('/api/admin/seed_iwate', methods=['POST'])
 def admin_seed_iwate():
     data = request.json or {}
-    admin = Admin.query.first()
-    if not admin or admin.password != data.get('password'):
+    if not is_admin_request(data):
         return jsonify({"error": "NG"}), 401
-    seed_iwate_shops()
-    count = Shop.query.filter(Shop.address.like('%岩手%')).count()
+    seed_prefecture_shops('iwate')
+    count = count_prefecture_shops('iwate')
     return jsonify({"message": "完了", "iwate_count": count}), 200
 
 @app.route('/api/admin/seed_aomori', methods=['POST'])
 def admin_seed_aomori():
     data = request.json or {}
-    admin = Admin.query.first()
-    if not admin or admin.password != data.get('password'):
+    if not is_admin_request(data):
         return jsonify({"error": "NG"}), 401
-    with app.app_context():
-        seed_aomori_shops()
-    count = Shop.query.filter(Shop.address.like('%青森%')).count()
+    seed_prefecture_shops('aomori')
+    count = count_prefecture_shops('aomori')
     return jsonify({"message": "完了", "aomori_count": count}), 200
 
 @app.route('/api/admin/login', methods=['POST'])
 def login():
-    password = request.json.get('password')
-    admin = Admin.query.first()
-    if admin and admin.password == password:
-        return jsonify({"message": "OK"}), 200
+    """パスワードを照合し、以降の管理APIで Authorization: Bearer に付けるトークンを返す"""
+    if check_admin_password((request.json or {}).get('password')):
+        return jsonify({
+            "message": "OK",
+            "token": issue_admin_token(Admin.query.first()),
+            "expiresIn": ADMIN_TOKEN_TTL,
+        }), 200
     return jsonify({"error": "NG"}), 401
 
 # ==========================================
 #  🚀 便利機能：住所から座標計算 ＆ 初期データ移行
 # ==========================================
 
-def get_lat_lng(address):
-    if not address: return 35.6812, 139.7671 # 東京駅
-    try:
-        geolocator = Nominatim(user_agent="furugiya_map_v2")
-        location = geolocator.geocode(address)
-        if location:
-            return location.latitude, location.longitude
-    except:
-        pass
-    return 35.6812, 139.7671
+class DbGeocodeStore:
+    """GeocodeCache テーブルを使うキャッシュ。
+    リクエスト側のセッションを巻き込まないよう、別コネクションで読み書きする
+    """
 
-def migrate_db():
-    """既存DBに不足カラムを追加する（SQLiteのみ。PostgreSQLはcreate_allで完結）"""
-    if 'postgresql' in app.config['SQLALCHEMY_DATABASE_URI']:
-        return
-    new_columns = [
-        ("nearest_station", "VARCHAR(100) DEFAULT ''"),
-        ("place_id", "VARCHAR(100) DEFAULT ''"),
-        ("plus_code", "VARCHAR(50) DEFAULT ''"),
-        ("holiday", "VARCHAR(100) DEFAULT 'なし'"),
-        ("payment_methods", "VARCHAR(200) DEFAULT '不明'"),
-        ("parking", "VARCHAR(20) DEFAULT ''"),
-    ]
-    with db.engine.connect() as conn:
-        for col_name, col_def in new_columns:
-            try:
-                conn.execute(db.text(f"ALTER TABLE shop ADD COLUMN {col_name} {col_def}"))
-                conn.commit()
-            except Exception:
-                pass  # カラムが既に存在する場合は無視
-
-def seed_aomori_shops():
-    """青森県の古着屋データを追加（各店舗ごとに重複チェック）"""
-    aomori_shops = [
-        # ── 青森市 ────────────────────────────────────────────
-        {
-            'name': '古着屋 TOY SOLDIERS',
-            'address': '青森県青森市緑3丁目8-7',
-            'nearest_station': '筒井駅',
-            'genres': 'ヴィンテージ,アメカジ,US古着,レディース',
-            'hours': '平日 12:00〜20:00 / 土日祝 11:00〜20:00',
-            'holiday': '水曜日',
-            'homepage_url': 'https://toysoldiers.base.shop/',
-            'sns_url': 'https://www.instagram.com/toysoldiers_usedclothing',
-            'description': '青森市の人気古着屋。ヴィンテージ・アメカジ・US古着を中心に展開。',
-            'latitude': 40.8162, 'longitude': 140.7312,
-        },
-        {
-            'name': 'FLOAT',
-            'address': '青森県青森市緑3丁目10-1',
-            'nearest_station': '筒井駅',
-            'genres': 'レディース,ヴィンテージ,US古着,ストリート',
-            'hours': '平日 12:00〜20:00 / 土日祝 11:00〜20:00',
-            'holiday': '月曜日',
-            'homepage_url': '',
-            'sns_url': 'https://www.instagram.com/float_used',
-            'description': 'TOY SOLDIERSの姉妹店。青森市初のレディース特化古着屋（2024年4月オープン）。',
-            'latitude': 40.8160, 'longitude': 140.7318,
-        },
-        {
-            'name': 'ESSENCE',
-            'address': '青森県青森市古川1丁目18-2 2階',
-            'nearest_station': '青森駅',
-            'genres': 'ヴィンテージ,アメカジ,US古着,ブランド古着',
-            'hours': '11:00〜19:00',
-            'holiday': '火曜日',
-            'homepage_url': 'https://essence-aomori.stores.jp/',
-            'sns_url': 'https://www.instagram.com/essence_aomori',
-            'description': 'ヴィンテージ・アメカジ・デザイナー古着を扱うセレクト系ショップ。',
-            'latitude': 40.8237, 'longitude': 140.7531,
-        },
-        {
-            'name': 'SUN AND SEA',
-            'address': '青森県青森市新町1丁目12-11 新町パークビル1-B',
-            'nearest_station': '青森駅',
-            'genres': 'アメカジ,ヴィンテージ,US古着',
-            'hours': '11:00〜20:00（冬季 11:00〜18:00）',
-            'holiday': '水曜日',
-            'homepage_url': '',
-            'sns_url': 'https://www.instagram.com/sunandsea_aomori',
-            'description': 'アメカジ・ヴィンテージ・US古着メンズ中心のショップ。',
-            'latitude': 40.8244, 'longitude': 140.7465,
-        },
-        {
-            'name': 'Stroke Clothing',
-            'address': '青森県青森市古川1丁目16-4',
-            'nearest_station': '青森駅',
-            'genres': 'アメカジ,ワーク,ミリタリー,ヴィンテージ',
-            'hours': '11:00〜20:00',
-            'holiday': '木曜日',
-            'homepage_url': 'https://strokeclothing.com/',
-            'sns_url': 'https://www.instagram.com/stroke_clothing',
-            'description': 'FREEWHEELERS・WESTRIDE・BUZZ RICKSON\'Sなど国産高級ブランドも扱うアメカジ・ワーク系ショップ。',
-            'latitude': 40.8236, 'longitude': 140.7497,
-        },
-        {
-            'name': 'KEY to the CITY BOUTIQUE',
-            'address': '青森県青森市古川1丁目21-20',
-            'nearest_station': '青森駅',
-            'genres': 'ヴィンテージ,ブランド古着,レディース',
-            'hours': '',
-            'holiday': 'なし',
-            'homepage_url': 'https://keytothecity.theshop.jp/',
-            'sns_url': 'https://www.instagram.com/keytothecity.boutique',
-            'description': '旧「AMA used clothing」が改称・リニューアル。欧米ヴィンテージ・ブランド古着を扱う。',
-            'latitude': 40.8231, 'longitude': 140.7478,
-        },
-        {
-            'name': '趣味屋',
-            'address': '青森県青森市合浦2丁目11-19',
-            'nearest_station': '東青森駅',
-            'genres': 'US古着,アメカジ,ヴィンテージ',
-            'hours': '13:00〜20:00',
-            'holiday': '月曜日',
-            'homepage_url': '',
-            'sns_url': 'https://www.instagram.com/syumiya.used',
-            'description': '80s・90sのUSA古着とアメリカン雑貨専門店。',
-            'latitude': 40.8029, 'longitude': 140.7630,
-        },
-        {
-            'name': 'PICK UP（無人古着屋）',
-            'address': '青森県青森市古川1丁目14-3 BLACK BOX 1F',
-            'nearest_station': '青森駅',
-            'genres': 'その他',
-            'hours': '24時間営業',
-            'holiday': '不定休',
-            'homepage_url': '',
-            'sns_url': 'https://www.instagram.com/mujinnofurugipickup2023',
-            'description': '無人販売形式の古着屋。毎日新商品大量入荷。全品5,000円以下。',
-            'latitude': 40.8240, 'longitude': 140.7510,
-        },
-        {
-            'name': 'DIG TIME',
-            'address': '青森県青森市緑3丁目8-7',
-            'nearest_station': '筒井駅',
-            'genres': 'ヴィンテージ,アメカジ,US古着',
-            'hours': '平日 12:00〜20:00 / 土日祝 11:00〜20:00',
-            'holiday': '月曜日',
-            'homepage_url': 'https://toysoldiers.base.shop/',
-            'sns_url': 'https://www.instagram.com/toysoldiers_usedclothing',
-            'description': 'TOY SOLDIERSの2号店。ヴィンテージ・アメカジ・US古着を中心に展開。',
-            'latitude': 40.8163, 'longitude': 140.7313,
-        },
-        {
-            'name': 'プライスドロップ 浜館店',
-            'address': '青森県青森市浜館6丁目1-8 1階',
-            'nearest_station': '東青森駅',
-            'genres': 'その他',
-            'hours': '11:00〜19:00',
-            'holiday': '火曜日',
-            'homepage_url': 'https://yorozuya-dc.com/store/shop-13/',
-            'sns_url': 'https://www.instagram.com/pd.hamadate',
-            'description': '萬屋グループのアウトレット専門店。古着・日用品・雑貨を取り扱う。',
-            'latitude': 40.8021, 'longitude': 140.7648,
-        },
-        # ── 弘前市 ────────────────────────────────────────────
-        {
-            'name': 'SEESAW',
-            'address': '青森県弘前市北瓦ケ町3-1 キョウドウ第一ビル 1階A',
-            'nearest_station': '中央弘前駅',
-            'genres': 'ヴィンテージ,レディース',
-            'hours': '13:00〜21:00',
-            'holiday': '火曜日',
-            'homepage_url': 'https://seesaw0923.base.shop/',
-            'sns_url': 'https://www.instagram.com/seesaw_hirosaki',
-            'description': '60s〜90sのヴィンテージを中心に扱う弘前の古着屋。',
-            'latitude': 40.6015, 'longitude': 140.4637,
-        },
-        {
-            'name': 'THE FICTION',
-            'address': '青森県弘前市代官町56',
-            'nearest_station': '中央弘前駅',
-            'genres': 'ヴィンテージ,レディース,アメカジ',
-            'hours': '平日 13:00〜21:00 / 土日 12:00〜21:00',
-            'holiday': '火曜日',
-            'homepage_url': 'https://fiction.theshop.jp/',
-            'sns_url': 'https://www.instagram.com/the_fiction___',
-            'description': '60s〜90sのヴィンテージ古着・雑貨を扱う弘前の人気ショップ。',
-            'latitude': 40.5992, 'longitude': 140.4743,
-        },
-        {
-            'name': 'BUTTON UP CLOTHING',
-            'address': '青森県弘前市大町3丁目10-8',
-            'nearest_station': '中央弘前駅',
-            'genres': 'ヴィンテージ,アメカジ,US古着',
-            'hours': '13:00〜19:00',
-            'holiday': '火曜日',
-            'homepage_url': 'http://buttonupclothing.jp/',
-            'sns_url': 'https://www.instagram.com/buttonupclothing',
-            'description': 'アメリカ現地買い付けのヴィンテージ・US古着専門店。',
-            'latitude': 40.6031, 'longitude': 140.4651,
-        },
-        {
-            'name': 'CRAZY GARDENS',
-            'address': '青森県弘前市取上2丁目14-1',
-            'nearest_station': '弘前東高校前駅',
-            'genres': 'US古着,アウトドア,ストリート',
-            'hours': '平日 13:00〜20:00 / 土日祝 12:00〜20:00',
-            'holiday': '水曜日',
-            'homepage_url': '',
-            'sns_url': 'https://www.instagram.com/crazygardens',
-            'description': 'ロサンゼルス買い付けのUS古着中心。ヒップホップ・レゲエが流れるラフな雰囲気。',
-            'latitude': 40.5946, 'longitude': 140.4891,
-        },
-        {
-            'name': '古着屋 B',
-            'address': '青森県弘前市大町3丁目2-9 1F',
-            'nearest_station': '弘前駅',
-            'genres': 'ストリート,Y2K,ヴィンテージ',
-            'hours': '13:00〜20:00',
-            'holiday': '不定休',
-            'homepage_url': '',
-            'sns_url': 'https://www.instagram.com/b__aomori',
-            'description': 'Stussy・Nike・Adidasなどのストリート・Y2Kアイテムが中心。',
-            'latitude': 40.6032, 'longitude': 140.4659,
-        },
-        {
-            'name': 'FESTINA LENTE 弘前店',
-            'address': '青森県弘前市代官町22A',
-            'nearest_station': '中央弘前駅',
-            'genres': 'ヴィンテージ',
-            'hours': '11:00〜16:00',
-            'holiday': '水曜日',
-            'homepage_url': 'https://festinalente.theshop.jp/',
-            'sns_url': 'https://www.instagram.com/festinalente.shop',
-            'description': 'アメリカ買い付けの上質なヴィンテージ古着・アンティーク雑貨。2025年4月オープン。',
-            'latitude': 40.5993, 'longitude': 140.4743,
-        },
-        # ── 黒石市 ────────────────────────────────────────────
-        {
-            'name': 'FESTINA LENTE 黒石VINTAGE',
-            'address': '青森県黒石市横町14-4 ストゼン+101',
-            'nearest_station': '黒石駅',
-            'genres': 'ヴィンテージ',
-            'hours': '土日 12:00〜18:00 / 月火 13:00〜18:00',
-            'holiday': '不定休（Instagram要確認）',
-            'homepage_url': 'https://festinalente.theshop.jp/',
-            'sns_url': 'https://www.instagram.com/festinalente.vintage',
-            'description': 'アメリカ買い付けの上質なヴィンテージ古着とアンティーク雑貨を扱う黒石の本店。',
-            'latitude': 40.6432, 'longitude': 140.5978,
-        },
-        # ── 八戸市 ────────────────────────────────────────────
-        {
-            'name': 'DEMONSTRANDUM DSD',
-            'address': '青森県八戸市下長3丁目9-7',
-            'nearest_station': '本八戸駅',
-            'genres': 'US古着,ヴィンテージ,アメカジ,ミリタリー',
-            'hours': '12:00〜20:00（土日祝 12:00〜19:00）',
-            'holiday': '火・水・木曜日',
-            'homepage_url': 'https://demonstrandum-dsd.com/',
-            'sns_url': 'https://www.instagram.com/demonstrandum.dsd',
-            'description': 'US古着・ヴィンテージ・ミリタリーを扱う八戸のセレクト系古着屋。',
-            'latitude': 40.5115, 'longitude': 141.4712,
-        },
-        {
-            'name': '古着倶楽部 八戸',
-            'address': '青森県八戸市青葉1丁目18-19',
-            'nearest_station': '本八戸駅',
-            'genres': 'ヴィンテージ,ブランド古着,US古着',
-            'hours': '',
-            'holiday': 'なし',
-            'homepage_url': '',
-            'sns_url': 'https://www.instagram.com/furugiclub_hachinohe',
-            'description': 'ヴィンテージ・ブランド古着・US古着を扱う。買取・委託販売も実施。',
-            'latitude': 40.5057, 'longitude': 141.4876,
-        },
-        {
-            'name': 'Yellow Bullbon',
-            'address': '青森県八戸市馬場町11-1 Fine Hills 1F',
-            'nearest_station': '本八戸駅',
-            'genres': 'US古着,スポーツ,ヴィンテージ',
-            'hours': '13:00〜19:00',
-            'holiday': '不定休',
-            'homepage_url': 'http://www.yellowbullbon.com',
-            'sns_url': 'https://www.instagram.com/yellowbullbon',
-            'description': 'Champion等アメリカンスポーツウェアのUS古着・ヴィンテージ専門店。',
-            'latitude': 40.5023, 'longitude': 141.4869,
-        },
-        {
-            'name': 'ムジンノフクヤ 八戸白銀店',
-            'address': '青森県八戸市白銀町浜崖7-7',
-            'nearest_station': '本八戸駅',
-            'genres': 'US古着,ブランド古着',
-            'hours': '24時間営業',
-            'holiday': 'なし',
-            'homepage_url': 'https://mujinfukuya.thebase.in/',
-            'sns_url': 'https://www.instagram.com/mujinnofukuya_8shirogane',
-            'description': '無人店舗（券売機精算）の古着屋。海外輸入古着を24時間販売。東北初出店。',
-            'latitude': 40.5397, 'longitude': 141.5036,
-        },
-        {
-            'name': 'OTTO',
-            'address': '青森県八戸市大字鳥屋部町14-2 1F',
-            'nearest_station': '本八戸駅',
-            'genres': 'ヴィンテージ,その他',
-            'hours': '木〜火 11:00〜20:00',
-            'holiday': '水曜日',
-            'homepage_url': '',
-            'sns_url': '',
-            'description': '服・雑貨・家具まで幅広い品揃えの知る人ぞ知る八戸の古着屋。',
-            'latitude': 40.5012, 'longitude': 141.4891,
-        },
-        {
-            'name': 'プライスドロップ 類家店',
-            'address': '青森県八戸市南類家3丁目2-8',
-            'nearest_station': '本八戸駅',
-            'genres': 'その他',
-            'hours': '〜19:00',
-            'holiday': '火曜日',
-            'homepage_url': 'https://yorozuya-dc.com/store/shop-14/',
-            'sns_url': 'https://www.instagram.com/pricedrop8ruike',
-            'description': '萬屋グループのアウトレット専門店。古着・日用品・雑貨・ホビーを取り扱う。',
-            'latitude': 40.5012, 'longitude': 141.5002,
-        },
-        # ── 十和田市 ──────────────────────────────────────────
-        {
-            'name': '四次元ポケット 十和田店',
-            'address': '青森県十和田市東一番町7-5',
-            'nearest_station': '三沢駅',
-            'genres': 'ブランド古着,その他',
-            'hours': '10:00〜19:00',
-            'holiday': 'なし',
-            'homepage_url': 'https://www.yojigenpk.com/',
-            'sns_url': 'https://www.instagram.com/yojigentowada10',
-            'description': 'リサイクル全般を扱うショップ。ブランド古着・Supreme等も強化中。弘前・黒石・十和田に展開。',
-            'latitude': 40.5247, 'longitude': 141.2265,
-        },
-    ]
-
-    added = 0
-    for d in aomori_shops:
-        if Shop.query.filter_by(name=d['name']).first():
-            continue
-        db.session.add(Shop(
-            name=d['name'],
-            address=d.get('address', ''),
-            nearest_station=d.get('nearest_station', ''),
-            genres=d.get('genres', ''),
-            hours=d.get('hours', ''),
-            holiday=d.get('holiday', 'なし'),
-            homepage_url=d.get('homepage_url', ''),
-            sns_url=d.get('sns_url', ''),
-            description=d.get('description', ''),
-            price_range=d.get('price_range', '不明'),
-            payment_methods=d.get('payment_methods', '不明'),
-            parking=d.get('parking', ''),
-            latitude=d['latitude'],
-            longitude=d['longitude'],
-            rating=0.0,
-            review_count=0,
-            place_id='',
-            plus_code='',
-        ))
-        added += 1
+    def __init__(self):
+        self._rate_keys = set()  # AppMeta に行を作成済みのレート制限
+
+    def get(self, key):
+        with db.engine.connect() as conn:
+            row = conn.execute(db.select(
+                GeocodeCache.latitude, GeocodeCache.longitude, GeocodeCache.expires_at, GeocodeCache.provider,
+            ).where(GeocodeCache.address_key == key)).first()
+        return tuple(row) if row else None
+
+    def put(self, key, lat, lng, expires_at, provider):
+        # 同じ住所を同時に引いたリクエスト同士がぶつかっても一意制約違反にしない（後勝ち）
+        values = {'latitude': lat, 'longitude': lng, 'expires_at': expires_at, 'provider': provider}
+        with db.engine.begin() as conn:
+            insert = dialect_insert(GeocodeCache)
+            if hasattr(insert, 'on_conflict_do_update'):
+                conn.execute(insert.values(address_key=key, **values).on_conflict_do_update(
+                    index_elements=[GeocodeCache.address_key], set_=values))
+            else:
+                conn.execute(db.delete(GeocodeCache).where(GeocodeCache.address_key == key))
+                conn.execute(insert.values(address_key=key, **values))
+
+    def reserve(self, name, interval):
+        """全プロセス共通のレート制限の枠を予約し、待つべき秒数を返す（geocoding.SharedRateLimit）。
+        次に使える時刻（UNIX秒）を AppMeta の 'rate:<name>' に持ち、読んだ値のままなら書き換える
+        """
+        key = f'rate:{name}'
+        if key not in self._rate_keys:
+            with db.engine.begin() as conn:
+                conn.execute(insert_ignoring_conflicts(AppMeta).values(key=key, value='0'))
+            self._rate_keys.add(key)
+        while True:
+            with db.engine.begin() as conn:
+                current = conn.execute(db.select(AppMeta.value).where(AppMeta.key == key)).scalar_one()
+                now = time.time()
+                slot = max(now, float(current))
+                claimed = conn.execute(db.update(AppMeta).where(
+                    AppMeta.key == key, AppMeta.value == current,
+                ).values(value=repr(slot + interval))).rowcount
+            if claimed:
+                return slot - now
+
+geocoder = GeocodeService(DbGeocodeStore())
+use_shared_nominatim_limit(geocoder.store.reserve)  # gunicorn の全ワーカーと geocode-worker で合わせて1回/秒
+
+# ==========================================
+#  住所→座標のバックグラウンド処理
+# ==========================================
+
+GEOCODE_MAX_ATTEMPTS = 5
+GEOCODE_POLL_SECONDS = 5
+GEOCODE_LEASE = timedelta(minutes=10)  # running のまま止まったジョブを pending に戻すまでの時間
+# Webプロセス（gunicorn の各ワーカー）の中でもジョブを処理する。worker プロセスを動かせない環境用
+GEOCODE_WORKER_THREAD = os.environ.get('GEOCODE_WORKER_THREAD', '0') == '1'
+
+def enqueue_geocode(shop):
+    """座標取得をキューに積む（コミットは呼び出し側）"""
+    shop.geocode_status = 'pending'
+    if shop.id is None:
+        db.session.flush()
+    db.session.add(GeocodeJob(shop_id=shop.id))
+
+def _claim_geocode_job(job_id):
+    """pending → running に切り替えられたら True（複数ワーカーでの二重処理を防ぐ）。
+    running の間の next_attempt_at は期限で、過ぎたら処理中に止まったとみなす（_release_stale_geocode_jobs）"""
+    claimed = db.session.execute(db.update(GeocodeJob).where(
+        GeocodeJob.id == job_id, GeocodeJob.status == 'pending',
+    ).values(status='running', next_attempt_at=datetime.now() + GEOCODE_LEASE).execution_options(
+        synchronize_session=False)).rowcount
     db.session.commit()
-    print(f"✅ 青森県の古着屋 {added} 件を追加しました（スキップ: {len(aomori_shops) - added} 件）")
-
-
-def seed_akita_shops():
-    """秋田県の古着屋データを追加（各店舗ごとに重複チェック）"""
-    akita_shops = [
-        # ── 秋田市 ────────────────────────────────────────────
-        {
-            'name': '古着屋Alright（オールライト）',
-            'address': '秋田県秋田市中通2-8-1 フォンテAKITA 2F',
-            'nearest_station': '秋田駅',
-            'genres': 'US古着,ヴィンテージ,アメカジ,レディース',
-            'hours': '10:00〜20:00',
-            'holiday': '不定休（フォンテAKITAに準ずる）',
-            'homepage_url': '',
-            'sns_url': 'https://www.instagram.com/alright_worldwide_recycle/',
-            'description': '秋田駅西口から徒歩約2分、フォンテAKITA2階。80s〜90s USA製スウェット・ナイロンジャケット・リーバイスなど、コスパに優れたレギュラーヴィンテージが中心。価格帯3,000〜8,000円。',
-            'latitude': 39.7188, 'longitude': 140.1028,
-        },
-        {
-            'name': 'BUP 秋田OPA店',
-            'address': '秋田県秋田市千秋久保田町4-2 秋田OPA 5F',
-            'nearest_station': '秋田駅',
-            'genres': 'US古着,ヴィンテージ',
-            'hours': '10:00〜20:00',
-            'holiday': '不定休（OPAに準ずる）',
-            'homepage_url': '',
-            'sns_url': 'https://www.instagram.com/bup_japan_akita/',
-            'description': '秋田OPA5階に入る古着専門店。アメリカ古着を低価格で展開。アクセサリーやアートアイテムも取り扱う。秋田駅西口から徒歩約3分。',
-            'latitude': 39.7199, 'longitude': 140.1021,
-        },
-        {
-            'name': 'DINER018 秋田駅前本店',
-            'address': '秋田県秋田市大町2丁目4-23',
-            'nearest_station': '秋田駅',
-            'genres': 'ヴィンテージ,アメカジ,US古着',
-            'hours': '平日14:00〜20:00 / 土日祝13:00〜19:00',
-            'holiday': '不定休（Instagramで告知）',
-            'homepage_url': 'https://diner018.thebase.in/',
-            'sns_url': 'https://www.instagram.com/diner018.akita/',
-            'description': 'アメリカから直接買い付けたリアルなヴィンテージアイテムをキュレーションするアメカジ専門店。オンラインショップも運営。',
-            'latitude': 39.7168, 'longitude': 140.0987,
-        },
-        {
-            'name': 'BOROS',
-            'address': '秋田県秋田市中通3丁目4-5',
-            'nearest_station': '秋田駅',
-            'genres': 'ヴィンテージ,US古着,レディース',
-            'hours': '平日14:00〜19:00 / 土日祝13:00〜20:00',
-            'holiday': '不定休（Instagramで告知）',
-            'homepage_url': '',
-            'sns_url': 'https://www.instagram.com/boros_vintage/',
-            'description': '秋田市中通に位置する個性派ビンテージショップ。アメリカ・ヨーロッパのビンテージを中心に、メンズ・レディース問わず幅広く取り揃える。',
-            'latitude': 39.7178, 'longitude': 140.1002,
-        },
-        {
-            'name': 'FANCYWALK',
-            'address': '秋田県秋田市中通5-5-31 芙水ビル1F',
-            'nearest_station': '秋田駅',
-            'genres': 'ヴィンテージ,アメカジ,レディース',
-            'hours': '13:00〜19:00',
-            'holiday': '不定休',
-            'homepage_url': '',
-            'sns_url': 'https://www.instagram.com/fancywalk57/',
-            'description': '1940年代〜80年代を中心としたヴィンテージ古着を専門に扱う、秋田有数の本格派ショップ。アンティーク雑貨も併せて展開。',
-            'latitude': 39.7155, 'longitude': 140.1010,
-        },
-        {
-            'name': '古着屋アンディ&キャロライン',
-            'address': '秋田県秋田市中通6丁目14-11',
-            'nearest_station': '秋田駅',
-            'genres': 'ヴィンテージ,レディース',
-            'hours': '不定期営業（Instagramで確認）',
-            'holiday': '不定休',
-            'homepage_url': '',
-            'sns_url': 'https://www.instagram.com/andy00caroline/',
-            'description': 'オーナー自ら手を加えた世界にひとつだけのリメイクピースを展開するユニーク古着店。',
-            'latitude': 39.7142, 'longitude': 140.1015,
-        },
-        {
-            'name': 'GB Vintage shop',
-            'address': '秋田県秋田市保戸野中町1-2',
-            'nearest_station': '秋田駅',
-            'genres': 'US古着,ストリート,アメカジ,アウトドア,レディース',
-            'hours': '13:00〜19:00',
-            'holiday': '不定休',
-            'homepage_url': 'https://gbvintage.base.shop/',
-            'sns_url': 'https://www.instagram.com/gb_vintage_shop/',
-            'description': '海外輸入古着を中心にストリート・アメカジ・アウトドアなど幅広いジャンルを男女問わず展開。美容室が併設されたユニークな複合スペース。',
-            'latitude': 39.7225, 'longitude': 140.1098,
-        },
-        {
-            'name': 'SINUS.',
-            'address': '秋田県秋田市東通仲町9-5',
-            'nearest_station': '秋田駅',
-            'genres': 'US古着,ヴィンテージ,レディース',
-            'hours': '12:00〜19:00',
-            'holiday': '不定休',
-            'homepage_url': 'https://sinus60.thebase.in/',
-            'sns_url': 'https://www.instagram.com/sinus.used/',
-            'description': '秋田駅東口近くにある古着屋。アメリカ・ヨーロッパの個性豊かなデザインの古着を中心に取り揃え。素材の質感や着心地を重視した買い付けが特徴。',
-            'latitude': 39.7192, 'longitude': 140.1075,
-        },
-        {
-            'name': 'いいべ',
-            'address': '秋田県秋田市中通3-3-1',
-            'nearest_station': '秋田駅',
-            'genres': 'ヴィンテージ,US古着,レディース',
-            'hours': '10:30〜18:00（火・水は〜17:00）',
-            'holiday': '月曜（祝日の場合は翌日休）',
-            'homepage_url': '',
-            'sns_url': 'https://www.instagram.com/iibe__akita/',
-            'description': '都内セレクトショップ勤務経験を持つ夫婦が秋田に移住して開業。秋田の四季に合わせた古着を3,000円台〜でセレクト。店内に郷土玩具など秋田の特産品も並ぶ。',
-            'latitude': 39.7175, 'longitude': 140.1003,
-        },
-        {
-            'name': 'Gallant-doo',
-            'address': '秋田県秋田市広面字昼寝46-4',
-            'nearest_station': '秋田駅',
-            'genres': 'ヴィンテージ,ミリタリー,US古着',
-            'hours': '月・金 15:00〜19:00 / 土・日 10:00〜19:00',
-            'holiday': '火・水・木曜日',
-            'homepage_url': 'https://gallant-doo.com/',
-            'sns_url': '',
-            'description': '欧米から直接仕入れたデイリーウエア・ミリタリー・ヴィンテージ・アンティークを1,000点以上取り揃えるセレクト店。ヴィンテージ腕時計・ジュエリー・雑貨も展開。',
-            'latitude': 39.7130, 'longitude': 140.1162,
-        },
-        {
-            'name': 'REAL MOON 秋田店',
-            'address': '秋田県秋田市東通5-8-25',
-            'nearest_station': '秋田駅',
-            'genres': 'アメカジ,ヴィンテージ,US古着',
-            'hours': '11:00〜19:00',
-            'holiday': '毎週火曜・水曜',
-            'homepage_url': 'https://www.realmoon.co.jp/',
-            'sns_url': 'https://www.instagram.com/realmoon_store/',
-            'description': '1996年創業のアメカジ専門店。アメリカのクラフツマンブランドとジャパニーズブランドを中心にセレクト。湯沢に本店あり。',
-            'latitude': 39.7215, 'longitude': 140.1082,
-        },
-        # ── 大仙市 ────────────────────────────────────────────
-        {
-            'name': 'sit in',
-            'address': '秋田県大仙市大曲通町2-31',
-            'nearest_station': '大曲駅',
-            'genres': 'ヴィンテージ,US古着,レディース',
-            'hours': '11:00〜18:00',
-            'holiday': '水曜日',
-            'homepage_url': 'https://akita-sitin.shopinfo.jp/',
-            'sns_url': 'https://www.instagram.com/sitinclothing/',
-            'description': '大仙市大曲の古着専門店。大曲駅から徒歩圏内に位置し、通販にも対応。',
-            'latitude': 39.4817, 'longitude': 140.4782,
-        },
-        # ── 湯沢市 ────────────────────────────────────────────
-        {
-            'name': 'made in TIGER',
-            'address': '秋田県湯沢市大町1-1-1 大友ビル1F',
-            'nearest_station': '湯沢駅',
-            'genres': 'US古着,アメカジ,レディース',
-            'hours': '12:00〜20:00',
-            'holiday': '不定休',
-            'homepage_url': '',
-            'sns_url': '',
-            'description': '湯沢市出身の店主が地元で開業。関東から買い付けたアウター・スウェット・シャツを中心に、リーズナブルな価格帯でラインアップ。',
-            'latitude': 39.1645, 'longitude': 140.4952,
-        },
-        {
-            'name': 'REAL MOON 湯沢店',
-            'address': '秋田県湯沢市元清水2-5-8',
-            'nearest_station': '湯沢駅',
-            'genres': 'アメカジ,ヴィンテージ,US古着',
-            'hours': '11:00〜19:00',
-            'holiday': '毎週木曜・金曜',
-            'homepage_url': 'https://www.realmoon.co.jp/',
-            'sns_url': 'https://www.instagram.com/realmoon_store/',
-            'description': '1996年創業のREAL MOON本店。アメリカン・ゴールデンエイジのヴィンテージからインスパイアされた商品とアメカジブランド正規品を販売。',
-            'latitude': 39.1638, 'longitude': 140.4928,
-        },
-    ]
-
-    added = 0
-    for d in akita_shops:
-        if Shop.query.filter_by(name=d['name']).first():
-            continue
-        db.session.add(Shop(
-            name=d['name'],
-            address=d.get('address', ''),
-            nearest_station=d.get('nearest_station', ''),
-            genres=d.get('genres', ''),
-            hours=d.get('hours', ''),
-            holiday=d.get('holiday', 'なし'),
-            homepage_url=d.get('homepage_url', ''),
-            sns_url=d.get('sns_url', ''),
-            description=d.get('description', ''),
-            price_range=d.get('price_range', '不明'),
-            payment_methods=d.get('payment_methods', '不明'),
-            parking=d.get('parking', ''),
-            latitude=d['latitude'],
-            longitude=d['longitude'],
-            rating=0.0,
-            review_count=0,
-            place_id='',
-            plus_code='',
-        ))
-        added += 1
+    return claimed == 1
+
+def _release_stale_geocode_jobs():
+    """期限を過ぎても running のままのジョブ（処理中にプロセスが落ちた等）を pending に戻す"""
+    db.session.execute(db.update(GeocodeJob).where(
+        GeocodeJob.status == 'running', GeocodeJob.next_attempt_at <= datetime.now(),
+    ).values(status='pending').execution_options(synchronize_session=False))
     db.session.commit()
-    print(f"✅ 秋田県の古着屋 {added} 件を追加しました（スキップ: {len(akita_shops) - added} 件）")
-
-
-def seed_iwate_shops():
-    """岩手県の古着屋データを追加（各店舗ごとに重複チェック）"""
-    iwate_shops = [
-        # ── 盛岡市 ────────────────────────────────────────────
-        {
-            'name': 'Brownstone',
-            'address': '岩手県盛岡市開運橋通り1-2 アイビルK1F',
-            'nearest_station': '盛岡駅',
-            'genres': 'ヴィンテージ,アメカジ,US古着',
-            'hours': '月〜土 11:00〜20:00 / 日 11:00〜19:00',
-            'holiday': '年末年始',
-            'homepage_url': 'http://brs.brownstone.jp/',
-            'sns_url': 'https://www.instagram.com/morioka_brownstone/',
-            'description': '海外から直接買い付けた幅広いラインナップの古着屋。「いい洋服屋を目指している」をコンセプトに、90年代ファッションやレトロアイテムを中心にセレクト。盛岡を代表するヴィンテージショップ。',
-            'latitude': 39.7034, 'longitude': 141.1380,
-        },
-        {
-            'name': 'LOVELOCK',
-            'address': '岩手県盛岡市開運橋通1-40',
-            'nearest_station': '盛岡駅',
-            'genres': 'ヴィンテージ,US古着,レディース',
-            'hours': '月〜土 11:00〜20:00 / 日 11:00〜19:00',
-            'holiday': '年末年始',
-            'homepage_url': 'https://lvl.brownstone.jp/',
-            'sns_url': 'https://www.instagram.com/lovelock_morioka/',
-            'description': 'Brownstoneの姉妹店。アメリカから直接買い付けたUsed&Vintageを中心に、アジアンテイストの海外ヴィンテージも取り扱うレディース中心のショップ。',
-            'latitude': 39.7036, 'longitude': 141.1378,
-        },
-        {
-            'name': 'cheapchic',
-            'address': '岩手県盛岡市中央通1丁目12-1',
-            'nearest_station': '盛岡駅',
-            'genres': 'ヴィンテージ,US古着,レディース',
-            'hours': '11:00〜19:00',
-            'holiday': '不定休',
-            'homepage_url': 'https://www.cheapchic-japan.com/',
-            'sns_url': 'https://www.instagram.com/cheapchic_used/',
-            'description': 'アメリカ・ヨーロッパから直接買い付けたヴィンテージが並ぶ。70年代ヴィンテージを中心に衣類・靴・アンティーク雑貨まで揃い、パリの蚤の市のような空間が魅力。',
-            'latitude': 39.7066, 'longitude': 141.1430,
-        },
-        {
-            'name': 'gee,jee 盛岡',
-            'address': '岩手県盛岡市大通1-4-10 照井ビル2F',
-            'nearest_station': '上盛岡駅',
-            'genres': 'ブランド古着,アメカジ,レディース',
-            'hours': '平日 11:00〜19:30 / 日・祝 11:00〜19:00',
-            'holiday': '木曜日',
-            'homepage_url': 'https://happypoint.jp/geejee/',
-            'sns_url': 'https://www.instagram.com/geejee_morioka/',
-            'description': '東北最大級のブランド古着専門店。DCブランド・アメカジブランド・国内ブランドの衣類・小物・アクセサリー・靴を幅広く取り扱う。高価買取・宅配買取にも対応。',
-            'latitude': 39.7057, 'longitude': 141.1415,
-        },
-        {
-            'name': 'レトロブティックことり',
-            'address': '岩手県盛岡市城西町13-15',
-            'nearest_station': '盛岡駅',
-            'genres': 'ヴィンテージ,レディース,その他',
-            'hours': '日〜金 12:00〜19:00 / 土 12:00〜20:00',
-            'holiday': '火曜日',
-            'homepage_url': '',
-            'sns_url': 'https://www.instagram.com/cobicobi1129/',
-            'description': '「真剣にふざける」をモットーとした個性派古着屋。海外レトロアイテムから和柄ファッションまで取り扱い、オリジナルリメイクブランド「COBICOBI」・昭和レトロ雑貨も販売。',
-            'latitude': 39.7042, 'longitude': 141.1328,
-        },
-        {
-            'name': 'one and only',
-            'address': '岩手県盛岡市本宮3丁目10-11',
-            'nearest_station': '盛岡駅',
-            'genres': 'ヴィンテージ,US古着,アメカジ,ストリート',
-            'hours': '月・木〜日 12:00〜20:00',
-            'holiday': '火曜日・水曜日',
-            'homepage_url': '',
-            'sns_url': 'https://www.instagram.com/one_and_only_2007/',
-            'description': '盛岡のヴィンテージ・アメカジ系古着の人気店。アメリカンヴィンテージを中心に幅広いジャンルを取り扱う。駐車場完備。',
-            'latitude': 39.7100, 'longitude': 141.1290,
-        },
-        {
-            'name': 'JIKAI',
-            'address': '岩手県盛岡市長田町2-24 シャトルながまち1F',
-            'nearest_station': '盛岡駅',
-            'genres': 'ストリート,ブランド古着,レディース',
-            'hours': '12:00〜19:00',
-            'holiday': '不定休',
-            'homepage_url': 'https://jikaionline.com/',
-            'sns_url': 'https://www.instagram.com/jikai_morioka/',
-            'description': '古着×デザイナーズブランドのハイブリッドセレクトショップ。SUGARHILL・NVRFRGTなど国内外の注目ブランドを20社以上取り扱う盛岡発のセレクトショップ。',
-            'latitude': 39.7115, 'longitude': 141.1240,
-        },
-        {
-            'name': 'Jeans Shop 3rd Down',
-            'address': '岩手県盛岡市三本柳5地割31-1 セブンハイツ103',
-            'nearest_station': '岩手飯岡駅',
-            'genres': 'ヴィンテージ,アメカジ,ミリタリー,ワーク',
-            'hours': '12:00〜19:00',
-            'holiday': '木曜日',
-            'homepage_url': 'https://jeans3rddown.base.shop/',
-            'sns_url': 'https://www.instagram.com/jeans_shop_3rd_down/',
-            'description': '日本製ジーンズ専門。SUGAR CANE・BUZZ RICKSON\'Sなどアメリカンヴィンテージレプリカブランドを中心にセレクト。チェーンステッチミシンによる裾上げサービスも実施。',
-            'latitude': 39.7180, 'longitude': 141.1550,
-        },
-        {
-            'name': 'NORA antiques',
-            'address': '岩手県盛岡市鉈屋町2-19',
-            'nearest_station': '仙北町駅',
-            'genres': 'ヴィンテージ,レディース,その他',
-            'hours': '不定期（Instagram参照）',
-            'holiday': '不定休',
-            'homepage_url': '',
-            'sns_url': 'https://www.instagram.com/nora1985cat/',
-            'description': '古布（ボロ）を使ったリメイクアイテムとフランスヴィンテージ古着を専門とするアトリエ兼ショップ。古い布に新たな命を吹き込むリメイク作品が人気。盛岡の歴史ある鉈屋町エリアに位置する。',
-            'latitude': 39.7048, 'longitude': 141.1468,
-        },
-        # ── 花巻市 ────────────────────────────────────────────
-        {
-            'name': 'BLEND STORE',
-            'address': '岩手県花巻市上町13-34 1階',
-            'nearest_station': '花巻駅',
-            'genres': 'ヴィンテージ,US古着,ストリート,レディース',
-            'hours': '平日 13:00〜19:00 / 土日祝 12:00〜19:00',
-            'holiday': '月曜日',
-            'homepage_url': '',
-            'sns_url': 'https://www.instagram.com/blend___store/',
-            'description': 'ダンススタジオと古着屋を兼ねた複合スペース。個性的な品揃えで地元カルチャーの発信拠点となっている。',
-            'latitude': 39.3880, 'longitude': 141.1160,
-        },
-        # ── 奥州市 ────────────────────────────────────────────
-        {
-            'name': 'VILLAGE IMPORT',
-            'address': '岩手県奥州市水沢後田17-5',
-            'nearest_station': '水沢駅',
-            'genres': 'US古着,アメカジ,ヴィンテージ',
-            'hours': '平日 14:00〜19:00 / 土日祝 11:00〜19:00',
-            'holiday': '水曜日',
-            'homepage_url': 'https://village-import.com/',
-            'sns_url': 'https://www.instagram.com/village.import/',
-            'description': 'アメリカ古着・雑貨の専門店。本場アメリカから直輸入したUS古着やアメリカン雑貨を豊富に取り揃える。',
-            'latitude': 39.1430, 'longitude': 141.1370,
-        },
-        {
-            'name': '古着天国 OLD ROCKET',
-            'address': '岩手県奥州市水沢真城柿ノ木下59-3',
-            'nearest_station': '水沢駅',
-            'genres': 'ヴィンテージ,US古着,アメカジ',
-            'hours': '平日 12:00〜18:00 / 土日祝 11:00〜18:00',
-            'holiday': '水曜日',
-            'homepage_url': '',
-            'sns_url': 'https://www.instagram.com/furugi_paradise.oldrocket/',
-            'description': '奥州市水沢エリアの古着屋。海外輸入ヴィンテージ古着・雑貨・小物を中心に取り扱い、取り置きサービスにも対応（DM・電話可）。',
-            'latitude': 39.1350, 'longitude': 141.1340,
-        },
-    ]
-
-    added = 0
-    for d in iwate_shops:
-        if Shop.query.filter_by(name=d['name']).first():
-            continue
-        db.session.add(Shop(
-            name=d['name'],
-            address=d.get('address', ''),
-            nearest_station=d.get('nearest_station', ''),
-            genres=d.get('genres', ''),
-            hours=d.get('hours', ''),
-            holiday=d.get('holiday', 'なし'),
-            homepage_url=d.get('homepage_url', ''),
-            sns_url=d.get('sns_url', ''),
-            description=d.get('description', ''),
-            price_range=d.get('price_range', '不明'),
-            payment_methods=d.get('payment_methods', '不明'),
-            parking=d.get('parking', ''),
-            latitude=d['latitude'],
-            longitude=d['longitude'],
-            rating=0.0,
-            review_count=0,
-            place_id='',
-            plus_code='',
-        ))
-        added += 1
+
+def _process_geocode_job(job):
+    shop = db.session.get(Shop, job.shop_id)
+    # 外部APIを待つ間にこのセッションで書き込みを始めない（SQLite ではキャッシュの保存がロック待ちになる）
+    error = result = None
+    try:
+        result = geocoder.geocode(shop.address or '', raise_errors=True) if shop else None
+    except GeocodeError as e:
+        error = e
+    job.attempts = (job.attempts or 0) + 1
+    if error is not None:
+        job.last_error = str(error)[:200]
+        if job.attempts >= GEOCODE_MAX_ATTEMPTS:
+            job.status = 'failed'
+            shop.geocode_status = 'failed'
+        else:
+            job.status = 'pending'
+            job.next_attempt_at = datetime.now() + timedelta(minutes=2 ** job.attempts)
+    else:
+        job.status = 'done'
+        if shop and result:
+            shop.latitude, shop.longitude = result
+            shop.geocode_status = 'ok'
+        elif shop:
+            shop.geocode_status = 'failed'  # 住所が見つからない。管理画面から座標を入れてもらう
     db.session.commit()
-    print(f"✅ 岩手県の古着屋 {added} 件を追加しました（スキップ: {len(iwate_shops) - added} 件）")
-
-
-def seed_yamagata_shops():
-    """山形県の古着屋データを追加（各店舗ごとに重複チェック）"""
-    yamagata_shops = [
-        # ── 山形市 ────────────────────────────────────────────
-        {
-            'name': '無人古着屋NOTIME 山形店',
-            'address': '山形県山形市美畑町12-27 南栄ビル1階',
-            'nearest_station': '山形駅',
-            'genres': 'アメカジ,ベーシック',
-            'hours': '24時間営業',
-            'holiday': 'なし',
-            'homepage_url': '',
-            'sns_url': 'https://www.instagram.com/notime_yamagata/',
-            'description': '山形市初の24時間365日営業無人古着屋。LINE解錠式で入店しセルフレジで決済。ベーシックなアメカジを中心に手頃な価格で展開。駐車場9台完備。',
-            'price_range': '不明',
-            'payment_methods': '電子マネー・スマホバーコード決済',
-            'parking': 'あり（9台）',
-            'latitude': 38.2351, 'longitude': 140.3262,
-        },
-        {
-            'name': 'SQUAT（スクワット）',
-            'address': '山形県山形市十日町4-3-14',
-            'nearest_station': '山形駅',
-            'genres': 'ヨーロッパヴィンテージ,ミリタリー,ワークウェア',
-            'hours': '11:00-20:00',
-            'holiday': '不定休',
-            'homepage_url': 'https://squat.shop-pro.jp/',
-            'sns_url': 'https://www.instagram.com/squat_used_clothing/',
-            'description': '1900年代〜1980年代のヨーロッパ直輸入ヴィンテージ専門店。ワークウェア・ミリタリー・欧州アヴァンギャルドを中心に展開する山形の老舗。仙台にも姉妹店あり。',
-            'price_range': '不明',
-            'payment_methods': '現金',
-            'parking': '',
-            'latitude': 38.2523, 'longitude': 140.3572,
-        },
-        {
-            'name': 'MUNDO NOVO（ムンドノーボ）',
-            'address': '山形県山形市南三番町11-26',
-            'nearest_station': '山形駅',
-            'genres': 'レディース,ヨーロッパヴィンテージ',
-            'hours': '13:00-19:00',
-            'holiday': '不定休',
-            'homepage_url': '',
-            'sns_url': 'https://www.instagram.com/mundonovo___/',
-            'description': 'SQUATオーナーが営むレディース向けヨーロッパ古着セレクトショップ。手頃な価格でヨーロッパの古着・小物を厳選。全国でも珍しい欧州レディース専門店。',
-            'price_range': '不明',
-            'payment_methods': '現金',
-            'parking': 'あり（3台）',
-            'latitude': 38.2472, 'longitude': 140.3598,
-        },
-        {
-            'name': 'antique store LIFE（ライフ）',
-            'address': '山形県山形市緑町3-16-5',
-            'nearest_station': '山形駅',
-            'genres': 'アメリカンヴィンテージ,ネイティブジュエリー',
-            'hours': '12:00-19:00',
-            'holiday': '不定休',
-            'homepage_url': '',
-            'sns_url': 'https://www.instagram.com/lifeyamagata/',
-            'description': 'アメリカで買い付けたヴィンテージ古着とネイティブアメリカンジュエリーを専門に扱うセレクトショップ。アンティーク雑貨も豊富。',
-            'price_range': '不明',
-            'payment_methods': '現金',
-            'parking': '',
-            'latitude': 38.2538, 'longitude': 140.3424,
-        },
-        {
-            'name': 'Sunny Collection（サニーコレクション）',
-            'address': '山形県山形市西田2-4-13',
-            'nearest_station': '山形駅',
-            'genres': 'アメカジ,ミリタリー,アウトドア',
-            'hours': '10:30-19:00',
-            'holiday': '月曜・火曜・水曜',
-            'homepage_url': 'https://sunnycollection.jp/',
-            'sns_url': 'https://www.instagram.com/sunnycollection/',
-            'description': '山形市西バイパス沿いのアメカジ専門古着屋。カフェ併設で80〜90年代を中心とした厳選ヴィンテージをゆったりと選べる。',
-            'price_range': '不明',
-            'payment_methods': '現金',
-            'parking': 'あり',
-            'latitude': 38.2383, 'longitude': 140.3142,
-        },
-        {
-            'name': 'hawdacot（ハウダコット）山形',
-            'address': '山形県山形市本町1-4-23 細谷ビル1F',
-            'nearest_station': '山形駅',
-            'genres': 'ヴィンテージ,US古着,レディース',
-            'hours': '12:00-20:00',
-            'holiday': '不定休',
-            'homepage_url': '',
-            'sns_url': 'https://www.instagram.com/hawdacot_yamagata/',
-            'description': '90年代以降の良質なヴィンテージを幅広く展開。埼玉発の古着ブランドが山形に出店。全年代・男女問わず楽しめる。',
-            'price_range': '不明',
-            'payment_methods': '現金',
-            'parking': '',
-            'latitude': 38.2499, 'longitude': 140.3548,
-        },
-        {
-            'name': 'Drops（ドロップス）',
-            'address': '山形県山形市七日町2-4-1 1F',
-            'nearest_station': '山形駅',
-            'genres': 'レディース,アメリカ古着',
-            'hours': '12:00-19:00',
-            'holiday': '火曜・水曜',
-            'homepage_url': '',
-            'sns_url': '',
-            'description': 'レンガビルが目印の七日町のレディース専門古着屋。アメリカ・カナダの古着とアクセサリーを取り扱う。',
-            'price_range': '不明',
-            'payment_methods': '現金',
-            'parking': '',
-            'latitude': 38.2494, 'longitude': 140.3542,
-        },
-        {
-            'name': 'JAMMING（ジャミング）',
-            'address': '山形県山形市本町1-7-20',
-            'nearest_station': '山形駅',
-            'genres': 'ヴィンテージ,US古着,アクセサリー',
-            'hours': '11:30-19:00',
-            'holiday': '不定休',
-            'homepage_url': 'http://www.jamming-ymgt.com/',
-            'sns_url': '',
-            'description': 'ヴィンテージから新品まで扱う山形の古着屋。Ralph Lauren・J CREW・Levi\'sなどUSブランドや家具・アクセサリーも取り扱う。',
-            'price_range': '不明',
-            'payment_methods': '現金',
-            'parking': '',
-            'latitude': 38.2497, 'longitude': 140.3551,
-        },
-        {
-            'name': 'one day store yamagata',
-            'address': '山形県山形市七日町3-2-27',
-            'nearest_station': '山形駅',
-            'genres': 'US古着,80年代,90年代',
-            'hours': '12:00-20:00',
-            'holiday': '水曜',
-            'homepage_url': 'https://onedaystore.official.ec/',
-            'sns_url': 'https://www.instagram.com/one_day_store_yamagata/',
-            'description': '新潟発の人気古着ショップの山形店。アメリカ直買い付けの80〜90年代ヴィンテージが中心。北米未発売のブランドアイテムも揃う。',
-            'price_range': '不明',
-            'payment_methods': '現金',
-            'parking': '',
-            'latitude': 38.2489, 'longitude': 140.3535,
-        },
-        {
-            'name': 'ドンドンダウンオンウェンズデイ 山形バイパス店',
-            'address': '山形県山形市上山家町字下宿760-1',
-            'nearest_station': '山形駅',
-            'genres': 'ヴィンテージ,ストリート,ハイブランド',
-            'hours': '11:00-20:00',
-            'holiday': '月曜',
-            'homepage_url': '',
-            'sns_url': '',
-            'description': '山形バイパス沿いの大型古着店。ヴィンテージ・ストリート系からハイブランドまで幅広く取り扱う。価格は水曜日に全品値下げ。',
-            'price_range': '¥5000~',
-            'payment_methods': '現金・クレジット',
-            'parking': 'あり',
-            'latitude': 38.2558, 'longitude': 140.3821,
-        },
-        {
-            'name': 'セカンドストリート 山形南館店',
-            'address': '山形県山形市南館5丁目4-23',
-            'nearest_station': '山形駅',
-            'genres': 'ブランド,古着全般',
-            'hours': '10:00-21:00',
-            'holiday': 'なし',
-            'homepage_url': '',
-            'sns_url': '',
-            'description': '山形市南部の大型セカンドストリート。駐車場133台完備。メンズ・レディース・キッズの古着・ブランド品を幅広く取り扱う。',
-            'price_range': '¥1000~',
-            'payment_methods': 'クレジットカード・スマホバーコード決済・現金',
-            'parking': 'あり（133台）',
-            'latitude': 38.2148, 'longitude': 140.3548,
-        },
-        {
-            'name': 'お宝中古市場 山形南店',
-            'address': '山形県山形市南館4-1-1',
-            'nearest_station': '山形駅',
-            'genres': '格安古着,リサイクル全般',
-            'hours': '9:00-深夜2:00',
-            'holiday': 'なし',
-            'homepage_url': '',
-            'sns_url': '',
-            'description': '深夜まで営業する大型リサイクルショップ。格安古着から家電・家具まで幅広く取り扱う。',
-            'price_range': '¥500~',
-            'payment_methods': '現金・クレジット',
-            'parking': 'あり',
-            'latitude': 38.2155, 'longitude': 140.3536,
-        },
-        # ── 天童市 ────────────────────────────────────────────
-        {
-            'name': 'セカンドストリート 天童店',
-            'address': '山形県天童市桜町11-30',
-            'nearest_station': '天童駅',
-            'genres': 'ブランド,古着全般',
-            'hours': '10:00-21:00',
-            'holiday': 'なし',
-            'homepage_url': '',
-            'sns_url': '',
-            'description': '天童市の大型セカンドストリート。駐車場62台完備。古着・ブランド品・家電・家具を幅広く扱うリユースショップ。',
-            'price_range': '¥1000~',
-            'payment_methods': 'クレジットカード・スマホバーコード決済・現金',
-            'parking': 'あり（62台）',
-            'latitude': 38.3564, 'longitude': 140.3832,
-        },
-        {
-            'name': '古着倉庫 イオンモール天童店',
-            'address': '山形県天童市芳賀タウン北4丁目1-1 イオンモール天童2F',
-            'nearest_station': '天童駅',
-            'genres': 'USA古着,レギュラー古着,雑貨',
-            'hours': '10:00-21:00',
-            'holiday': 'なし',
-            'homepage_url': '',
-            'sns_url': 'https://www.instagram.com/furugisouko_aeon_tendo_2023/',
-            'description': 'イオンモール天童2Fに入る大型古着店。常時30000アイテム以上の品揃えでUSA古着を中心に新品・雑貨も取り扱う。',
-            'price_range': '¥1000~',
-            'payment_methods': '現金・クレジット',
-            'parking': 'あり（商業施設共用）',
-            'latitude': 38.3516, 'longitude': 140.3728,
-        },
-        # ── 米沢市 ────────────────────────────────────────────
-        {
-            'name': '古着倉庫 米沢店',
-            'address': '山形県米沢市中田町514-1',
-            'nearest_station': '米沢駅',
-            'genres': 'USA古着,レギュラー古着',
-            'hours': '平日12:00-19:30 / 土日祝11:00-19:00',
-            'holiday': '不定休',
-            'homepage_url': 'https://souko2017.thebase.in/',
-            'sns_url': 'https://www.instagram.com/furugisouko2017/',
-            'description': '置賜エリア最大級の古着屋。USA古着を中心にレギュラー古着も豊富に揃える。Instagramフォロワー1万超えの人気店。',
-            'price_range': '¥1000~',
-            'payment_methods': '現金',
-            'parking': 'あり',
-            'latitude': 37.9272, 'longitude': 140.1232,
-        },
-        # ── 酒田市 ────────────────────────────────────────────
-        {
-            'name': "Janky's（ジャンキーズ）",
-            'address': '山形県酒田市御成町12-10',
-            'nearest_station': '酒田駅',
-            'genres': 'US古着,ヴィンテージ,ヨーロッパ古着',
-            'hours': '12:00-20:00',
-            'holiday': '火曜',
-            'homepage_url': '',
-            'sns_url': '',
-            'description': '酒田駅から徒歩8分の穴場古着店。アメリカ・ヨーロッパの古着を直輸入。ヴィンテージからレギュラーまで豊富な品揃え。',
-            'price_range': '不明',
-            'payment_methods': '現金',
-            'parking': 'なし',
-            'latitude': 38.9164, 'longitude': 139.8493,
-        },
-        {
-            'name': 'オフハウス 酒田店',
-            'address': '山形県酒田市ゆたか2-1-10',
-            'nearest_station': '酒田駅',
-            'genres': '古着全般,ブランド',
-            'hours': '10:00-19:00',
-            'holiday': 'なし',
-            'homepage_url': '',
-            'sns_url': '',
-            'description': 'ハードオフグループの衣類専門リユースショップ。ノンブランドからハイブランド・ヴィンテージまで幅広い衣料品を取り扱う。',
-            'price_range': '¥1000~',
-            'payment_methods': '現金・クレジット',
-            'parking': 'あり',
-            'latitude': 38.9188, 'longitude': 139.8437,
-        },
-    ]
-
-    added = 0
-    for d in yamagata_shops:
-        if Shop.query.filter_by(name=d['name']).first():
+
+def process_geocode_jobs(batch=10):
+    """期限の来たジョブを最大 batch 件処理する。処理した件数を返す"""
+    _release_stale_geocode_jobs()
+    job_ids = [job_id for (job_id,) in db.session.query(GeocodeJob.id).filter(
+        GeocodeJob.status == 'pending', GeocodeJob.next_attempt_at <= datetime.now(),
+    ).order_by(GeocodeJob.id).limit(batch)]
+    processed = 0
+    for job_id in job_ids:
+        if not _claim_geocode_job(job_id):
             continue
-        db.session.add(Shop(
-            name=d['name'],
-            address=d.get('address', ''),
-            nearest_station=d.get('nearest_station', ''),
-            genres=d.get('genres', ''),
-            hours=d.get('hours', ''),
-            holiday=d.get('holiday', 'なし'),
-            homepage_url=d.get('homepage_url', ''),
-            sns_url=d.get('sns_url', ''),
-            description=d.get('description', ''),
-            price_range=d.get('price_range', '不明'),
-            payment_methods=d.get('payment_methods', '不明'),
-            parking=d.get('parking', ''),
-            latitude=d['latitude'],
-            longitude=d['longitude'],
-            rating=0.0,
-            review_count=0,
-            place_id='',
-            plus_code='',
-        ))
-        added += 1
+        try:
+            _process_geocode_job(db.session.get(GeocodeJob, job_id))
+        except Exception as e:
+            # DBエラーなど想定外の失敗。running のまま残さず、時間をおいて再試行させる
+            db.session.rollback()
+            app.logger.exception('ジオコーディングのジョブ %s が失敗しました', job_id)
+            job = db.session.get(GeocodeJob, job_id)
+            job.attempts = (job.attempts or 0) + 1
+            job.last_error = f'{type(e).__name__}: {e}'[:200]
+            if job.attempts >= GEOCODE_MAX_ATTEMPTS:
+                job.status = 'failed'
+                Shop.query.filter_by(id=job.shop_id).update({'geocode_status': 'failed'})
+            else:
+                job.status = 'pending'
+                job.next_attempt_at = datetime.now() + timedelta(minutes=2 ** job.attempts)
+            db.session.commit()
+        processed += 1
+    return processed
+
+def run_geocode_worker(once=False):
+    """ジョブを処理し続ける。DBに繋がらない等で1回分が失敗しても、待ってから続ける"""
+    while True:
+        try:
+            processed = process_geocode_jobs()
+        except Exception:
+            db.session.rollback()
+            app.logger.exception('ジオコーディングのジョブを処理できませんでした')
+            processed = 0
+        if once and not processed:
+            break
+        if not processed:
+            time.sleep(GEOCODE_POLL_SECONDS)
+
+def start_geocode_thread():
+    """GEOCODE_WORKER_THREAD=1 のとき、このプロセス内でジョブを処理するスレッドを起動する
+    （gunicorn はワーカーごと: gunicorn.conf.py の post_fork）。ジョブの取り合いは _claim_geocode_job が防ぐ"""
+    if not GEOCODE_WORKER_THREAD:
+        return None
+
+    def run():
+        with app.app_context():
+            run_geocode_worker()
+
+    thread = threading.Thread(target=run, name='geocode-worker', daemon=True)
+    thread.start()
+    return thread
+
+@app.cli.command('geocode-worker')
+@click.option('--once', is_flag=True, help='待ちジョブを処理したら終了する')
+def geocode_worker_command(once):
+    """住所→座標のジョブを処理し続ける（Procfile / Railway の worker サービス）"""
+    run_geocode_worker(once=once)
+
+def migrate_db():
+    """テーブル作成と、既存DBへのスキーマ移行（migrations.py）。適用した移行のバージョンを返す"""
+    db.create_all()
+    return run_migrations(db.engine)
+
+def rebuild_rating_aggregates():
+    """口コミ全件から各店舗の rating_sum・review_count・rating を再計算する"""
+    total = db.select(db.func.coalesce(db.func.sum(Review.rating), 0.0)).where(
+        Review.shop_id == Shop.id).scalar_subquery()
+    count = db.select(db.func.count(Review.id)).where(Review.shop_id == Shop.id).scalar_subquery()
+    db.session.execute(db.update(Shop).values(
+        rating_sum=total,
+        review_count=count,
+        rating=db.case((count > 0, db.func.round(db.cast(total / count, db.Numeric), 1)), else_=0.0),
+        revision=next_revision(db.session),
+    ).execution_options(synchronize_session=False))
     db.session.commit()
-    print(f"✅ 山形県の古着屋 {added} 件を追加しました（スキップ: {len(yamagata_shops) - added} 件）")
-
-
-def seed_miyagi_shops():
-    """宮城県の古着屋データを追加（各店舗ごとに重複チェック）"""
-    miyagi_shops = [
-        # ── 仙台市 青葉区 中央エリア ────────────────────────────
-        {
-            'name': '古着屋JAM 仙台店',
-            'address': '宮城県仙台市青葉区中央3丁目6-10 フージャース仙台駅前ビル1F',
-            'nearest_station': '仙台駅',
-            'genres': 'アメカジ,インポート古着,ヴィンテージ',
-            'hours': '11:00-20:00',
-            'holiday': '不定休',
-            'homepage_url': 'https://jamtrading.jp/',
-            'sns_url': 'https://www.instagram.com/furugiya_jam_official/',
-            'description': '全国展開の海外古着専門チェーン。仙台駅から徒歩1分。ノースフェイスやパタゴニアのヴィンテージが1万円以下で揃う。自社クリーニング済みで品質が高い。',
-            'price_range': '¥2000~',
-            'payment_methods': '現金・クレジット・電子マネー',
-            'parking': '',
-            'latitude': 38.2615, 'longitude': 140.8772,
-        },
-        {
-            'name': 'Hi-smile（ハイスマイル）',
-            'address': '宮城県仙台市青葉区中央2丁目5-9 庄文堂ビル1F',
-            'nearest_station': '仙台駅',
-            'genres': 'アメカジ,デッドストック,US古着',
-            'hours': '12:00-19:00',
-            'holiday': '不定休',
-            'homepage_url': 'https://www.hi-smile.com/',
-            'sns_url': 'https://www.instagram.com/hi_smile_sendai/',
-            'description': 'アメリカ買い付けの一点物やデッドストック品が豊富。日本未販売のレアアイテムが多く、「質の良い古着」を求める上級者向けの一店。',
-            'price_range': '不明',
-            'payment_methods': '現金',
-            'parking': '',
-            'latitude': 38.2632, 'longitude': 140.8718,
-        },
-        {
-            'name': 'SHACK-A-LUCK（シャカラック）',
-            'address': '宮城県仙台市青葉区中央2丁目10-3 第二MTビル2F',
-            'nearest_station': '仙台駅',
-            'genres': 'アメリカ古着,ストリート,レギュラー古着',
-            'hours': '11:00-20:00',
-            'holiday': '不定休',
-            'homepage_url': 'https://shack.idcom.co.jp/',
-            'sns_url': 'https://www.instagram.com/shackaluck/',
-            'description': '古着初心者にも入りやすい手頃な価格のアメリカ古着屋。ネルシャツ・パーカー・スウェットなど定番アイテムが充実。90〜00年代レギュラー中心。',
-            'price_range': '¥2000~',
-            'payment_methods': '現金',
-            'parking': '',
-            'latitude': 38.2628, 'longitude': 140.8692,
-        },
-        {
-            'name': 'DUROC（デュロック）',
-            'address': '宮城県仙台市青葉区中央2丁目10-3 第二MTビル地下1F',
-            'nearest_station': '仙台駅',
-            'genres': 'アメリカ古着,レディース,ユニセックス',
-            'hours': '11:00-20:00',
-            'holiday': '不定休',
-            'homepage_url': '',
-            'sns_url': 'https://www.instagram.com/duroc_sendai/',
-            'description': 'SHACKALUCKの系列店。メンズ・レディース・ユニセックスのレギュラー古着を中心に展開。同ビル地下に位置するディープな一角。',
-            'price_range': '¥2000~',
-            'payment_methods': '現金',
-            'parking': '',
-            'latitude': 38.2628, 'longitude': 140.8692,
-        },
-        {
-            'name': 'XXNT（メメント）',
-            'address': '宮城県仙台市青葉区中央2丁目1-15 仙台マンション209',
-            'nearest_station': '仙台駅',
-            'genres': 'トラッド,モード,アーカイブ古着',
-            'hours': '平日14:00-20:00 / 休日12:00-20:00',
-            'holiday': '不定休',
-            'homepage_url': 'https://xxnt.official.ec/',
-            'sns_url': 'https://www.instagram.com/xxnt.sendai/',
-            'description': 'トラッドやモードを再解釈した古着セレクト。ストーンアイランドやステューシーのアーカイブを扱う仙台屈指のモード系古着屋。東京三軒茶屋にも系列店あり。',
-            'price_range': '不明',
-            'payment_methods': '現金',
-            'parking': '',
-            'latitude': 38.2641, 'longitude': 140.8769,
-        },
-        {
-            'name': 'bad ame（アム）',
-            'address': '宮城県仙台市青葉区中央2丁目1-15 仙台マンション208',
-            'nearest_station': '仙台駅',
-            'genres': 'ゴシック,グランジ,パンク古着',
-            'hours': '平日14:00-19:00 / 休日12:00-19:00',
-            'holiday': '不定休',
-            'homepage_url': '',
-            'sns_url': 'https://www.instagram.com/bad_ame_/',
-            'description': 'XXNTメメントの系列店。グランジ・フェアリーグランジ・パンクなど独自スタイルの古着専門。2024年10月に原宿店もオープン。',
-            'price_range': '不明',
-            'payment_methods': '現金',
-            'parking': '',
-            'latitude': 38.2641, 'longitude': 140.8769,
-        },
-        {
-            'name': 'the loom 仙台',
-            'address': '宮城県仙台市青葉区中央2丁目1-15 仙台マンション103',
-            'nearest_station': '仙台駅',
-            'genres': 'レギュラー古着,アメリカ古着',
-            'hours': '11:00-20:00',
-            'holiday': '不定休',
-            'homepage_url': '',
-            'sns_url': 'https://www.instagram.com/the.loom_sendai/',
-            'description': '手頃な価格帯のレギュラー古着を中心に扱う仙台マンション内の古着屋。気軽に入れる雰囲気が特徴。',
-            'price_range': '¥1000~',
-            'payment_methods': '現金',
-            'parking': '',
-            'latitude': 38.2641, 'longitude': 140.8769,
-        },
-        {
-            'name': 'VINTAGE SELECT CLOTHING CLIMB',
-            'address': '宮城県仙台市青葉区中央2丁目6-14 光翠ビル4F',
-            'nearest_station': '仙台駅',
-            'genres': 'ストリート,アーカイブ,ヴィンテージ',
-            'hours': '平日14:00-19:00 / 休日12:00-19:00',
-            'holiday': '不定休',
-            'homepage_url': 'https://climb.fashionstore.jp/',
-            'sns_url': 'https://www.instagram.com/climb.sendai/',
-            'description': '90年代裏原ブームのアイテムやクリスチャンディオールなどのアーカイブを展開。入手困難なレアアイテムが豊富なマニア向けセレクトショップ。',
-            'price_range': '不明',
-            'payment_methods': '現金',
-            'parking': '',
-            'latitude': 38.2630, 'longitude': 140.8713,
-        },
-        {
-            'name': '西海岸ANCHOR 仙台店',
-            'address': '宮城県仙台市青葉区中央2丁目4-5 アルボーレ仙台1F',
-            'nearest_station': '仙台駅',
-            'genres': 'ストリート,スポーツヴィンテージ,アメカジ',
-            'hours': '11:00-20:00',
-            'holiday': '不定休',
-            'homepage_url': 'https://nisikaigan.com/',
-            'sns_url': 'https://www.instagram.com/anchorsendai/',
-            'description': '福岡発の西海岸ANCHOR仙台店。ストリートやスポーツブランドのヴィンテージが充実。カラフルで華やかなアイテムが特徴。',
-            'price_range': '¥3000~',
-            'payment_methods': '現金・クレジット',
-            'parking': '',
-            'latitude': 38.2635, 'longitude': 140.8726,
-        },
-        {
-            'name': "TOM'S MARKET vintage",
-            'address': '宮城県仙台市青葉区中央3丁目8-5 アメ横ビル2F',
-            'nearest_station': '仙台駅',
-            'genres': 'アメカジ,ミリタリー,ワーク古着',
-            'hours': '11:00-18:00',
-            'holiday': '火曜・水曜',
-            'homepage_url': '',
-            'sns_url': 'https://www.instagram.com/toms_market_vintage/',
-            'description': '仙台アメ横ビル2Fの老舗古着屋。2022年に再オープン。アメカジ・ミリタリー・ワーク系を中心に、状態の良いヴィンテージをリペア済みで展開。',
-            'price_range': '不明',
-            'payment_methods': '現金',
-            'parking': '',
-            'latitude': 38.2622, 'longitude': 140.8758,
-        },
-        {
-            'name': 'BIG TIME 仙台',
-            'address': '宮城県仙台市青葉区中央2丁目5-10 1F・2F',
-            'nearest_station': '仙台駅',
-            'genres': 'スポーツ,アメカジ,ヴィンテージ',
-            'hours': '11:00-21:00',
-            'holiday': '不定休',
-            'homepage_url': 'https://www.bigtime.jp/',
-            'sns_url': 'https://www.instagram.com/big_time_sendai/',
-            'description': '仙台最大級のヴィンテージショップ。クリスロード商店街内。スポーツ・ジャージ・アメカジ系が特に充実。1F・2Fの2フロア展開。',
-            'price_range': '¥2000~',
-            'payment_methods': '現金・クレジット',
-            'parking': '',
-            'latitude': 38.2632, 'longitude': 140.8720,
-        },
-        {
-            'name': 'フラミンゴ 仙台店',
-            'address': '宮城県仙台市青葉区中央2丁目7-15',
-            'nearest_station': '仙台駅',
-            'genres': 'アメリカ古着,レディース,リメイク',
-            'hours': '11:00-20:00',
-            'holiday': '不定休',
-            'homepage_url': 'https://www.flamingo-online.jp/',
-            'sns_url': 'https://www.instagram.com/flamingo_sendai/',
-            'description': '下北沢発の全国チェーン・フラミンゴの仙台店。古着に加えて雑貨・オリジナルブランド・リメイク商品を展開。レディースが特に豊富。',
-            'price_range': '¥3000~',
-            'payment_methods': '現金・クレジット・電子マネー',
-            'parking': '',
-            'latitude': 38.2628, 'longitude': 140.8714,
-        },
-        {
-            'name': 'Top of the Hill 仙台PARCO店',
-            'address': '宮城県仙台市青葉区中央1丁目2-3 仙台パルコ本館6F',
-            'nearest_station': '仙台駅',
-            'genres': 'セレクト古着,ブランド古着,アウトドアヴィンテージ',
-            'hours': '10:00-21:00',
-            'holiday': '不定休（パルコに準ずる）',
-            'homepage_url': '',
-            'sns_url': 'https://www.instagram.com/topofthehill_sendai/',
-            'description': '下北沢・高円寺にも展開する古着チェーンの仙台店。仙台駅直結のパルコ本館6F。セレクトされたブランド古着・アウトドアヴィンテージが揃う。',
-            'price_range': '¥5000~',
-            'payment_methods': '現金・クレジット・電子マネー',
-            'parking': '',
-            'latitude': 38.2614, 'longitude': 140.8800,
-        },
-        # ── 仙台市 青葉区 本町エリア ────────────────────────────
-        {
-            'name': 'Utah（ユタ）',
-            'address': '宮城県仙台市青葉区本町2丁目9-16 阿部勝ビル1F',
-            'nearest_station': '広瀬通駅',
-            'genres': 'アメリカ古着,ヨーロッパ古着,ヴィンテージ',
-            'hours': '12:00-20:00',
-            'holiday': '不定休',
-            'homepage_url': 'https://utahltdshop.thebase.in/',
-            'sns_url': 'https://www.instagram.com/utah_vintage_used_clothing/',
-            'description': '2005年創業の仙台を代表する老舗古着屋。セレクトショップのような美しい陳列が特徴。アメリカ買い付けの一点物が揃う。',
-            'price_range': '¥5000~',
-            'payment_methods': '現金',
-            'parking': '',
-            'latitude': 38.2594, 'longitude': 140.8710,
-        },
-        {
-            'name': 'IORI clothing by Utah',
-            'address': '宮城県仙台市青葉区本町2丁目9-16',
-            'nearest_station': '広瀬通駅',
-            'genres': 'レディース,オールドブランド,ヴィンテージ',
-            'hours': '12:00-20:00',
-            'holiday': '不定休',
-            'homepage_url': 'https://ioribyutah.thebase.in/',
-            'sns_url': 'https://www.instagram.com/vintage_style_by_iori/',
-            'description': 'Utahの姉妹店。レディース古着専門で木目と白を基調とした温かみある空間。グッチ・エルメス・ティファニーなどオールドブランドも取扱い。',
-            'price_range': '¥5000~',
-            'payment_methods': '現金',
-            'parking': '',
-            'latitude': 38.2594, 'longitude': 140.8710,
-        },
-        {
-            'name': 'biscco（ビスコ）',
-            'address': '宮城県仙台市青葉区本町2丁目5-16 1F',
-            'nearest_station': '広瀬通駅',
-            'genres': 'メンズ古着,レディース古着,ヴィンテージ',
-            'hours': '12:00-19:00',
-            'holiday': '不定休',
-            'homepage_url': 'https://www.biscco.jp/',
-            'sns_url': 'https://www.instagram.com/biscco288/',
-            'description': '元・仙台駅東口の「DROP」が本町へ移転。夫婦で営まれるアットホームな古着屋。厳選古着とトレンドをミックスした品揃え。',
-            'price_range': '不明',
-            'payment_methods': '現金',
-            'parking': '',
-            'latitude': 38.2598, 'longitude': 140.8720,
-        },
-        {
-            'name': 'SQUAT 仙台店',
-            'address': '宮城県仙台市青葉区本町2丁目13-10 菊田屋ビル2F',
-            'nearest_station': '広瀬通駅',
-            'genres': 'ヨーロッパヴィンテージ,ミリタリー',
-            'hours': '11:00-20:00',
-            'holiday': '不定休',
-            'homepage_url': 'https://squat.shop-pro.jp/',
-            'sns_url': 'https://www.instagram.com/squat_used_clothing/',
-            'description': 'オーナー自らヨーロッパへ買い付けに行く仙台のヴィンテージ専門店。50〜60年代のレアなヨーロピアンヴィンテージが豊富。山形にも姉妹店あり。',
-            'price_range': '不明',
-            'payment_methods': '現金',
-            'parking': '',
-            'latitude': 38.2588, 'longitude': 140.8701,
-        },
-        {
-            'name': 'elie（エリー）',
-            'address': '宮城県仙台市青葉区本町2丁目13-10 菊田屋ビル3F',
-            'nearest_station': '広瀬通駅',
-            'genres': 'レディース,リメイク古着,ヨーロッパ古着',
-            'hours': '平日12:00-19:30 / 休日11:00-19:00',
-            'holiday': '不定休',
-            'homepage_url': 'https://ranadel.theshop.jp/',
-            'sns_url': 'https://www.instagram.com/elie.sendai/',
-            'description': 'アメリカ・ヨーロッパヴィンテージをリボンやフリルで可愛くリメイクした女性向けセレクト古着屋。シルエットやデザインにこだわる一店。',
-            'price_range': '不明',
-            'payment_methods': '現金',
-            'parking': '',
-            'latitude': 38.2588, 'longitude': 140.8701,
-        },
-        {
-            'name': 'me 古着屋',
-            'address': '宮城県仙台市青葉区本町2丁目9-8 日宝本町ビル103',
-            'nearest_station': '広瀬通駅',
-            'genres': 'ユーロヴィンテージ,アメリカ古着',
-            'hours': '12:00-19:30',
-            'holiday': '不定休',
-            'homepage_url': 'https://mesendai.thebase.in/',
-            'sns_url': 'https://www.instagram.com/me_sendai/',
-            'description': '2017年オープン。ユーロヴィンテージとアメリカ古着を中心に、トレンドを意識した飽きのこない定番ヴィンテージを展開。',
-            'price_range': '不明',
-            'payment_methods': '現金',
-            'parking': '',
-            'latitude': 38.2594, 'longitude': 140.8708,
-        },
-        {
-            'name': 'ooooo（オーズ）',
-            'address': '宮城県仙台市青葉区本町2丁目14-26 保坂ビル1F',
-            'nearest_station': '広瀬通駅',
-            'genres': 'アメリカ古着,ヴィンテージ,ユニセックス',
-            'hours': '月〜土12:00-22:00 / 日12:00-20:00',
-            'holiday': '不定休',
-            'homepage_url': '',
-            'sns_url': 'https://www.instagram.com/ooooo_sendai/',
-            'description': '2ヶ月に1度アメリカ買い付けのユニセックスヴィンテージ古着屋。月〜土は22時まで営業する仙台では珍しい深夜型古着屋。',
-            'price_range': '不明',
-            'payment_methods': '現金',
-            'parking': '',
-            'latitude': 38.2585, 'longitude': 140.8699,
-        },
-        # ── 仙台市 青葉区 一番町エリア ────────────────────────────
-        {
-            'name': 'TRUE VINTAGE.',
-            'address': '宮城県仙台市青葉区一番町1丁目6-20 ライトハウスビル102',
-            'nearest_station': '広瀬通駅',
-            'genres': 'アメリカ古着,ヴィンテージ,デニム',
-            'hours': '11:00-20:00',
-            'holiday': '不定休',
-            'homepage_url': 'https://truevintage.jp/',
-            'sns_url': 'https://www.instagram.com/truevintage_sendai/',
-            'description': '2009年創業、2019年リニューアル。仙台トップクラスのヴィンテージ専門店。状態の良いリーバイスや革ジャンが多数。芸能人来店実績あり。',
-            'price_range': '¥5000~',
-            'payment_methods': '現金・クレジット',
-            'parking': '',
-            'latitude': 38.2661, 'longitude': 140.8710,
-        },
-        {
-            'name': 'HOWDY（ハウディ）',
-            'address': '宮城県仙台市青葉区一番町1丁目12-3',
-            'nearest_station': '広瀬通駅',
-            'genres': 'アメリカ古着,アウトドアヴィンテージ,雑貨',
-            'hours': '平日12:00-20:00 / 休日11:00-19:00',
-            'holiday': '不定休',
-            'homepage_url': '',
-            'sns_url': 'https://www.instagram.com/howdy_88/',
-            'description': '1991年創業の仙台最古参古着屋。毎月オレゴン州ポートランドへ買い付け。アウトドア系に強く雑貨も豊富。1階にお直し工房も併設。',
-            'price_range': '¥3000~',
-            'payment_methods': '現金',
-            'parking': '',
-            'latitude': 38.2651, 'longitude': 140.8704,
-        },
-        {
-            'name': 'MISSION GENERAL STORE',
-            'address': '宮城県仙台市青葉区一番町1丁目11-23 2F',
-            'nearest_station': '広瀬通駅',
-            'genres': 'アウトドアヴィンテージ,アメリカ古着,70年代',
-            'hours': '11:00-20:00',
-            'holiday': '不定休',
-            'homepage_url': 'https://mission-gs.shop-pro.jp/',
-            'sns_url': 'https://www.instagram.com/mission_general_store_/',
-            'description': '2024年10月リニューアルオープン。1970〜90年代のアメリカ・ヨーロッパヴィンテージとパタゴニア・ノースフェイスなどアウトドアブランド専門。',
-            'price_range': '¥5000~',
-            'payment_methods': '現金・クレジット',
-            'parking': '',
-            'latitude': 38.2652, 'longitude': 140.8705,
-        },
-        {
-            'name': '無人古着屋HOPE 一番町店',
-            'address': '宮城県仙台市青葉区一番町1丁目14-25 一番町M・Yビル101',
-            'nearest_station': '広瀬通駅',
-            'genres': 'アメリカ古着,ヨーロッパ古着,格安古着',
-            'hours': '24時間営業',
-            'holiday': 'なし',
-            'homepage_url': '',
-            'sns_url': 'https://www.instagram.com/mujinhurugiya_hope/',
-            'description': '2023年9月オープンの24時間無人古着屋。仙台一番町店のほか北仙台・八木山にも展開。安価で購入可能。時間を気にせず古着が選べる。',
-            'price_range': '¥500~',
-            'payment_methods': '電子マネー・スマホバーコード決済',
-            'parking': '',
-            'latitude': 38.2649, 'longitude': 140.8700,
-        },
-        {
-            'name': 'フロリダ 仙台店',
-            'address': '宮城県仙台市青葉区一番町3丁目8-8 一番町ステアビル1F',
-            'nearest_station': '広瀬通駅',
-            'genres': 'アメリカ古着,ヨーロッパ古着,格安古着',
-            'hours': '平日12:00-21:00 / 休日11:00-21:00',
-            'holiday': '不定休',
-            'homepage_url': 'https://www.flamingo-online.jp/',
-            'sns_url': 'https://www.instagram.com/florida_sendai/',
-            'description': 'フラミンゴの系列店。定番ヴィンテージを手頃な価格で販売。月末「青空市」では全品半額セールを実施する人気イベントあり。',
-            'price_range': '¥1000~',
-            'payment_methods': '現金・クレジット',
-            'parking': '',
-            'latitude': 38.2638, 'longitude': 140.8700,
-        },
-        {
-            'name': 'i my（アイマイ）',
-            'address': '宮城県仙台市青葉区一番町3丁目10-3 3F',
-            'nearest_station': '広瀬通駅',
-            'genres': 'レディース,レギュラー古着,80年代',
-            'hours': '不明',
-            'holiday': '不定休',
-            'homepage_url': '',
-            'sns_url': 'https://www.instagram.com/i_my_vintage/',
-            'description': '一番町3丁目3階のレディース専門古着屋。80年代レギュラー古着が豊富でメンズ兼用アイテムも揃う。',
-            'price_range': '不明',
-            'payment_methods': '現金',
-            'parking': '',
-            'latitude': 38.2635, 'longitude': 140.8699,
-        },
-        {
-            'name': 'gripp 仙台',
-            'address': '宮城県仙台市青葉区一番町2丁目3-30 壱弐参横丁3号',
-            'nearest_station': '広瀬通駅',
-            'genres': 'アメリカ古着,シルバーアクセサリー,リメイク古着',
-            'hours': '12:30-20:30',
-            'holiday': '不定休',
-            'homepage_url': 'https://gripp0219.thebase.in/',
-            'sns_url': 'https://www.instagram.com/gripp_sendai/',
-            'description': '国外買い付けのシルバーアクセサリーやリメイクレザージャケットなど、ここでしか手に入らないアイテムを展開。コーディネート提案も実施。',
-            'price_range': '不明',
-            'payment_methods': '現金',
-            'parking': '',
-            'latitude': 38.2645, 'longitude': 140.8704,
-        },
-        {
-            'name': 'CAGERATTLERS（CRC）',
-            'address': '宮城県仙台市青葉区一番町1丁目8-10 京成壱番町ビル303',
-            'nearest_station': '広瀬通駅',
-            'genres': 'レギュラー古着,ヴィンテージ,デザイナーズ',
-            'hours': '12:00-21:00',
-            'holiday': '不定休',
-            'homepage_url': 'https://cagerattlers.net/',
-            'sns_url': 'https://www.instagram.com/crc_japan/',
-            'description': '2009年オープン。国内外の古着とセレクトブランド・自社ブランドを展開。下北沢でPOP UPも行う仙台の個性派セレクトショップ。',
-            'price_range': '不明',
-            'payment_methods': '現金',
-            'parking': '',
-            'latitude': 38.2657, 'longitude': 140.8708,
-        },
-        {
-            'name': 'Green Room（グリーンルーム）仙台',
-            'address': '宮城県仙台市青葉区一番町2丁目5-6 3F',
-            'nearest_station': '広瀬通駅',
-            'genres': 'アメリカ古着,ヨーロッパ古着',
-            'hours': '11:00-20:00',
-            'holiday': '不定休',
-            'homepage_url': 'https://greenroom256.thebase.in/',
-            'sns_url': 'https://www.instagram.com/greenroom256/',
-            'description': '創業25年の老舗。アメリカ・ヨーロッパ・国内から仕入れた質の良い古着を学生にも手頃な価格で提供する穴場店舗。外階段からアクセス。',
-            'price_range': '¥2000~',
-            'payment_methods': '現金',
-            'parking': '',
-            'latitude': 38.2643, 'longitude': 140.8702,
-        },
-        {
-            'name': 'sega-ru（セガル）',
-            'address': '宮城県仙台市青葉区一番町3丁目1-24 3F',
-            'nearest_station': '広瀬通駅',
-            'genres': 'アメリカ古着,メンズ,ヴィンテージ',
-            'hours': '12:00-20:00',
-            'holiday': '不定休',
-            'homepage_url': 'https://segaaru.base.ec/',
-            'sns_url': 'https://www.instagram.com/segawa708/',
-            'description': '2015年オープン。オーナーがアメリカ・国内買い付けし、プロによるクリーニング済み。古着に見えないほどクオリティの高い品揃え。',
-            'price_range': '不明',
-            'payment_methods': '現金',
-            'parking': '',
-            'latitude': 38.2635, 'longitude': 140.8703,
-        },
-        # ── 仙台市 青葉区 国分町・大町・立町エリア ────────────────────────────
-        {
-            'name': 'ShuShuBell（シュシュベル）仙台',
-            'address': '宮城県仙台市青葉区国分町1丁目3-13 遠藤ビル1F',
-            'nearest_station': '広瀬通駅',
-            'genres': 'アメリカ古着,ヨーロッパ古着,ヴィンテージ',
-            'hours': '平日・土12:00-20:00 / 日祝11:00-19:00',
-            'holiday': '不定休',
-            'homepage_url': 'https://www.shushubell.shop/',
-            'sns_url': 'https://www.instagram.com/shushubell/',
-            'description': '2008年創業。フランスのアパルトマンをイメージした落ち着いた店内。厳選古着が1万円で購入可能。古着詰め放題イベントが人気。',
-            'price_range': '¥5000~',
-            'payment_methods': '現金・クレジット',
-            'parking': '',
-            'latitude': 38.2661, 'longitude': 140.8696,
-        },
-        {
-            'name': 'ShuShuBell 2（シュシュベル 2）',
-            'address': '宮城県仙台市青葉区大町1丁目4-14 LAND B302',
-            'nearest_station': '広瀬通駅',
-            'genres': 'メンズ,ヴィンテージ,ミリタリー,レアアイテム',
-            'hours': '平日・土12:00-20:00 / 日祝11:00-19:00',
-            'holiday': '不定休',
-            'homepage_url': 'https://www.shushubell.shop/',
-            'sns_url': 'https://www.instagram.com/shushubell_2/',
-            'description': 'シュシュベルのセレクトメンズ専門店。ヴィンテージリーバイス・エディバウアー・70〜80年代ミリタリーウェアなどレアアイテムが充実。',
-            'price_range': '¥5000~',
-            'payment_methods': '現金・クレジット',
-            'parking': '',
-            'latitude': 38.2645, 'longitude': 140.8690,
-        },
-        {
-            'name': 'Room-9',
-            'address': '宮城県仙台市青葉区大町1丁目3-25 4F',
-            'nearest_station': '広瀬通駅',
-            'genres': 'アメリカ古着,ヴィンテージ',
-            'hours': '平日12:00-18:00',
-            'holiday': '土日・不定休',
-            'homepage_url': 'https://www.room-9sendai.com/',
-            'sns_url': 'https://www.instagram.com/room____9/',
-            'description': '「ちょうど良いヴィンテージ」をコンセプトに手頃な価格でヴィンテージ古着を提供。ゆったりとした雰囲気で選べる穴場の大町古着屋。',
-            'price_range': '¥3000~',
-            'payment_methods': '現金',
-            'parking': '',
-            'latitude': 38.2646, 'longitude': 140.8691,
-        },
-        {
-            'name': 'ANNA（アンナ）',
-            'address': '宮城県仙台市青葉区大町2丁目14-11 ファーストステージ2F',
-            'nearest_station': '広瀬通駅',
-            'genres': 'ヨーロッパ古着,レディース,アンティーク,キッズ',
-            'hours': '12:00-18:00',
-            'holiday': '不定休',
-            'homepage_url': 'https://annavintage.stores.jp/',
-            'sns_url': 'https://www.instagram.com/anna_antiek/',
-            'description': '女優アンナ・カリーナに由来する店名のヨーロッパ古着店。アンティーク食器・フレンチリメイクアイテム・キッズアイテムも展開するユニークな一店。',
-            'price_range': '不明',
-            'payment_methods': '現金',
-            'parking': '',
-            'latitude': 38.2630, 'longitude': 140.8682,
-        },
-        {
-            'name': 'BEAGLE USED & VINTAGE',
-            'address': '宮城県仙台市青葉区立町21-1',
-            'nearest_station': '広瀬通駅',
-            'genres': 'レギュラー古着,ヴィンテージ,雑貨',
-            'hours': '平日13:00-19:00 / 休日12:00-19:00',
-            'holiday': '不定休',
-            'homepage_url': 'https://beaglesendai.thebase.in/',
-            'sns_url': 'https://www.instagram.com/beagle_sendai/',
-            'description': '西公園近くの穴場古着屋。アメリカ買い付けの質の良い古着を展開。1万円以下が多くコンディション良好。',
-            'price_range': '¥3000~',
-            'payment_methods': '現金',
-            'parking': '',
-            'latitude': 38.2628, 'longitude': 140.8668,
-        },
-        # ── 仙台市 若林区 ────────────────────────────────────
-        {
-            'name': 'ブランド古着専門店LIFE 仙台中倉店',
-            'address': '宮城県仙台市若林区中倉3丁目17-57',
-            'nearest_station': '仙台駅',
-            'genres': 'ブランド古着,ヴィンテージ,ハイブランド',
-            'hours': '11:00-19:00',
-            'holiday': 'なし',
-            'homepage_url': 'https://lifeonline.jp/',
-            'sns_url': 'https://www.instagram.com/life_shop_official_/',
-            'description': '140坪の大型店。国道4号バイパス沿いで駐車場20台完備。パタゴニア・ラルフローレン・リーバイスからシャネル・エルメスまでブランド古着が豊富。宅配買取も実施。',
-            'price_range': '¥5000~',
-            'payment_methods': '現金・クレジット・電子マネー',
-            'parking': 'あり（20台）',
-            'latitude': 38.2448, 'longitude': 140.9008,
-        },
-        {
-            'name': 'ブランド古着専門店LIFE 六丁の目店',
-            'address': '宮城県仙台市若林区六丁の目東町6-25',
-            'nearest_station': '六丁の目駅',
-            'genres': 'スニーカー,ストリートブランド,ブランド古着',
-            'hours': '11:00-19:00',
-            'holiday': 'なし',
-            'homepage_url': 'https://lifeonline.jp/',
-            'sns_url': 'https://www.instagram.com/life_shop_official2/',
-            'description': '130坪の大型店。ドンキホーテ六丁の目店敷地内。ステューシー・チャンピオン・コンバース・ノースフェイス・ゴローズなどオールドアイテムに特化。',
-            'price_range': '¥5000~',
-            'payment_methods': '現金・クレジット・電子マネー',
-            'parking': 'あり',
-            'latitude': 38.2454, 'longitude': 140.9138,
-        },
-        # ── 石巻市 ────────────────────────────────────────────
-        {
-            'name': '古着屋BLUE VACATION',
-            'address': '宮城県石巻市開北1丁目1-12 ハイツE',
-            'nearest_station': '石巻駅',
-            'genres': 'US古着,EURO古着,リメイク古着',
-            'hours': '11:00-20:00',
-            'holiday': '水曜',
-            'homepage_url': 'https://bluevacation.theshop.jp/',
-            'sns_url': 'https://www.instagram.com/blue_vacation.ishinomaki/',
-            'description': '石巻市の古着シーンを牽引する地元密着型ヴィンテージショップ。US古着・EURO古着・リメイク古着・オリジナルアイテムを展開。石巻駅から952m。',
-            'price_range': '不明',
-            'payment_methods': '現金',
-            'parking': 'あり',
-            'latitude': 38.4263, 'longitude': 141.3002,
-        },
-    ]
-
-    added = 0
-    for d in miyagi_shops:
-        if Shop.query.filter_by(name=d['name']).first():
+
+# ==========================================
+#  初期データ投入（seeds/*.json → 一括INSERT）
+# ==========================================
+
+SEED_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'seeds')
+SEED_PREFECTURES = [  # (seeds/ のファイル名, 県名)。この順に投入する
+    ('aomori', '青森県'),
+    ('akita', '秋田県'),
+    ('iwate', '岩手県'),
+    ('yamagata', '山形県'),
+    ('miyagi', '宮城県'),
+]
+
+def shop_row(d):
+    """初期データ1件を shop テーブルの行（列名→値）にする"""
+    return {
+        'name': d['name'],
+        'address': d.get('address', ''),
+        'nearest_station': d.get('nearest_station', ''),
+        'genres': d.get('genres', ''),
+        'hours': d.get('hours', ''),
+        'holiday': d.get('holiday', 'なし'),
+        'homepage_url': d.get('homepage_url', ''),
+        'sns_url': d.get('sns_url', ''),
+        'description': d.get('description', ''),
+        'price_range': d.get('price_range', '不明'),
+        'payment_methods': d.get('payment_methods', '不明'),
+        'parking': d.get('parking', ''),
+        'latitude': d['latitude'],
+        'longitude': d['longitude'],
+        'rating': 0.0,
+        'review_count': 0,
+        'place_id': '',
+        'plus_code': '',
+    }
+
+def dialect_insert(model):
+    """ON CONFLICT を書けるDBならその方言のINSERT、それ以外は通常のINSERT"""
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+        return insert(model)
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+        return insert(model)
+    return db.insert(model)
+
+def insert_ignoring_conflicts(model):
+    """一意制約に当たった行は飛ばすINSERT（PostgreSQL: ON CONFLICT DO NOTHING / SQLite: 同等構文）"""
+    insert = dialect_insert(model)
+    if hasattr(insert, 'on_conflict_do_nothing'):
+        return insert.on_conflict_do_nothing()
+    return insert
+
+def bulk_insert_shops(rows, revision=None):
+    """店名+住所が既存・重複の行を1回の検索で除き、残りをまとめてINSERTする。追加件数を返す。
+    ORMイベントを通らないので search_text と revision はここで埋める
+    """
+    if not rows:
+        return 0
+    existing = set(db.session.query(Shop.name, Shop.address).filter(
+        Shop.name.in_({r['name'] for r in rows})))
+    new_rows = []
+    for r in rows:
+        key = (r['name'], r['address'])
+        if key in existing:
+            continue
+        existing.add(key)
+        new_rows.append(r)
+    if not new_rows:
+        return 0
+    rev = revision or next_revision(db.session, geometry=True)
+    for r in new_rows:
+        r.update(search_columns(
+            r['name'], r['address'], r.get('nearest_station'), r.get('genres'), r.get('description')))
+        r['revision'] = rev
+    db.session.execute(insert_ignoring_conflicts(Shop), new_rows)
+    return len(new_rows)
+
+# ==========================================
+#  CSV取り込み（チャンク単位のアップサート）
+# ==========================================
+
+SHOPS_CSV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lib', 'shops.csv')
+IMPORT_CHUNK_SIZE = 500
+CSV_UPDATE_COLUMNS = (
+    'name', 'address', 'nearest_station', 'place_id', 'plus_code', 'genres', 'hours', 'holiday',
+    'homepage_url', 'sns_url', 'description', 'price_range', 'payment_methods', 'parking',
+    'latitude', 'longitude',
+)
+
+def csv_shop_row(row):
+    """shops.csv の1行を shop テーブルの行にする。店名がなければNone"""
+    def col(key, default=''):
+        return (row.get(key) or default).strip()
+    name = col('name')
+    if not name:
+        return None
+    try:
+        lat = float(row.get('latitude') or 0)
+        lng = float(row.get('longitude') or 0)
+    except (ValueError, TypeError):
+        lat, lng = 0.0, 0.0
+    return {
+        'name': name,
+        'address': col('address'),
+        'nearest_station': col('nearest_station'),
+        'place_id': col('place_id'),
+        'plus_code': col('plus_code'),
+        'genres': col('genres').strip('"'),
+        'hours': col('hours'),
+        'holiday': col('holiday') or 'なし',
+        'homepage_url': col('homepage_url'),
+        'sns_url': col('sns_url'),
+        'description': col('description'),
+        'price_range': col('price_range') or '不明',
+        'payment_methods': col('payment_methods'),
+        'parking': col('parking'),
+        'latitude': lat,
+        'longitude': lng,
+        'rating': 0.0,
+        'review_count': 0,
+    }
+
+def _read_chunks(path, size):
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        chunk = []
+        for row in csv.DictReader(f):
+            chunk.append(row)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+def _ambiguous_place_ids(path):
+    """CSV内で別々の店（店名+住所が違う行）に付いている place_id。照合のキーには使わない"""
+    first_key, ambiguous = {}, set()
+    for chunk in _read_chunks(path, IMPORT_CHUNK_SIZE):
+        for raw in chunk:
+            r = csv_shop_row(raw)
+            if r is None or not r['place_id']:
+                continue
+            key = (r['name'], r['address'])
+            if first_key.setdefault(r['place_id'], key) != key:
+                ambiguous.add(r['place_id'])
+    return ambiguous
+
+def _upsert_shop_chunk(rows, stats, kept_ids, rev, ambiguous_place_ids):
+    """既存店（店名+住所 → place_id の順で照合）は更新、それ以外はまとめてINSERTする。
+    place_id は CSV内・DB内のどちらでも1店にしか付いていないときだけ照合に使う
+    （同じ place_id の別店舗があるので、付け替えると別の店を上書きしてしまう）
+    """
+    place_ids = {r['place_id'] for r in rows if r['place_id'] and r['place_id'] not in ambiguous_place_ids}
+    names = {r['name'] for r in rows}
+    candidates = Shop.query.filter(or_(Shop.place_id.in_(place_ids), Shop.name.in_(names))).all()
+    by_key = {(s.name, s.address): s for s in candidates}
+    by_place_id = {}
+    for s in candidates:
+        if s.place_id in place_ids:
+            by_place_id.setdefault(s.place_id, []).append(s)
+
+    matches = {}  # rows の添字 → 既存店
+    for i, r in enumerate(rows):
+        shop = by_key.get((r['name'], r['address']))
+        if shop is not None:
+            matches[i] = shop
+    claimed = {shop.id for shop in matches.values()}
+    for i, r in enumerate(rows):
+        if i in matches or r['place_id'] not in place_ids:
+            continue
+        shops = by_place_id.get(r['place_id'], [])
+        if len(shops) == 1 and shops[0].id not in claimed and shops[0].id not in kept_ids:
+            matches[i] = shops[0]
+            claimed.add(shops[0].id)
+
+    inserts = []
+    for i, r in enumerate(rows):
+        shop = matches.get(i)
+        if shop is None:
+            inserts.append(r)
             continue
-        db.session.add(Shop(
-            name=d['name'],
-            address=d.get('address', ''),
-            nearest_station=d.get('nearest_station', ''),
-            genres=d.get('genres', ''),
-            hours=d.get('hours', ''),
-            holiday=d.get('holiday', 'なし'),
-            homepage_url=d.get('homepage_url', ''),
-            sns_url=d.get('sns_url', ''),
-            description=d.get('description', ''),
-            price_range=d.get('price_range', '不明'),
-            payment_methods=d.get('payment_methods', '不明'),
-            parking=d.get('parking', ''),
-            latitude=d['latitude'],
-            longitude=d['longitude'],
-            rating=0.0,
-            review_count=0,
-            place_id='',
-            plus_code='',
-        ))
-        added += 1
+        kept_ids.add(shop.id)
+        for column in CSV_UPDATE_COLUMNS:
+            setattr(shop, column, r[column])
+        if db.session.is_modified(shop):
+            stats['updated'] += 1
+        else:
+            stats['unchanged'] += 1
+    db.session.flush()
+    db.session.expunge_all()  # 1チャンク分以上のORMオブジェクトを持ち越さない
+    stats['inserted'] += bulk_insert_shops(inserts, revision=rev)
+
+def _prune_shops(kept_ids, rev):
+    """CSVに無い店舗を口コミ・お知らせ・メディアごと削除する。削除件数を返す"""
+    stale = [shop_id for shop_id, shop_rev in db.session.query(Shop.id, Shop.revision)
+             if shop_id not in kept_ids and shop_rev != rev]
+    for i in range(0, len(stale), IMPORT_CHUNK_SIZE):
+        ids = stale[i:i + IMPORT_CHUNK_SIZE]
+        for model in (Review, Notice, ShopMedia, GeocodeJob):
+            model.query.filter(model.shop_id.in_(ids)).delete(synchronize_session=False)
+        Shop.query.filter(Shop.id.in_(ids)).delete(synchronize_session=False)
+        db.session.add_all(DeletedShop(shop_id=shop_id, revision=rev) for shop_id in ids)
+    return len(stale)
+
+def import_shops_csv(path=SHOPS_CSV_PATH, prune=False, chunk_size=IMPORT_CHUNK_SIZE):
+    """shops.csv をチャンクごとに読み込んでアップサートする（全体で1トランザクション）。
+    prune=True ならCSVに無い店舗を削除する。件数の内訳を返す
+    """
+    stats = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'skipped': 0, 'deleted': 0}
+    kept_ids = set()
+    seen = set()
+    try:
+        ambiguous_place_ids = _ambiguous_place_ids(path)
+        rev = next_revision(db.session, geometry=True)  # 追加・削除の分（更新は ORM の flush で別に進む）
+        for chunk in _read_chunks(path, chunk_size):
+            rows = []
+            for raw in chunk:
+                r = csv_shop_row(raw)
+                if r is None:
+                    continue
+                key = (r['name'], r['address'])
+                if key in seen:
+                    stats['skipped'] += 1  # CSV内の重複
+                    continue
+                seen.add(key)
+                rows.append(r)
+            _upsert_shop_chunk(rows, stats, kept_ids, rev, ambiguous_place_ids)
+        if prune:
+            stats['deleted'] = _prune_shops(kept_ids, rev)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return stats
+
+def seed_prefecture_shops(key):
+    """seeds/<key>.json の店舗を追加する（登録済みの店はスキップ）"""
+    pref_name = dict(SEED_PREFECTURES)[key]
+    with open(os.path.join(SEED_DIR, f'{key}.json'), encoding='utf-8') as f:
+        shops = json.load(f)
+    added = bulk_insert_shops([shop_row(d) for d in shops])
     db.session.commit()
-    print(f"✅ 宮城県の古着屋 {added} 件を追加しました（スキップ: {len(miyagi_shops) - added} 件）")
+    print(f"✅ {pref_name}の古着屋 {added} 件を追加しました（スキップ: {len(shops) - added} 件）")
+    return added
 
+def count_prefecture_shops(key):
+    """住所がその県名で始まる店舗数（前方一致なので ix_shop_address が使える）"""
+    pref_name = dict(SEED_PREFECTURES)[key]
+    return Shop.query.filter(Shop.address.like(f'{pref_name}%')).count()
 
-def seed_data():
-    db.create_all()
-    migrate_db()
+
+SEED_VERSION = '1'  # 初期データ（記事・各県の店舗）を変更したら上げる
+
+def seed_data(force=False):
+    """テーブル作成・マイグレーション・初期データ投入。
+    初期データは SEED_VERSION が記録済みなら投入しない（force=True で再実行）
+    """
+    applied = migrate_db()
+    ensure_search_index()
+    if 1 in applied:
+        # 旧スキーマからの移行（rating_sum 追加）。以前の口コミから集計を作り直す
+        rebuild_rating_aggregates()
+    upgrade_admin_passwords()
+
+    marker = db.session.get(AppMeta, 'seed_version')
+    if marker and marker.value == SEED_VERSION and not force:
+        print(f"初期データは投入済みです（seed_version={SEED_VERSION}）")
+        return
 
     if Article.query.count() == 0:
         print("🌱 記事データを移行中...")
@@ -2104,20 +1621,60 @@ def seed_data():
         print("✅ 記事データの移行完了！")
 
     if Admin.query.count() == 0:
-        db.session.add(Admin(password="admin"))
+        db.session.add(Admin(password_hash=generate_password_hash("admin")))
         db.session.commit()
-        print("✅ 管理者パスワード設定完了（admin）")
+        print("✅ 管理者パスワード設定完了（admin）。flask --app server set-admin-password で変更してください")
 
-    seed_aomori_shops()
-    seed_akita_shops()
-    seed_iwate_shops()
-    seed_yamagata_shops()
-    seed_miyagi_shops()
+    for key, _ in SEED_PREFECTURES:
+        seed_prefecture_shops(key)
 
-# gunicorn・直接実行どちらでも起動時にDB初期化
-with app.app_context():
-    seed_data()
+    if marker is None:
+        marker = AppMeta(key='seed_version')
+        db.session.add(marker)
+    marker.value = SEED_VERSION
+    db.session.commit()
+
+def ensure_schema():
+    """スキーマが migrations.py の最新より古ければ seed_data() を流す（起動時の保険。gunicorn.conf.py の on_starting）。
+    本来はデプロイ前の flask --app server seed で済んでいる。PostgreSQL の移行は advisory lock で1プロセスずつ"""
+    if current_version(db.engine) < MIGRATIONS[-1][0]:
+        print("⚠️ スキーマが古いので起動前に移行します（デプロイ前の flask --app server seed が流れていません）")
+        seed_data()
+
+# デプロイ時に1回だけ実行する（railway.json の preDeployCommand / Procfile の release）: flask --app server seed
+@app.cli.command('seed')
+@click.option('--force', is_flag=True, help='投入済みでも初期データの投入をやり直す')
+def seed_command(force):
+    """DBの作成・マイグレーション・初期データ投入"""
+    seed_data(force=force)
+
+@app.cli.command('migrate')
+def migrate_command():
+    """テーブル作成と未適用のスキーマ移行だけを行う（初期データは入れない）"""
+    applied = migrate_db()
+    if not applied:
+        print("スキーマは最新です")
+
+@app.cli.command('set-admin-password')
+@click.password_option(help='新しい管理者パスワード')
+def set_admin_password_command(password):
+    """管理者パスワードを変更する（ハッシュで保存）"""
+    admin = Admin.query.first() or Admin()
+    admin.password = None
+    admin.password_hash = generate_password_hash(password)
+    db.session.add(admin)
+    db.session.commit()
+    print("✅ 管理者パスワードを変更しました（発行済みのトークンは使えなくなります）")
+
+@app.cli.command('rebuild-ratings')
+def rebuild_ratings_command():
+    """口コミから店舗の評価集計を作り直す"""
+    rebuild_rating_aggregates()
+    print("✅ 評価集計を再計算しました")
 
 if __name__ == '__main__':
+    with app.app_context():
+        seed_data()
+    start_geocode_thread()
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=False)
\ No newline at end of file
@@ -0,0 +1,176 @@
+"""
+店舗座標の空間計算（距離・グリッド索引）。
+DBやFlaskに依存しないので server.py / geocode_fix.py のどちらからも使える。
+"""
+import math
+
+EARTH_RADIUS_M = 6371000
+M_PER_DEG = math.pi * EARTH_RADIUS_M / 180  # 球面上の緯度1度あたりの距離
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    R = EARTH_RADIUS_M
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = math.radians(lat2 - lat1)
+    dlam = math.radians(lon2 - lon1)
+    a = math.sin(dphi/2)**2 + math.cos(phi1)*math.cos(phi2)*math.sin(dlam/2)**2
+    return R * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+def has_coords(lat, lng):
+    """座標が未設定（None / 0）でないか"""
+    return bool(lat) and bool(lng)
+
+
+class ShopGrid:
+    """緯度経度を cell_deg 度四方のセルに分けた最近傍検索用の索引。
+
+    points は (shop_id, lat, lng) のリスト。検索は中心セルから外側へ
+    リング状に広げ、上限件数が確定した時点で打ち切る。調べるのは半径の外接矩形と
+    店舗のある範囲が重なるセルだけ。
+    """
+
+    def __init__(self, points, cell_deg=0.01):
+        self.cell_deg = cell_deg
+        self.cells = {}
+        self.size = 0
+        for shop_id, lat, lng in points:
+            if not has_coords(lat, lng):
+                continue
+            self.cells.setdefault(self._cell(lat, lng), []).append((shop_id, lat, lng))
+            self.size += 1
+        if self.cells:
+            rows = [c[0] for c in self.cells]
+            cols = [c[1] for c in self.cells]
+            self._bounds = (min(rows), max(rows), min(cols), max(cols))
+
+    def _cell(self, lat, lng):
+        return int(math.floor(lat / self.cell_deg)), int(math.floor(lng / self.cell_deg))
+
+    def _ring(self, row, col, r):
+        if r == 0:
+            yield row, col
+            return
+        for dc in range(-r, r + 1):
+            yield row - r, col + dc
+            yield row + r, col + dc
+        for dr in range(-r + 1, r):
+            yield row + dr, col - r
+            yield row + dr, col + r
+
+    def _search_box(self, lat, lng, radius_m):
+        """中心から radius_m 以内を覆うセルの範囲 (min_row, max_row, min_col, max_col) を、
+        店舗のある範囲 _bounds に切り詰めて返す。重ならなければ None。
+        経度の幅は球面上の外接矩形。極や経度180度をまたぐときは全経度（_bounds の全列）にし、
+        2つ目の戻り値を True にする
+        """
+        min_row, max_row, min_col, max_col = self._bounds
+        all_lng = True
+        dlat = math.degrees(radius_m / EARTH_RADIUS_M)
+        sin_r = math.sin(radius_m / EARTH_RADIUS_M)
+        cos_lat = math.cos(math.radians(lat))
+        top = self._cell(lat - dlat, lng)[0]
+        bottom = self._cell(lat + dlat, lng)[0]
+        if abs(lat) + dlat < 90 and cos_lat > sin_r:
+            dlng = math.degrees(math.asin(sin_r / cos_lat))
+            if -180 <= lng - dlng and lng + dlng <= 180:
+                left = self._cell(lat, lng - dlng)[1]
+                right = self._cell(lat, lng + dlng)[1]
+                min_col, max_col = max(left, min_col), min(right, max_col)
+                all_lng = False
+        box = (max(top, min_row), min(bottom, max_row), min_col, max_col)
+        if box[0] > box[1] or box[2] > box[3]:
+            return None
+        return box, all_lng
+
+    def nearest(self, lat, lng, limit=20, radius_m=3000):
+        """(距離m, shop_id) を近い順に最大 limit 件返す（radius_m 以内のみ）"""
+        if not self.cells:
+            return []
+        search = self._search_box(lat, lng, radius_m)
+        if search is None:
+            return []
+        (min_row, max_row, min_col, max_col), all_lng = search
+        row, col = self._cell(lat, lng)
+        max_ring = max(row - min_row, max_row - row, col - min_col, max_col - col, 0)
+
+        def in_box(cell):
+            return min_row <= cell[0] <= max_row and min_col <= cell[1] <= max_col
+
+        if all_lng or (2 * max_ring + 1) ** 2 > len(self.cells):
+            # リングで広げるより、店舗のあるセルを直接見た方が少なく済む（高緯度・広い半径）。
+            # 全経度が対象のときは経度180度の向こう側の店もあるので、リングの打ち切り条件が使えない
+            found = []
+            for cell, members in self.cells.items():
+                if not in_box(cell):
+                    continue
+                for shop_id, s_lat, s_lng in members:
+                    d = haversine_m(lat, lng, s_lat, s_lng)
+                    if d <= radius_m:
+                        found.append((d, shop_id))
+            found.sort()
+            return found[:limit]
+
+        found = []
+        r = 0
+        while r <= max_ring:
+            for cell in self._ring(row, col, r):
+                if not in_box(cell):
+                    continue
+                for shop_id, s_lat, s_lng in self.cells.get(cell, ()):
+                    d = haversine_m(lat, lng, s_lat, s_lng)
+                    if d <= radius_m:
+                        found.append((d, shop_id))
+            # リング r まで調べ終えると、中心から (r * セルの短辺) 以内は漏れなく走査済み
+            edge_lat = min(89.9, abs(lat) + r * self.cell_deg)
+            covered_m = r * self.cell_deg * M_PER_DEG * math.cos(math.radians(edge_lat))
+            if covered_m >= radius_m:
+                break
+            if len(found) >= limit:
+                found.sort()
+                if found[limit - 1][0] <= covered_m:
+                    break
+            r += 1
+        found.sort()
+        return found[:limit]
+
+
+CLUSTER_CELL_PX = 64  # クラスタ1つが画面上で占める大きさ（px）
+TILE_SIZE_PX = 256
+
+
+def _world_px(lat, lng, zoom):
+    """Webメルカトル上のピクセル座標（ズーム zoom のとき）"""
+    scale = TILE_SIZE_PX * (2 ** zoom)
+    lat = max(-85.0511, min(85.0511, lat))
+    x = (lng + 180.0) / 360.0 * scale
+    s = math.sin(math.radians(lat))
+    y = (0.5 - math.log((1 + s) / (1 - s)) / (4 * math.pi)) * scale
+    return x, y
+
+
+def grid_clusters(points, zoom, max_ids=5):
+    """ズーム zoom の画面上で CLUSTER_CELL_PX 四方ごとに店舗をまとめる。
+
+    points は (shop_id, lat, lng, rating) のリスト。各クラスタは件数・重心と、
+    評価の高い順に最大 max_ids 件の代表 shop_id を持つ。
+    """
+    cells = {}
+    for shop_id, lat, lng, rating in points:
+        if not has_coords(lat, lng):
+            continue
+        x, y = _world_px(lat, lng, zoom)
+        key = (int(x // CLUSTER_CELL_PX), int(y // CLUSTER_CELL_PX))
+        cells.setdefault(key, []).append((rating or 0.0, shop_id, lat, lng))
+
+    clusters = []
+    for members in cells.values():
+        members.sort(key=lambda m: (-m[0], m[1]))
+        clusters.append({
+            "latitude": sum(m[2] for m in members) / len(members),
+            "longitude": sum(m[3] for m in members) / len(members),
+            "count": len(members),
+            "shopIds": [m[1] for m in members[:max_ids]],
+        })
+    clusters.sort(key=lambda c: -c["count"])
+    return clusters
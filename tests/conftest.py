@@ -0,0 +1,31 @@
+"""
+テスト共通の設定。server は import 時に DATABASE_URL を読むので、先に一時SQLiteを指定しておく。
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_tmpdir = tempfile.mkdtemp(prefix='furugi-test-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_tmpdir, 'test.db')
+os.environ['GEOCODER'] = 'stub'
+
+import server  # noqa: E402
+
+
+@pytest.fixture
+def app_ctx():
+    """空のテーブルを用意したアプリコンテキスト"""
+    with server.app.app_context():
+        server.migrate_db()
+        server.ensure_search_index()
+        for model in (server.Review, server.Notice, server.ShopMedia, server.GeocodeJob,
+                      server.DeletedShop, server.Shop):
+            model.query.delete()
+        server.db.session.commit()
+        yield server
+        server.db.session.remove()
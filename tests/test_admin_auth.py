@@ -0,0 +1,42 @@
+"""
+管理者トークン（/api/admin/login）: 発行・検証と、パスワード変更での失効
+"""
+import pytest
+
+
+@pytest.fixture
+def client(app_ctx):
+    set_password(app_ctx, 'first-password')
+    return app_ctx.app.test_client()
+
+
+def set_password(server, password):
+    result = server.app.test_cli_runner().invoke(args=['set-admin-password', '--password', password])
+    assert result.exit_code == 0, result.output
+
+
+def login(client, password):
+    resp = client.post('/api/admin/login', json={'password': password})
+    return resp.status_code, resp.get_json().get('token')
+
+
+def post_article(client, token):
+    return client.post('/api/articles', json={'title': 't', 'content': 'c', 'genre': 'g'},
+                       headers={'Authorization': f'Bearer {token}'}).status_code
+
+
+def test_token_authorizes_admin_requests(client):
+    status, token = login(client, 'first-password')
+    assert status == 200
+    assert post_article(client, token) == 201
+    assert post_article(client, token + 'x') == 401
+    assert login(client, 'wrong')[0] == 401
+
+
+def test_changing_password_revokes_issued_tokens(app_ctx, client):
+    _, old_token = login(client, 'first-password')
+    set_password(app_ctx, 'second-password')
+
+    assert post_article(client, old_token) == 401
+    _, new_token = login(client, 'second-password')
+    assert post_article(client, new_token) == 201
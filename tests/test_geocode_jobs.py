@@ -0,0 +1,55 @@
+"""
+住所→座標のジョブ（process_geocode_jobs）: 想定外のエラーや処理中の停止でジョブが running のまま残らないこと
+"""
+from datetime import datetime, timedelta
+
+
+def add_pending_shop(server, name='座標なしの店'):
+    shop = server.Shop(name=name, address='東京都世田谷区北沢2-37-2')
+    server.db.session.add(shop)
+    server.enqueue_geocode(shop)
+    server.db.session.commit()
+    return shop.id
+
+
+def test_job_sets_coordinates(app_ctx):
+    shop_id = add_pending_shop(app_ctx)
+    assert app_ctx.process_geocode_jobs() == 1
+    shop = app_ctx.db.session.get(app_ctx.Shop, shop_id)
+    assert shop.geocode_status == 'ok'
+    assert shop.latitude and shop.longitude
+
+
+def test_unexpected_error_requeues_job(app_ctx, monkeypatch):
+    shop_id = add_pending_shop(app_ctx)
+
+    def broken(address, session=None, raise_errors=False):
+        raise RuntimeError('db is gone')
+
+    monkeypatch.setattr(app_ctx.geocoder, 'geocode', broken)
+    assert app_ctx.process_geocode_jobs() == 1
+    job = app_ctx.GeocodeJob.query.filter_by(shop_id=shop_id).one()
+    assert job.status == 'pending'
+    assert job.attempts == 1
+    assert 'db is gone' in job.last_error
+    assert job.next_attempt_at > datetime.now()
+
+
+def test_stale_running_job_is_released(app_ctx):
+    shop_id = add_pending_shop(app_ctx)
+    job = app_ctx.GeocodeJob.query.filter_by(shop_id=shop_id).one()
+    job.status = 'running'  # 処理中にプロセスが落ちた
+    job.next_attempt_at = datetime.now() - timedelta(seconds=1)
+    app_ctx.db.session.commit()
+
+    assert app_ctx.process_geocode_jobs() == 1
+    assert app_ctx.db.session.get(app_ctx.Shop, shop_id).geocode_status == 'ok'
+
+
+def test_running_job_within_lease_is_left_alone(app_ctx):
+    shop_id = add_pending_shop(app_ctx)
+    job = app_ctx.GeocodeJob.query.filter_by(shop_id=shop_id).one()
+    assert app_ctx._claim_geocode_job(job.id)  # 別のワーカーが処理中
+
+    assert app_ctx.process_geocode_jobs() == 0
+    assert app_ctx.db.session.get(app_ctx.Shop, shop_id).geocode_status == 'pending'
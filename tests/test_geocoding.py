@@ -0,0 +1,43 @@
+"""
+GeocodeService: 問い合わせ先の違うサービス同士でキャッシュを共有しても、互いの結果を取り違えない
+"""
+from datetime import datetime, timedelta
+
+from geocoding import GeocodeService, MemoryGeocodeStore, normalize_address
+
+ADDRESS = '宮城県仙台市青葉区中央2丁目10-3'
+
+
+def gsi_lookup(address, session=None):
+    return None
+
+
+def nominatim_lookup(address, session=None):
+    return 38.26, 140.88
+
+
+def test_gsi_only_service_ignores_nominatim_hits():
+    store = MemoryGeocodeStore()
+    assert GeocodeService(store, [gsi_lookup, nominatim_lookup]).geocode(ADDRESS) == (38.26, 140.88)
+
+    gsi_only = GeocodeService(store, [gsi_lookup])
+    assert gsi_only.geocode(ADDRESS) is None
+    assert gsi_only.misses == 1
+
+
+def test_gsi_miss_does_not_hide_nominatim():
+    store = MemoryGeocodeStore()
+    assert GeocodeService(store, [gsi_lookup]).geocode(ADDRESS) is None
+
+    chain = GeocodeService(store, [gsi_lookup, nominatim_lookup])
+    assert chain.geocode(ADDRESS) == (38.26, 140.88)
+    assert chain.negative_hits == 0
+
+
+def test_legacy_rows_without_provider():
+    store = MemoryGeocodeStore()
+    expires_at = datetime.now() + timedelta(days=1)
+    store.put(normalize_address(ADDRESS), 38.0, 140.0, expires_at, None)
+
+    assert GeocodeService(store, [gsi_lookup, nominatim_lookup]).geocode(ADDRESS) == (38.0, 140.0)
+    assert GeocodeService(store, [gsi_lookup]).geocode(ADDRESS) is None  # どちらで引いたか分からない
@@ -0,0 +1,59 @@
+"""
+import_shops_csv: 同じ place_id が別々の店に付いている shops.csv の取り込み
+（lib/shops.csv の GRAPEFRUIT MOON 下北沢 と Top of the Hill 下北沢店）
+"""
+import csv
+
+import pytest
+
+SHARED_PLACE_ID = 'ChIJO4HY_lzzGGARd4lrVGDWqs8'
+ROWS = [
+    {'name': 'GRAPEFRUIT MOON 下北沢', 'address': '東京都世田谷区北沢2-2-11', 'place_id': SHARED_PLACE_ID},
+    {'name': 'Top of the Hill 下北沢店', 'address': '東京都世田谷区北沢2-25-8', 'place_id': SHARED_PLACE_ID},
+    {'name': 'JAM 下北沢店', 'address': '東京都世田谷区北沢2-37-2', 'place_id': 'ChIJ-unique'},
+]
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = tmp_path / 'shops.csv'
+    with open(path, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.DictWriter(f, fieldnames=['name', 'address', 'place_id', 'latitude', 'longitude'])
+        writer.writeheader()
+        for row in ROWS:
+            writer.writerow({**row, 'latitude': '35.659816', 'longitude': '139.6682685'})
+        writer.writerow({**ROWS[0], 'latitude': '35.659816', 'longitude': '139.6682685'})  # CSV内の重複
+    return str(path)
+
+
+def shop_keys(server):
+    return sorted((s.name, s.address) for s in server.Shop.query)
+
+
+def test_shared_place_id_on_fresh_db(app_ctx, csv_path):
+    stats = app_ctx.import_shops_csv(csv_path)
+    assert stats['inserted'] == 3
+    assert stats['skipped'] == 1
+    assert shop_keys(app_ctx) == sorted((r['name'], r['address']) for r in ROWS)
+
+
+def test_shared_place_id_already_in_db(app_ctx, csv_path):
+    # 旧 admin_import_csv が残した状態: 同じ place_id の2店が両方ある
+    for row in ROWS[:2]:
+        app_ctx.db.session.add(app_ctx.Shop(**row))
+    app_ctx.db.session.commit()
+
+    stats = app_ctx.import_shops_csv(csv_path)
+    assert stats['inserted'] == 1
+    assert stats['updated'] + stats['unchanged'] == 2
+    assert shop_keys(app_ctx) == sorted((r['name'], r['address']) for r in ROWS)
+
+
+def test_unique_place_id_still_matches_renamed_shop(app_ctx, csv_path):
+    app_ctx.db.session.add(app_ctx.Shop(name='JAM', address='東京都世田谷区北沢2-37-2', place_id='ChIJ-unique'))
+    app_ctx.db.session.commit()
+
+    stats = app_ctx.import_shops_csv(csv_path)
+    assert stats['inserted'] == 2
+    assert stats['updated'] == 1
+    assert app_ctx.Shop.query.filter_by(place_id='ChIJ-unique').one().name == 'JAM 下北沢店'
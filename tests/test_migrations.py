@@ -0,0 +1,56 @@
+"""
+migrations.run_migrations: 旧スキーマのDBに未適用の移行を1回ずつ流す
+"""
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+from migrations import MIGRATIONS, MigrationError, current_version, run_migrations
+
+LEGACY_SCHEMA = [
+    'CREATE TABLE shop (id INTEGER PRIMARY KEY, name VARCHAR(100), address VARCHAR(200), '
+    'latitude FLOAT, longitude FLOAT, genres VARCHAR(200), rating FLOAT, review_count INTEGER)',
+    'CREATE TABLE review (id INTEGER PRIMARY KEY, shop_id INTEGER, rating FLOAT)',
+    'CREATE TABLE notice (id INTEGER PRIMARY KEY, shop_id INTEGER)',
+    'CREATE TABLE shop_media (id INTEGER PRIMARY KEY, shop_id INTEGER)',
+    'CREATE TABLE admin (id INTEGER PRIMARY KEY, password VARCHAR(100))',
+    'CREATE TABLE sync_state (id INTEGER PRIMARY KEY, revision INTEGER NOT NULL DEFAULT 0)',
+    'CREATE TABLE geocode_cache (address_key VARCHAR(200) PRIMARY KEY, latitude FLOAT, longitude FLOAT, '
+    'expires_at DATETIME NOT NULL)',
+]
+
+
+@pytest.fixture
+def legacy_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        for sql in LEGACY_SCHEMA:
+            conn.execute(text(sql))
+        conn.execute(text("INSERT INTO shop (name, address) VALUES ('A', '東京都'), ('B', '東京都')"))
+    yield engine
+    engine.dispose()
+
+
+def columns(engine, table):
+    return {c['name'] for c in inspect(engine).get_columns(table)}
+
+
+def test_upgrades_legacy_schema_once(legacy_engine):
+    applied = run_migrations(legacy_engine, log=lambda message: None)
+    assert applied == [version for version, _, _ in MIGRATIONS]
+    assert current_version(legacy_engine) == MIGRATIONS[-1][0]
+    assert {'search_text', 'revision', 'rating_sum', 'geocode_status', 'children_revision',
+            'genres_search', 'search_bigrams'} <= columns(legacy_engine, 'shop')
+    assert {'shops_revision', 'geo_revision'} <= columns(legacy_engine, 'sync_state')
+    assert 'provider' in columns(legacy_engine, 'geocode_cache')
+    assert 'ux_shop_name_address' in {i['name'] for i in inspect(legacy_engine).get_indexes('shop')}
+
+    assert run_migrations(legacy_engine, log=lambda message: None) == []
+
+
+def test_duplicate_shops_stop_the_unique_index_migration(legacy_engine):
+    with legacy_engine.begin() as conn:
+        conn.execute(text("INSERT INTO shop (name, address) VALUES ('A', '東京都')"))
+
+    with pytest.raises(MigrationError, match='A / 東京都'):
+        run_migrations(legacy_engine, log=lambda message: None)
+    assert current_version(legacy_engine) == 2  # 失敗した移行と、その後の移行は記録されない
@@ -0,0 +1,51 @@
+"""
+filter_shops: q= / genre= の絞り込み（FTS5 trigram・2文字の索引・部分一致）
+"""
+import pytest
+
+SHOPS = [
+    ('古着屋 渋谷店', '東京都渋谷区神南1-1-1', 'ヴィンテージ,デニム'),
+    ('仙台古着', '宮城県仙台市青葉区中央2-10-3', 'ＵＳ古着'),
+    ('100%コットン', '東京都世田谷区北沢2-2-11', 'レディース'),
+    ('a_b store', '東京都世田谷区北沢2-25-8', ''),
+]
+
+
+@pytest.fixture
+def shops(app_ctx):
+    for name, address, genres in SHOPS:
+        app_ctx.db.session.add(app_ctx.Shop(name=name, address=address, genres=genres))
+    app_ctx.db.session.commit()
+    return app_ctx
+
+
+def names(server, keyword='', genre=''):
+    return sorted(s.name for s in server.filter_shops(server.Shop.query, keyword, genre))
+
+
+def test_two_character_terms_use_the_bigram_index(shops):
+    assert shops.bigram_condition('古着', 0) is not None
+    assert names(shops, '古着') == ['仙台古着', '古着屋 渋谷店']
+    assert names(shops, '渋谷') == ['古着屋 渋谷店']
+    assert names(shops, '古着 仙台') == ['仙台古着']
+    assert names(shops, '着仙') == []  # 店名と住所をまたいだ並びには一致しない
+
+
+def test_like_wildcards_are_literal(shops):
+    assert names(shops, '%') == ['100%コットン']
+    assert names(shops, '_') == ['a_b store']
+    assert names(shops, 'a_') == ['a_b store']
+    assert names(shops, '0%') == ['100%コットン']
+
+
+def test_short_genre_matches_normalized_form(shops):
+    assert names(shops, genre='us') == ['仙台古着']
+    assert names(shops, genre='%') == []
+
+
+def test_bigrams_follow_updates(shops):
+    shop = shops.Shop.query.filter_by(name='仙台古着').one()
+    shop.name = '盛岡古着'
+    shops.db.session.commit()
+    assert names(shops, '仙台') == ['盛岡古着']  # 住所に仙台が残っている
+    assert names(shops, '盛岡') == ['盛岡古着']
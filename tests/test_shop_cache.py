@@ -0,0 +1,110 @@
+"""
+店舗一覧・詳細・グリッド・クラスタのキャッシュの世代（SyncState のカウンタと Shop.children_revision）
+"""
+import pytest
+
+
+def add_shop(server, name, lat=35.66, lng=139.67):
+    shop = server.Shop(name=name, address=f'東京都世田谷区北沢 {name}', latitude=lat, longitude=lng)
+    server.db.session.add(shop)
+    server.db.session.commit()
+    return shop.id
+
+
+def test_clusters_built_before_a_move_are_not_stored_as_new(app_ctx, monkeypatch):
+    shop_id = add_shop(app_ctx, 'A')
+    build = app_ctx.grid_clusters
+
+    def build_while_shop_moves(points, zoom):
+        # 点を読み終えた後、別のスレッドが店舗を動かしてコミットし、新しい世代のクラスタ（別ズーム）を作った
+        monkeypatch.setattr(app_ctx, 'grid_clusters', build)
+        shop = app_ctx.db.session.get(app_ctx.Shop, shop_id)
+        shop.latitude = 43.06
+        app_ctx.db.session.commit()
+        app_ctx.get_shop_clusters(5)
+        return build(points, zoom)
+
+    monkeypatch.setattr(app_ctx, 'grid_clusters', build_while_shop_moves)
+    stale = app_ctx.get_shop_clusters(10)
+
+    assert stale[0]['latitude'] == 35.66
+    assert app_ctx.get_shop_clusters(10)[0]['latitude'] == 43.06
+
+
+@pytest.fixture
+def client(app_ctx):
+    return app_ctx.app.test_client()
+
+
+def etag(client, url):
+    resp = client.get(url)
+    assert resp.status_code == 200
+    return resp.headers['ETag']
+
+
+def test_shops_etag_changes_after_write(app_ctx, client):
+    shop_id = add_shop(app_ctx, 'A')
+    before = etag(client, '/api/shops')
+    assert client.get('/api/shops', headers={'If-None-Match': before}).status_code == 304
+
+    assert client.patch(f'/api/shops/{shop_id}', json={'name': 'A2'}).status_code == 200
+    resp = client.get('/api/shops', headers={'If-None-Match': before})
+    assert resp.status_code == 200
+    assert resp.headers['ETag'] != before
+    assert [s['name'] for s in resp.get_json()] == ['A2']
+
+
+def test_review_invalidates_only_that_shops_detail(app_ctx, client):
+    a, b = add_shop(app_ctx, 'A'), add_shop(app_ctx, 'B', lat=35.70)
+    detail_a, detail_b = etag(client, f'/api/shops/{a}/detail'), etag(client, f'/api/shops/{b}/detail')
+    geometry = app_ctx.geometry_cache_key()
+    shops = app_ctx.shops_cache_key()
+
+    for rating in (4, 5):
+        resp = client.post(f'/api/shops/{a}/reviews', json={'rating': rating, 'comment': 'よかった'})
+        assert resp.status_code == 201
+    assert resp.get_json() == {'message': 'Review added', 'newRating': 4.5, 'reviewCount': 2}
+
+    resp = client.get(f'/api/shops/{a}/detail', headers={'If-None-Match': detail_a})
+    assert resp.status_code == 200
+    assert len(resp.get_json()['reviews']) == 2
+    assert resp.get_json()['shop']['rating'] == 4.5
+    assert client.get(f'/api/shops/{b}/detail', headers={'If-None-Match': detail_b}).status_code == 304
+    assert app_ctx.geometry_cache_key() == geometry  # グリッド・クラスタは作り直さない
+    assert app_ctx.shops_cache_key() != shops  # 一覧には評価が載る
+
+
+def test_media_invalidates_detail_but_not_lists(app_ctx, client):
+    shop_id = add_shop(app_ctx, 'A')
+    detail = etag(client, f'/api/shops/{shop_id}/detail')
+    shops = app_ctx.shops_cache_key()
+
+    assert client.post(f'/api/shops/{shop_id}/media', json={'title': '紹介記事'}).status_code == 201
+    assert client.get(f'/api/shops/{shop_id}/detail', headers={'If-None-Match': detail}).status_code == 200
+    assert app_ctx.shops_cache_key() == shops
+
+
+def test_geometry_generation_moves_only_with_coordinates(app_ctx, client):
+    shop_id = add_shop(app_ctx, 'A')
+    geometry = app_ctx.geometry_cache_key()
+    client.patch(f'/api/shops/{shop_id}', json={'description': '説明'})
+    assert app_ctx.geometry_cache_key() == geometry
+    client.patch(f'/api/shops/{shop_id}', json={'latitude': 35.7})
+    assert app_ctx.geometry_cache_key() > geometry
+
+
+def test_changes_since_reports_upserts_and_deletions(app_ctx, client):
+    a, b = add_shop(app_ctx, 'A'), add_shop(app_ctx, 'B')
+    since = client.get('/api/shops/changes').get_json()['revision']
+
+    client.patch(f'/api/shops/{a}', json={'name': 'A2'})
+    client.delete(f'/api/shops/{b}')
+    c = add_shop(app_ctx, 'C')
+
+    changes = client.get(f'/api/shops/changes?since={since}').get_json()
+    assert sorted(s['id'] for s in changes['shops']) == [a, c]
+    assert changes['deletedIds'] == [b]
+    assert changes['revision'] > since
+
+    latest = client.get(f"/api/shops/changes?since={changes['revision']}").get_json()
+    assert latest['shops'] == [] and latest['deletedIds'] == []
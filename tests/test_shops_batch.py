@@ -0,0 +1,24 @@
+"""
+POST /api/shops/batch: ids の順に返す・見つからない id の報告・不正な本文は400
+"""
+import pytest
+
+
+@pytest.fixture
+def client(app_ctx):
+    for name in ('A', 'B'):
+        app_ctx.db.session.add(app_ctx.Shop(name=name, address=f'東京都 {name}', latitude=35.6, longitude=139.7))
+    app_ctx.db.session.commit()
+    return app_ctx.app.test_client()
+
+
+def test_returns_shops_in_requested_order(app_ctx, client):
+    a, b = (s.id for s in app_ctx.Shop.query.order_by(app_ctx.Shop.name))
+    resp = client.post('/api/shops/batch', json={'ids': [b, 999999, a, b], 'fields': ['id', 'name']})
+    assert resp.status_code == 200
+    assert resp.get_json() == {'shops': [{'id': b, 'name': 'B'}, {'id': a, 'name': 'A'}], 'missingIds': [999999]}
+
+
+@pytest.mark.parametrize('body', [[1, 2], 'ids', 3, {'ids': '12'}, {'ids': ['x']}, {'ids': [1], 'fields': ['nope']}])
+def test_rejects_malformed_bodies(client, body):
+    assert client.post('/api/shops/batch', json=body).status_code == 400
@@ -0,0 +1,50 @@
+"""
+ShopGrid.nearest: 全件を総当たりで調べた結果と一致すること（日本国内・高緯度・経度180度付近）
+"""
+import random
+
+import pytest
+
+from spatial import ShopGrid, haversine_m
+
+
+def brute_force(points, lat, lng, limit, radius_m):
+    found = sorted((haversine_m(lat, lng, p_lat, p_lng), shop_id) for shop_id, p_lat, p_lng in points)
+    return [hit for hit in found if hit[0] <= radius_m][:limit]
+
+
+def random_points(rng, n, lat_range, lng_range):
+    return [(i, rng.uniform(*lat_range), rng.uniform(*lng_range)) for i in range(1, n + 1)]
+
+
+@pytest.mark.parametrize('lat_range, lng_range', [
+    ((35.0, 36.5), (139.0, 140.5)),  # 首都圏に密集
+    ((24.0, 46.0), (122.0, 148.0)),  # 日本全体
+    ((-89.9, 89.9), (-179.9, 179.9)),  # 全世界
+    ((70.0, 89.9), (-179.9, 179.9)),  # 高緯度
+    ((-10.0, 10.0), (175.0, 179.99)),  # 経度180度の手前だけ
+])
+def test_nearest_matches_brute_force(lat_range, lng_range):
+    rng = random.Random(f'{lat_range}{lng_range}')
+    points = random_points(rng, 2000, lat_range, lng_range)
+    grid = ShopGrid(points, cell_deg=0.01)
+    for _ in range(60):
+        lat = rng.uniform(max(-90.0, lat_range[0] - 1), min(90.0, lat_range[1] + 1))
+        lng = rng.uniform(-180.0, 180.0) if rng.random() < 0.3 else rng.uniform(*lng_range)
+        limit = rng.choice([1, 5, 20, 100])
+        radius_m = rng.choice([100, 3000, 50000, 500000])
+        expected = brute_force(points, lat, lng, limit, radius_m)
+        got = grid.nearest(lat, lng, limit, radius_m)
+        assert [shop_id for _, shop_id in got] == [shop_id for _, shop_id in expected], (lat, lng, limit, radius_m)
+
+
+def test_nearest_across_the_antimeridian():
+    # 緯度・経度の 0 は「座標なし」扱い（has_coords）なので避ける
+    grid = ShopGrid([(1, 1.0, 179.999), (2, 1.0, -179.999), (3, 1.0, 170.0)])
+    assert [shop_id for _, shop_id in grid.nearest(1.0, 179.9995, 10, 1000)] == [1, 2]
+    assert [shop_id for _, shop_id in grid.nearest(1.0, -179.9995, 10, 1000)] == [2, 1]
+
+
+def test_nearest_at_the_pole():
+    grid = ShopGrid([(1, 89.999, 0.5), (2, 89.999, 180.0), (3, 80.0, 0.5)])
+    assert sorted(shop_id for _, shop_id in grid.nearest(90.0, 0.5, 10, 1000)) == [1, 2]